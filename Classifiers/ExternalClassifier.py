@@ -11,6 +11,7 @@ import gzip
 import types, copy
 from Classifier import Classifier
 import Utils.Parameters as Parameters
+import Utils.Instrumentation as Instrumentation
 import Utils.Settings as Settings
 import Utils.Connection.Connection as Connection
 from Utils.Connection.UnixConnection import UnixConnection
@@ -161,6 +162,7 @@ class ExternalClassifier(Classifier):
         self.predictions = self.connection.download(self.predictions, outPath)
         return self.predictions
     
+    @Instrumentation.instrument("Classifier.classify")
     def classify(self, examples, output, model=None, finishBeforeReturn=False, replaceRemoteFiles=True):
         output = os.path.abspath(output)
         # Return a new classifier instance for following the training process and using the model
@@ -7,6 +7,7 @@ from Classifier import Classifier
 import Utils.Connection.Connection as Connection
 from Utils.Connection.UnixConnection import UnixConnection
 import Utils.Parameters as Parameters
+import Utils.Instrumentation as Instrumentation
 from sklearn import datasets, preprocessing
 from keras.layers import Input, Dense
 from keras.models import Model, load_model
@@ -60,6 +61,7 @@ class KerasClassifier(Classifier):
 #         if hasattr(self, "numFeatures") and self.numFeatures != None:
 #             teesModel.addStr(tag+"numFeatures", str(self.numFeatures))
     
+    @Instrumentation.instrument("Classifier.classify")
     def classify(self, examples, output, model=None, finishBeforeReturn=False, replaceRemoteFiles=True):
         print >> sys.stderr, "Predicting devel examples"
         output = os.path.abspath(output)
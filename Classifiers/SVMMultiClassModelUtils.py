@@ -1,4 +1,6 @@
 import sys, os
+import gzip
+import zlib
 sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/..")
 from Core.IdSet import IdSet
 from operator import itemgetter
@@ -64,47 +66,168 @@ def parseModel(modelfile):
     f.close()
     return numClasses, numFeatures, highestIndex
 
-def getSupportVectors(modelfile, valueToFloat=True):
-    numClasses, numFeatures, highestIndex = parseModel(modelfile)
-    #print numClasses, numFeatures, highestIndex
-    
-    f = open(modelfile,"rt")
-    line = f.readlines()[-1]
+WEIGHT_CACHE_EXTENSION = ".weights.npz"
+
+def readLastLine(modelfile, blockSize=1024*1024):
+    """
+    Read the last line of a file (the support vector line of an SVM multiclass model)
+    by reading blocks backwards from the end of the file.
+    """
+    if modelfile.endswith(".gz"): # gzip files can't be read backwards, but the lines don't need to be kept
+        f = gzip.open(modelfile, "rt")
+        line = ""
+        for line in f:
+            pass
+        f.close()
+        return line
+    f = open(modelfile, "rb")
+    f.seek(0, os.SEEK_END)
+    position = f.tell()
+    blocks = []
+    while position > 0:
+        readSize = min(blockSize, position)
+        position -= readSize
+        f.seek(position)
+        block = f.read(readSize)
+        if len(blocks) == 0: # skip the newline that ends the last line
+            block = block.rstrip("\r\n")
+        newLine = block.rfind("\n")
+        if newLine != -1:
+            blocks.append(block[newLine + 1:])
+            break
+        blocks.append(block)
     f.close()
+    blocks.reverse()
+    return "".join(blocks)
+
+def parseSupportVectorLine(line, valueToFloat=True):
+    """
+    The feature indices and values of the support vector line ("1 qid:0 index:value ... #").
+    With numpy, these are returned as arrays, unless the values are to be kept as strings.
+    """
     line = line.rsplit("#",1)[0]
+    begin = line.find("qid:")
+    assert begin != -1
+    begin = line.find(" ", begin)
+    if begin == -1: # no features
+        return [], []
+    line = line[begin:].replace(":", " ")
+    if numpyAvailable and valueToFloat:
+        values = numpy.fromstring(line, dtype=numpy.float64, sep=" ")
+        assert len(values) % 2 == 0
+        return values[0::2].astype(numpy.int64), values[1::2]
     tokens = line.split()
-    assert tokens[1].find("qid") != -1
-    tokens = tokens[2:]
+    values = tokens[1::2]
+    if valueToFloat:
+        values = [float(x) for x in values]
+    return [int(x) for x in tokens[0::2]], values
+
+def readWeightMatrix(modelfile, sparse=False):
+    """
+    Parse the weights of an SVM multiclass model as a matrix with a row for each class
+    and a column for each feature (column i is feature id i+1). The matrix is a numpy
+    array, or a scipy.sparse CSR matrix if sparse is True.
+    """
+    assert numpyAvailable, "numpy is required for the weight matrix"
+    numClasses, numFeatures, highestIndex = parseModel(modelfile)
     numFeaturesPerClass = highestIndex / numClasses
-    
-    svs = [[]]
-    svIndex = 0
+    indices, values = parseSupportVectorLine(readLastLine(modelfile))
+    indices = numpy.asarray(indices, dtype=numpy.int64) - 1
+    values = numpy.asarray(values, dtype=numpy.float64)
+    assert len(indices) == 0 or (numpy.all(indices[1:] > indices[:-1]) and indices[-1] < numClasses * numFeaturesPerClass)
+    if sparse:
+        import scipy.sparse
+        return scipy.sparse.csr_matrix((values, (indices // numFeaturesPerClass, indices % numFeaturesPerClass)), shape=(numClasses, numFeaturesPerClass))
+    matrix = numpy.zeros(numClasses * numFeaturesPerClass, dtype=numpy.float64)
+    matrix[indices] = values
+    return matrix.reshape((numClasses, numFeaturesPerClass))
+
+def getModelSignature(modelfile, blockSize=1024*1024):
+    """
+    The size and CRC-32 of a model file, for checking that a cached weight matrix was
+    parsed from it. Zip members are extracted with new modification times, so these
+    can't be used.
+    """
+    f = open(modelfile, "rb")
+    crc = 0
+    while True:
+        block = f.read(blockSize)
+        if block == "":
+            break
+        crc = zlib.crc32(block, crc)
+    f.close()
+    return "%d:%08x" % (os.path.getsize(modelfile), crc & 0xffffffff)
+
+def saveWeightMatrix(matrix, filename, signature):
+    # numpy.savez adds the extension if it is missing, so an open file is used
+    f = open(filename, "wb")
+    if hasattr(matrix, "tocsr"): # scipy.sparse
+        matrix = matrix.tocsr()
+        numpy.savez(f, format="csr", signature=signature, data=matrix.data, indices=matrix.indices, indptr=matrix.indptr, shape=matrix.shape)
+    else:
+        numpy.savez(f, format="dense", signature=signature, weights=matrix)
+    f.close()
+
+def loadWeightMatrix(filename, sparse=False, signature=None):
+    """
+    Load a cached weight matrix. Returns None if the signature doesn't match the one
+    the matrix was saved with.
+    """
+    cached = numpy.load(filename)
+    if signature != None and ("signature" not in cached.files or str(cached["signature"]) != signature):
+        cached.close()
+        return None
+    if str(cached["format"]) == "csr":
+        import scipy.sparse
+        matrix = scipy.sparse.csr_matrix((cached["data"], cached["indices"], cached["indptr"]), shape=tuple(cached["shape"]))
+        if not sparse:
+            matrix = matrix.toarray()
+    else:
+        matrix = cached["weights"]
+        if sparse:
+            import scipy.sparse
+            matrix = scipy.sparse.csr_matrix(matrix)
+    cached.close()
+    return matrix
+
+def getWeightMatrix(model, member="classifier-model", sparse=False):
+    """
+    The weight matrix (see readWeightMatrix) of an SVM multiclass model stored in a TEES
+    Model. The parsed matrix is cached in the Model as the member with WEIGHT_CACHE_EXTENSION
+    added, and is used as long as the SVM model has the size and checksum it was parsed
+    from. The cache member is stored in the model file when the Model is saved.
+    """
+    modelfile = model.get(member)
+    signature = getModelSignature(modelfile)
+    cacheName = member + WEIGHT_CACHE_EXTENSION
+    if model.hasMember(cacheName):
+        cacheFile = model.get(cacheName)
+        if os.path.exists(cacheFile):
+            matrix = loadWeightMatrix(cacheFile, sparse, signature)
+            if matrix is not None:
+                return matrix
+    matrix = readWeightMatrix(modelfile, sparse)
+    saveWeightMatrix(matrix, model.get(cacheName, True), signature)
+    return matrix
+
+def getSupportVectors(modelfile, valueToFloat=True):
+    """
+    The weights of each class of an SVM multiclass model. With numpy, these are the
+    rows of the weight matrix. Otherwise (or if the values are kept as strings) they
+    are lists with 0 for the missing features.
+    """
+    if numpyAvailable and valueToFloat:
+        return list(readWeightMatrix(modelfile))
+    numClasses, numFeatures, highestIndex = parseModel(modelfile)
+    numFeaturesPerClass = highestIndex / numClasses
+    indices, values = parseSupportVectorLine(readLastLine(modelfile), valueToFloat)
+    weights = [0] * (numClasses * numFeaturesPerClass)
     num = 0
-    for token in tokens:
-        newNum, value = token.split(":")
-        newNum = int(newNum)
-        if valueToFloat:
-            value = float(value)
-        assert newNum > num
-        while newNum - num > 1:
-            svs[-1].append(0)
-            if len(svs[-1]) == numFeaturesPerClass:
-                svs.append([])
-            num += 1
-        svs[-1].append(value)
-        if len(svs[-1]) == numFeaturesPerClass:
-            svs.append([])
-        num = newNum
-    while num < highestIndex - 1:
-        svs[-1].append(0)
-        num += 1
-    #print len(svs)
-    if numpyAvailable:
-        for i in range(len(svs)):
-            svs[i] = numpy.array(svs[i])
-    #for i in range(len(svs)):
-    #    print len(svs[i])
-    return svs
+    for index, value in zip(indices, values):
+        assert index > num
+        weights[index - 1] = value
+        num = index
+    return [weights[i:i + numFeaturesPerClass] for i in range(0, len(weights), numFeaturesPerClass)]
 
 def getSupportVectorsTest(line, numClasses, numFeatures=-1):
     print line[-500:]
@@ -142,6 +265,11 @@ def mapIds(featureIds, modelFile):
     f.close()
 
 def getWeights(svs):
+    if numpyAvailable and (isinstance(svs, numpy.ndarray) or isinstance(svs[0], numpy.ndarray)):
+        # The highest absolute weight of each feature over all classes
+        weights = numpy.abs(numpy.asarray(svs)).max(axis=0).tolist()
+        weights.append(0)
+        return weights
     numFeatures = len(svs[0])
     #print numFeatures
     weights = [0]
@@ -201,7 +329,8 @@ if __name__=="__main__":
     from optparse import OptionParser # For using command line options
     optparser = OptionParser(description="Joachims SVM Multiclass model file processing")
     optparser.add_option("-i", "--ids", default=None, dest="ids", help="SVM feature ids")
-    optparser.add_option("-m", "--model", default=None, dest="model", help="SVM model file")
+    optparser.add_option("-m", "--model", default=None, dest="model", help="SVM model file, or a TEES model (a directory or a zip file)")
+    optparser.add_option("-t", "--tag", default="", dest="tag", help="Detector tag of the classifier model in a TEES model (e.g. trigger-)")
     optparser.add_option("-o", "--output", default=None, dest="output", help="Output file stem")
     (options, args) = optparser.parse_args()
 
@@ -212,9 +341,17 @@ if __name__=="__main__":
 
     
     #mapIds("a",model)
-    s = getSupportVectors(options.model)
+    if options.model.endswith(".zip") or os.path.isdir(options.model):
+        # The weight matrix is cached in the TEES model, so repeated inspection doesn't parse the SVM model
+        from Core.Model import Model
+        model = Model(options.model, "a")
+        s = getWeightMatrix(model, options.tag + "classifier-model")
+        if options.ids == None:
+            options.ids = model.get(options.tag + "ids.features")
+        model.save()
+    else:
+        s = getSupportVectors(options.model)
     print "vectors:", len(s)
-    s = s[0:-1]
     #writeModel(s, model, "temp.txt")
     #tokenizeModel(model, "tokenized.txt")
     w = getWeights(s)
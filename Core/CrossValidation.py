@@ -0,0 +1,131 @@
+"""
+Cross-validation over an example file.
+
+The examples are divided into document-consistent folds with
+DivideExamples in one pass, which also writes the training set of each
+fold. A classifier is then trained on each training set and used to classify
+the held-out fold. The classifiers submit their jobs through a Connection,
+so all folds are trained concurrently: a local UnixConnection with a jobLimit
+runs them as a pool of local processes, and a cluster connection (e.g. SLURM)
+runs them as cluster jobs. When the jobs are done, each fold is evaluated and
+the mean, variance and standard deviation of the fold scores are reported.
+"""
+import sys, os
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/..")
+import math
+import json
+import multiprocessing
+import Core.DivideExamples as DivideExamples
+import Core.ExampleUtils as ExampleUtils
+import Utils.ClassRegistry as ClassRegistry
+import Utils.Connection.Connection as Connection
+
+def getLocalConnection(jobLimit=None):
+    """
+    A local connection which runs at most jobLimit jobs (by default the number of CPUs) at the same time.
+    """
+    if jobLimit == None:
+        jobLimit = multiprocessing.cpu_count()
+    return Connection.getConnection("connection=Unix:jobLimit=" + str(jobLimit))
+
+def getStatistics(values):
+    """
+    The mean, (sample) variance and standard deviation of a list of values.
+    """
+    values = [x for x in values if x != None]
+    if len(values) == 0:
+        return {"n":0, "mean":None, "variance":None, "stdev":None}
+    mean = sum(values) / float(len(values))
+    if len(values) > 1:
+        variance = sum([(x - mean) ** 2 for x in values]) / float(len(values) - 1)
+    else:
+        variance = 0.0
+    return {"n":len(values), "mean":mean, "variance":variance, "stdev":math.sqrt(variance),
+            "min":min(values), "max":max(values)}
+
+def getFoldFiles(examples, outDir, folds):
+    """
+    The held-out and training example file paths of each fold.
+    """
+    name = os.path.basename(examples)
+    ext = ".gz" if name.endswith(".gz") else ""
+    if ext != "":
+        name = name[:-len(ext)]
+    testFiles = [os.path.join(outDir, "fold" + str(i), name + "-test" + ext) for i in range(folds)]
+    trainFiles = [os.path.join(outDir, "fold" + str(i), name + "-train" + ext) for i in range(folds)]
+    return testFiles, trainFiles
+
+def crossValidate(examples, outDir, folds=10, parameters=None, classIds=None, classifier="SVMMultiClassClassifier",
+                  evaluator="AveragingMultiClassEvaluator", connection=None, seed=0, output=None):
+    """
+    Run a cross-validation experiment. The fold jobs are submitted through the connection
+    (a local process pool by default) and evaluated when all of them have finished.
+    Returns the per-fold scores and their statistics.
+    """
+    outDir = os.path.abspath(outDir)
+    for i in range(folds):
+        if not os.path.exists(os.path.join(outDir, "fold" + str(i))):
+            os.makedirs(os.path.join(outDir, "fold" + str(i)))
+    testFiles, trainFiles = getFoldFiles(examples, outDir, folds)
+    counts = DivideExamples.divideExamples(examples, testFiles, trainFiles, seed)
+
+    if connection == None:
+        connection = getLocalConnection()
+    elif not hasattr(connection, "submit"):
+        connection = Connection.getConnection(connection)
+    Classifier = ClassRegistry.getClass(classifier, "classifier")
+    Evaluator = ClassRegistry.getClass(evaluator, "evaluator")
+    # Submit the training and classification of all folds
+    trained = []
+    for i in range(folds):
+        print >> sys.stderr, "Submitting fold", i, "(" + str(counts[i]) + " test examples)"
+        trained.append(Classifier(connection).train(trainFiles[i], os.path.join(outDir, "fold" + str(i)), parameters, testFiles[i]))
+    connection.waitForJobs([x.getJob() for x in trained], pollIntervalSeconds=10)
+    # Evaluate the folds
+    results = {"examples":examples, "folds":[]}
+    for i in range(folds):
+        foldResult = {"fold":i, "examples":counts[i], "fscore":None}
+        if trained[i].getStatus() == "FINISHED":
+            predictions = trained[i].downloadPredictions()
+            evaluation = Evaluator.evaluate(testFiles[i], ExampleUtils.loadPredictions(predictions), classIds,
+                                            os.path.join(outDir, "fold" + str(i), "evaluation.csv"), verbose=False)
+            foldResult["fscore"] = evaluation.getData().fscore
+        else:
+            print >> sys.stderr, "No results for fold", i
+        results["folds"].append(foldResult)
+    results.update(getStatistics([x["fscore"] for x in results["folds"]]))
+    printResults(results)
+    if output != None:
+        f = open(output, "wt")
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.close()
+    return results
+
+def printResults(results):
+    print >> sys.stderr, "##### Cross-validation results #####"
+    for fold in results["folds"]:
+        print >> sys.stderr, "Fold", fold["fold"], "(" + str(fold["examples"]) + " examples):", fold["fscore"]
+    if results["n"] > 0:
+        print >> sys.stderr, "Mean %.4f, variance %.6f, stdev %.4f over %d folds" % (results["mean"], results["variance"], results["stdev"], results["n"])
+
+if __name__=="__main__":
+    from optparse import OptionParser
+    optparser = OptionParser(usage="%prog [options]\nCross-validate a classifier on an example file.")
+    optparser.add_option("-e", "--examples", default=None, dest="examples", help="Example file")
+    optparser.add_option("-o", "--output", default=None, dest="output", help="Output directory")
+    optparser.add_option("-f", "--folds", type="int", default=10, dest="folds", help="Number of folds")
+    optparser.add_option("-p", "--parameters", default=None, dest="parameters", help="Classifier parameters")
+    optparser.add_option("-c", "--classIds", default=None, dest="classIds", help="Class id file")
+    optparser.add_option("--classifier", default="SVMMultiClassClassifier", dest="classifier", help="Classifier class")
+    optparser.add_option("--evaluator", default="AveragingMultiClassEvaluator", dest="evaluator", help="Evaluator class")
+    optparser.add_option("--connection", default=None, dest="connection", help="Connection for the fold jobs (default: local, one job per CPU)")
+    optparser.add_option("-j", "--jobs", type="int", default=None, dest="jobs", help="Number of concurrent local jobs")
+    optparser.add_option("-s", "--seed", type="int", default=0, dest="seed", help="Seed for the document hash")
+    (options, args) = optparser.parse_args()
+    assert options.examples != None and options.output != None
+
+    connection = options.connection
+    if connection == None:
+        connection = getLocalConnection(options.jobs)
+    crossValidate(options.examples, options.output, options.folds, options.parameters, options.classIds, options.classifier,
+                  options.evaluator, connection, options.seed, os.path.join(options.output, "cross-validation.json"))
@@ -1,10 +1,16 @@
 """
 Pseudorandomly distributed subsets
+
+The examples of a document always go to the same fold. A document's fold is
+determined by hashing its id, so all fold files are written in a single pass
+over the example file, without first collecting the document ids.
 """
-__version__ = "$Revision: 1.4 $"
+__version__ = "$Revision: 1.5 $"
 
 import Split
 import sys
+import gzip
+import hashlib
 
 def getDocumentId(idString):
     return idString.rsplit(".",2)[0]
@@ -15,13 +21,15 @@ def getIdFromLine(line):
 
 def getDocumentIds(filename):
     documentIds = []
-    inputFile = open(filename, "rt")
+    seen = set()
+    inputFile = openFile(filename, "rt")
     try:
         for line in inputFile:
             if len(line) == 0 or line[0] == "#":
                 continue
             docId = getDocumentId(getIdFromLine(line))
-            if not docId in documentIds:
+            if not docId in seen:
+                seen.add(docId)
                 documentIds.append(docId)
     finally:
         inputFile.close()
@@ -34,43 +42,68 @@ def getDocumentFolds(documentIds, folds):
         division[documentIds[i]] = sample[i]
     return division
 
-def divideExamples(filename, outputFilenames):
-    print >> sys.stderr, "Reading document ids"
-    documentIds = getDocumentIds(filename)
-
-    print >> sys.stderr, "Dividing documents into folds"
-    division = getDocumentFolds(documentIds, len(outputFilenames))
+def getDocumentFold(docId, folds, seed=0):
+    """
+    The fold of a document, from the MD5 hash of its id. Unlike Python's built-in hash,
+    the result is the same on all platforms and in all processes.
+    """
+    return int(hashlib.md5(str(seed) + ":" + docId).hexdigest()[:8], 16) % folds
 
-    print >> sys.stderr, "Dividing examples"
-    
-    outputFiles = []
-    for name in outputFilenames:
-        outputFiles.append(open(name, "wt"))
+def openFile(filename, mode):
+    if filename.endswith(".gz"):
+        return gzip.open(filename, mode)
+    return open(filename, mode)
 
-    inputFile = open(filename, "rt")
+def divideExamples(filename, outputFilenames, trainFilenames=None, seed=0):
+    """
+    Divide the examples into len(outputFilenames) folds in one pass over the example file.
+    If trainFilenames are given, each of them receives the examples of all folds except the
+    corresponding one, i.e. the training set for testing on that fold. Returns the number of
+    examples per fold.
+    """
+    folds = len(outputFilenames)
+    assert trainFilenames == None or len(trainFilenames) == folds
+    print >> sys.stderr, "Dividing examples into", folds, "folds"
+    outputFiles = [openFile(x, "wt") for x in outputFilenames]
+    trainFiles = [openFile(x, "wt") for x in trainFilenames] if trainFilenames != None else []
+    foldByDocId = {}
+    counts = [0] * folds
+    inputFile = openFile(filename, "rt")
     try:
         for line in inputFile:
             if len(line) == 0 or line[0] == "#":
                 continue
             docId = getDocumentId(getIdFromLine(line))
-            outputFiles[division[docId]].write(line)
+            if docId not in foldByDocId:
+                foldByDocId[docId] = getDocumentFold(docId, folds, seed)
+            fold = foldByDocId[docId]
+            outputFiles[fold].write(line)
+            counts[fold] += 1
+            for i in range(len(trainFiles)):
+                if i != fold:
+                    trainFiles[i].write(line)
     finally:
         inputFile.close()
-
-    for outputFile in outputFiles:
-        outputFile.close()
+        for outputFile in outputFiles + trainFiles:
+            outputFile.close()
+    print >> sys.stderr, "Divided", len(foldByDocId), "documents, examples per fold:", counts
+    return counts
         
 if __name__=="__main__":
     from optparse import OptionParser
     defaultAnalysisFilename = "/usr/share/biotext/ComplexPPI/BioInferForComplexPPIVisible.xml"
-    optparser = OptionParser(usage="%prog [options]\nCreate an html visualization for a corpus.")
-    optparser.add_option("-i", "--input", default=defaultAnalysisFilename, dest="input", help="Corpus in analysis format", metavar="FILE")
+    optparser = OptionParser(usage="%prog [options]\nDivide an example file into document-consistent folds.")
+    optparser.add_option("-i", "--input", default=defaultAnalysisFilename, dest="input", help="Example file", metavar="FILE")
     optparser.add_option("-o", "--output", default="", dest="output", help="Output directory")
     optparser.add_option("-f", "--folds", type="int", default=10, dest="folds", help="X-fold cross validation")
+    optparser.add_option("-s", "--seed", type="int", default=0, dest="seed", help="Seed for the document hash")
+    optparser.add_option("--train", default=False, action="store_true", dest="train", help="Also write the training set of each fold")
     (options, args) = optparser.parse_args()
     
     outputFilenames = []
+    trainFilenames = []
     for i in range(options.folds):
         outputFilenames.append(options.output + options.input + ".fold" + str(i))
+        trainFilenames.append(options.output + options.input + ".train" + str(i))
 
-    divideExamples(options.input, outputFilenames)
\ No newline at end of file
+    divideExamples(options.input, outputFilenames, trainFilenames if options.train else None, options.seed)
@@ -0,0 +1,182 @@
+"""
+Removal of duplicate examples from example files.
+
+Two examples are duplicates if they have the same class and the same feature
+vector. Each example line is reduced to an MD5 digest of its canonicalized
+(feature id sorted) vector, optionally together with the id of the sentence
+the example comes from, so that only duplicates within a sentence are
+removed. The digests are kept in a DigestStore, which moves them to an on-disk
+database when the number of digests in memory grows too large, so files of
+any size can be processed in one streaming pass. Examples whose vector has
+already been seen with a different class are kept, but counted as
+conflicting.
+
+When training a detector, the training examples are deduplicated if the
+example style has the parameter example_dedup (example_dedup=sentence for
+removing only duplicates within a sentence).
+"""
+import sys, os
+import gzip
+import hashlib
+import shutil
+import tempfile
+import anydbm
+
+STYLE_KEYS = ["example_dedup"]
+
+def getSettings(style):
+    """
+    None if deduplication is not used, otherwise a dictionary with "bySentence".
+    """
+    if style == None or style.get("example_dedup") in (None, False):
+        return None
+    assert style["example_dedup"] in (True, "sentence"), ("Unknown example_dedup value", style["example_dedup"])
+    return {"bySentence":style["example_dedup"] == "sentence"}
+
+class DigestStore:
+    """
+    A mapping of example vector digests to the classes seen with them. At most
+    maxMemoryItems digests are kept in memory, the rest are moved to a temporary
+    database file.
+    """
+    def __init__(self, maxMemoryItems=1000000, tempDir=None):
+        self.maxMemoryItems = maxMemoryItems
+        self.tempDir = tempDir
+        self.memory = {}
+        self.db = None
+        self.dbDir = None
+
+    def get(self, digest):
+        if digest in self.memory:
+            return self.memory[digest]
+        if self.db != None and self.db.has_key(digest):
+            return self.db[digest]
+        return None
+
+    def set(self, digest, value):
+        if self.db != None and self.db.has_key(digest):
+            self.db[digest] = value
+            return
+        self.memory[digest] = value
+        if len(self.memory) > self.maxMemoryItems:
+            self._spill()
+
+    def _spill(self):
+        if self.db == None:
+            self.dbDir = tempfile.mkdtemp(dir=self.tempDir)
+            self.db = anydbm.open(os.path.join(self.dbDir, "digests"), "n")
+            print >> sys.stderr, "Moving example digests to", self.dbDir
+        for digest, value in self.memory.iteritems():
+            self.db[digest] = value
+        self.memory = {}
+
+    def close(self):
+        self.memory = {}
+        if self.db != None:
+            self.db.close()
+            self.db = None
+            shutil.rmtree(self.dbDir)
+            self.dbDir = None
+
+def getSentenceId(exampleId):
+    return exampleId.rsplit(".", 1)[0]
+
+def parseLine(line):
+    """
+    The class, the canonical feature vector string and the example id of an example line.
+    """
+    if "#" in line:
+        vector, comment = line.split("#", 1)
+    else:
+        vector, comment = line, ""
+    tokens = vector.split()
+    features = []
+    for token in tokens[1:]:
+        featureId, value = token.split(":", 1)
+        features.append((int(featureId), float(value)))
+    features.sort()
+    exampleId = None
+    for item in comment.split():
+        if item.startswith("id:"):
+            exampleId = item[3:]
+            break
+    return tokens[0], " ".join([str(x[0]) + ":" + repr(x[1]) for x in features]), exampleId
+
+def getDigest(vectorString, exampleId=None, bySentence=False):
+    if bySentence:
+        assert exampleId != None, "Example has no id"
+        vectorString = getSentenceId(exampleId) + "\t" + vectorString
+    return hashlib.md5(vectorString).digest()
+
+def openFile(filename, mode):
+    if filename.endswith(".gz"):
+        return gzip.open(filename, mode)
+    return open(filename, mode)
+
+def removeDuplicates(inputs, output=None, bySentence=False, maxMemoryItems=1000000, tempDir=None, verbose=True):
+    """
+    Remove duplicate examples from one or more example files. The files are processed
+    as a single set, i.e. an example is also a duplicate of examples in the earlier files.
+    If output is None, the deduplicated examples replace each input file, otherwise all
+    kept examples are written to the output file. Returns the duplicate statistics.
+    """
+    if isinstance(inputs, basestring):
+        inputs = [inputs]
+    store = DigestStore(maxMemoryItems, tempDir)
+    stats = {"examples":0, "kept":0, "duplicates":0, "conflicts":0, "conflictingVectors":0}
+    outFile = openFile(output, "wt") if output != None else None
+    try:
+        for filename in inputs:
+            if output == None:
+                tempOutput = filename + "-dedup" + (".gz" if filename.endswith(".gz") else "")
+                fileOut = openFile(tempOutput, "wt")
+            else:
+                fileOut = outFile
+            inFile = openFile(filename, "rt")
+            for line in inFile:
+                if line[0] == "#":
+                    fileOut.write(line)
+                    continue
+                stats["examples"] += 1
+                classId, vectorString, exampleId = parseLine(line)
+                digest = getDigest(vectorString, exampleId, bySentence)
+                classes = store.get(digest)
+                if classes == None:
+                    store.set(digest, classId)
+                elif classId in classes.split(","):
+                    stats["duplicates"] += 1
+                    continue
+                else:
+                    if "," not in classes:
+                        stats["conflictingVectors"] += 1
+                    stats["conflicts"] += 1
+                    store.set(digest, classes + "," + classId)
+                fileOut.write(line)
+                stats["kept"] += 1
+            inFile.close()
+            if output == None:
+                fileOut.close()
+                shutil.move(tempOutput, filename)
+    finally:
+        if outFile != None:
+            outFile.close()
+        store.close()
+    if verbose:
+        printStatistics(stats, bySentence)
+    return stats
+
+def printStatistics(stats, bySentence=False):
+    print >> sys.stderr, "Duplicate examples" + (" (within sentences)" if bySentence else "") + ":", stats["duplicates"], "of", stats["examples"], "removed,", stats["kept"], "kept"
+    if stats["conflicts"] > 0:
+        print >> sys.stderr, "Conflicting labels:", stats["conflictingVectors"], "feature vectors occur with several classes (" + str(stats["conflicts"]) + " extra examples)"
+
+if __name__=="__main__":
+    from optparse import OptionParser
+    optparser = OptionParser(usage="%prog [options]\nRemove examples with the same class and feature vector from example files.")
+    optparser.add_option("-i", "--input", default=None, dest="input", help="Comma-separated example files")
+    optparser.add_option("-o", "--output", default=None, dest="output", help="Output file (default: replace the input files)")
+    optparser.add_option("-s", "--sentence", default=False, action="store_true", dest="sentence", help="Remove duplicates only within each sentence")
+    optparser.add_option("-m", "--memory", default=1000000, type="int", dest="memory", help="Number of digests kept in memory")
+    (options, args) = optparser.parse_args()
+    assert options.input != None
+    removeDuplicates(options.input.split(","), options.output, options.sentence, options.memory)
@@ -46,19 +46,21 @@ def isDuplicate(example1, example2):
         return False
     return True
 
-def removeDuplicates(examples):
-    """ removes all but one of the examples that have the same class and identical feature vectors"""
-    duplicateList = [False] * len(examples)
-    for i in range(len(examples)):
-        if not duplicateList[i]:
-            for j in range(i+1, len(examples)):
-                if not duplicateList[j]:
-                    if isDuplicate(examples[i], examples[j]):
-                        duplicateList[j] = True
+def removeDuplicates(examples, bySentence=False):
+    """ 
+    removes all but one of the examples that have the same class and identical feature vectors.
+    If bySentence is True, only examples from the same sentence are compared. For example files,
+    see Core.ExampleDeduplication.
+    """
+    seen = set()
     newExamples = []
-    for i in range(len(examples)):
-        if not duplicateList[i]:
-            newExamples.append(examples[i])
+    for example in examples:
+        key = (example[1], tuple(sorted(example[2].iteritems())))
+        if bySentence:
+            key = (example[0].rsplit(".", 1)[0],) + key
+        if key not in seen:
+            seen.add(key)
+            newExamples.append(example)
     return newExamples
 
 def normalizeFeatureVectors(examples):
@@ -77,7 +79,11 @@ def copyExamples(examples):
         examplesCopy.append([example[0], example[1], example[2].copy(), example[3]])
     return examplesCopy
 
-def appendExamples(examples, file):
+def appendExamples(examples, file, featureCounts=None):
+    """
+    Write examples to an open file. If featureCounts (a FeatureSelection.FeatureCounter) is
+    given, the features of the written examples are counted.
+    """
     noneClassCount = 0
     for example in examples:
         # None-value as a class indicates a class that did not match an existing id,
@@ -106,6 +112,8 @@ def appendExamples(examples, file):
             if type(extraValue) in types.StringTypes:
                 file.write( " " + str(extraKey) + ":" + extraValue)
         file.write("\n")
+        if featureCounts != None:
+            featureCounts.add(example[1], keys)
     if noneClassCount != 0: 
         print >> sys.stderr, "Warning,", noneClassCount, "examples had an undefined class."
 
@@ -311,7 +319,7 @@ def loadPredictions(predictionsFile, recallAdjust=None, classRanges=None, thresh
             f.close() # end first iteration
             classRanges = RecallAdjust.getClassRangesFromPredictions(predictions)
             # Load predictions again with the range information
-            for yieldedValue in loadPredictions(predictionsFile, recallAdjust, classRanges):
+            for yieldedValue in loadPredictions(predictionsFile, recallAdjust, classRanges, threshold):
                 yield yieldedValue
             break
         else: # multiclass
@@ -325,30 +333,8 @@ def loadPredictions(predictionsFile, recallAdjust=None, classRanges=None, thresh
                 if split != "N/A":
                     split = float(split)
                 pred.append(split)
-            # Recall adjust
-            if recallAdjust != None and recallAdjust != 1.0:
-                if classRanges == None:
-                    pred[1] = RecallAdjust.scaleVal(pred[1], recallAdjust)
-                else: # SVM multiclass two class "binary" classification 
-                    pred[1] = RecallAdjust.scaleRange(pred[1], recallAdjust, classRanges[1])
-                #if pred[0] == 1:
-                maxStrength = pred[1]
-                pred[0] = 1
-                for i in range(2, len(pred)):
-                    if pred[i] > maxStrength:
-                        maxStrength = pred[i]
-                        pred[0] = i
-            # Thresholding
-            if threshold != None:
-                if pred[1] > threshold:
-                    pred[0] = 1
-                else:
-                    maxStrength = pred[2]
-                    pred[0] = 2
-                    for i in range(2, len(pred)):
-                        if pred[i] > maxStrength:
-                            maxStrength = pred[i]
-                            pred[0] = i       
+            # Recall adjust and thresholding
+            RecallAdjust.adjustPrediction(pred, recallAdjust, classRanges[1] if classRanges != None else None, threshold)
             # Return the prediction
             yield pred
     #finally:
@@ -0,0 +1,167 @@
+"""
+Hashed feature ids.
+
+Instead of giving each feature name the next free id from a shared
+dictionary (IdSet), the name is hashed with MurmurHash3 into a fixed space
+of 2^bits ids. No dictionary needs to be built, locked or saved, so builders
+in different processes produce the same ids independently and the model does
+not need a feature id file. Different names may share an id. With signed
+hashing, a second hash bit gives the sign of the feature value, so that the
+values of colliding features do not all push the learned weight to the same
+direction. The optional audit keeps the names seen for each id, for
+reporting the collisions.
+
+Hashing is enabled with the example style parameter feature_hash (optionally
+feature_hash=bits, default 20). feature_hash_signed and feature_hash_audit
+enable signed hashing and the collision audit.
+"""
+import sys, os
+import struct
+import codecs
+from collections import defaultdict
+try:
+    import mmh3
+except ImportError:
+    mmh3 = None
+
+STYLE_KEYS = ["feature_hash", "feature_hash_signed", "feature_hash_audit"]
+DEFAULT_BITS = 20
+
+def murmur3(data, seed=0):
+    """
+    MurmurHash3 (x86, 32-bit) of a byte string as an unsigned integer. The mmh3 module
+    is used if available.
+    """
+    if mmh3 != None:
+        return mmh3.hash(data, seed) & 0xffffffff
+    c1, c2 = 0xcc9e2d51, 0x1b873593
+    length = len(data)
+    numBlocks = length // 4
+    h1 = seed & 0xffffffff
+    for k1 in struct.unpack_from("<" + str(numBlocks) + "I", data):
+        k1 = (k1 * c1) & 0xffffffff
+        k1 = ((k1 << 15) | (k1 >> 17)) & 0xffffffff
+        k1 = (k1 * c2) & 0xffffffff
+        h1 ^= k1
+        h1 = ((h1 << 13) | (h1 >> 19)) & 0xffffffff
+        h1 = (h1 * 5 + 0xe6546b64) & 0xffffffff
+    tail = data[numBlocks * 4:]
+    k1 = 0
+    if len(tail) >= 3:
+        k1 ^= ord(tail[2]) << 16
+    if len(tail) >= 2:
+        k1 ^= ord(tail[1]) << 8
+    if len(tail) >= 1:
+        k1 ^= ord(tail[0])
+        k1 = (k1 * c1) & 0xffffffff
+        k1 = ((k1 << 15) | (k1 >> 17)) & 0xffffffff
+        k1 = (k1 * c2) & 0xffffffff
+        h1 ^= k1
+    h1 ^= length
+    h1 ^= h1 >> 16
+    h1 = (h1 * 0x85ebca6b) & 0xffffffff
+    h1 ^= h1 >> 13
+    h1 = (h1 * 0xc2b2ae35) & 0xffffffff
+    h1 ^= h1 >> 16
+    return h1
+
+def getSettings(style):
+    """
+    The hashing settings (bits, signed, audit) of a parsed example style, or None if hashing is not used.
+    """
+    if style == None or style.get("feature_hash") in (None, False):
+        return None
+    bits = style["feature_hash"]
+    bits = DEFAULT_BITS if bits == True else int(bits)
+    assert bits > 0 and bits <= 31, ("Illegal number of feature hash bits", bits)
+    return bits, style.get("feature_hash_signed") not in (None, False), style.get("feature_hash_audit") not in (None, False)
+
+class HashedIdSet:
+    """
+    A replacement for the feature IdSet, which maps names to ids 1...2^bits by hashing. The
+    hashes of recently used names are cached, but the cache is cleared when it grows beyond
+    cacheSize names, so memory use stays bounded.
+    """
+    def __init__(self, bits=DEFAULT_BITS, signed=False, audit=False, seed=0, cacheSize=500000):
+        self.bits = bits
+        self.mask = (1 << bits) - 1
+        self.signed = signed
+        self.seed = seed
+        self.cache = {}
+        self.cacheSize = cacheSize
+        self.audit = audit
+        self.namesById = defaultdict(set) if audit else None
+        self.allowNewIds = True
+        self.locked = False
+
+    def getSignedId(self, key, createIfNotExist=None):
+        """
+        The id and the sign (1 or -1) of a name.
+        """
+        if key not in self.cache:
+            if len(self.cache) >= self.cacheSize:
+                self.cache = {}
+            if type(key) == unicode:
+                h = murmur3(key.encode("utf-8"), self.seed)
+            else:
+                h = murmur3(key, self.seed)
+            featureId = (h & self.mask) + 1
+            self.cache[key] = (featureId, -1 if h & 0x80000000 else 1)
+            if self.audit:
+                self.namesById[featureId].add(key)
+        return self.cache[key]
+
+    def getId(self, key, createIfNotExist=None):
+        return self.getSignedId(key)[0]
+
+    def __getitem__(self, name):
+        return self.getId(name)
+
+    def getName(self, id):
+        """
+        One of the names audited for an id, or None.
+        """
+        if self.audit and id in self.namesById:
+            return sorted(self.namesById[id])[0]
+        return None
+
+    def getNames(self):
+        """
+        The audited names. Without the audit, the names are not kept.
+        """
+        if not self.audit:
+            return []
+        names = set()
+        for idNames in self.namesById.itervalues():
+            names.update(idNames)
+        return sorted(names)
+
+    def getIds(self):
+        return sorted(self.namesById.keys()) if self.audit else []
+
+    def write(self, filename):
+        """
+        Hashed ids need no id file, but an empty one is written so that the model has the
+        member expected for the feature ids.
+        """
+        open(filename, "wt").close()
+
+    def getCollisions(self):
+        return dict([(x, sorted(self.namesById[x])) for x in self.namesById if len(self.namesById[x]) > 1])
+
+    def writeAudit(self, filename=None):
+        """
+        Report the audited collisions to stderr and optionally as a tab-separated file with the id,
+        the number of names and the names of each id shared by several names.
+        """
+        if not self.audit:
+            return
+        collisions = self.getCollisions()
+        numNames = sum([len(x) for x in self.namesById.itervalues()])
+        print >> sys.stderr, "Feature hashing (" + str(self.bits) + " bits):", numNames, "names,", len(self.namesById), "ids,", len(collisions), "ids with collisions covering", sum([len(x) for x in collisions.itervalues()]), "names"
+        if filename != None:
+            f = codecs.open(filename, "wt", "utf-8")
+            for featureId in sorted(collisions, key=lambda x: (-len(collisions[x]), x)):
+                f.write(str(featureId) + "\t" + str(len(collisions[featureId])) + "\t" + "\t".join(collisions[featureId]) + "\n")
+            f.close()
+            print >> sys.stderr, "Feature hash collisions written to", filename
@@ -0,0 +1,185 @@
+"""
+Frequency and class based feature selection for example files.
+
+The ExampleBuilders define an id for every feature they encounter. When
+feature selection is enabled in the example style, the document frequency
+(the number of examples a feature occurs in) of each feature is counted per
+class while the examples are written. After all example files of a training
+set have been built, the features are pruned by a minimum count and
+optionally by keeping the top k features per class by chi-squared or
+information gain. The surviving features are renumbered consecutively, the
+example files are rewritten with the new ids and the feature IdSet is
+replaced with one containing only the surviving features. As the builders
+used for classification load this IdSet with new ids disallowed, pruned
+features are left out of the classification examples.
+
+Example style parameters:
+  feature_min_count=N   keep features occurring in at least N examples
+  feature_select=chi2   rank features for each class by chi-squared ("ig" for information gain)
+  feature_top_k=K       keep the union of the K highest ranked features of each class
+"""
+import sys, os
+import gzip
+import math
+import shutil
+import types
+from collections import defaultdict
+from Core.IdSet import IdSet
+
+STYLE_KEYS = ["feature_min_count", "feature_select", "feature_top_k"]
+METHODS = ["chi2", "ig"]
+
+class FeatureCounter:
+    """
+    Counts the examples each feature occurs in, for each class.
+    """
+    def __init__(self):
+        self.numExamples = 0
+        self.classExamples = defaultdict(int)
+        self.counts = defaultdict(int)
+        self.classCounts = defaultdict(lambda: defaultdict(int))
+
+    def add(self, classId, featureIds):
+        self.numExamples += 1
+        self.classExamples[classId] += 1
+        counts = self.counts
+        classCounts = self.classCounts[classId]
+        for featureId in featureIds:
+            if featureId != None:
+                counts[featureId] += 1
+                classCounts[featureId] += 1
+
+def getSettings(style):
+    """
+    The feature selection settings of an example style, or None if feature selection is not used.
+    """
+    if style == None:
+        return None
+    settings = dict([(x, style[x]) for x in STYLE_KEYS if style.get(x) not in (None, False)])
+    if len(settings) == 0:
+        return None
+    assert style.get("feature_hash") in (None, False), "Feature selection can't be used with hashed feature ids"
+    if "feature_select" in settings:
+        assert settings["feature_select"] in METHODS, ("Unknown feature selection method", settings["feature_select"])
+        assert "feature_top_k" in settings, "feature_select requires feature_top_k"
+    for key in ("feature_min_count", "feature_top_k"):
+        if key in settings:
+            settings[key] = int(settings[key])
+    return settings
+
+def chi2(a, b, c, d):
+    """
+    Chi-squared for a 2x2 table of feature and class co-occurrence counts: a = feature and class,
+    b = feature and not class, c = class without feature, d = neither.
+    """
+    n = a + b + c + d
+    denominator = float((a + c) * (b + d) * (a + b) * (c + d))
+    if denominator == 0:
+        return 0.0
+    return n * (a * d - c * b) ** 2 / denominator
+
+def _entropy(counts):
+    total = float(sum(counts))
+    if total == 0:
+        return 0.0
+    return -sum([(x / total) * math.log(x / total, 2) for x in counts if x > 0])
+
+def informationGain(a, b, c, d):
+    """
+    The information gain of the feature on the class vs. not class distribution (see chi2 for the counts).
+    """
+    n = float(a + b + c + d)
+    if n == 0:
+        return 0.0
+    return _entropy([a + c, b + d]) - ((a + b) / n) * _entropy([a, b]) - ((c + d) / n) * _entropy([c, d])
+
+def select(counter, settings, verbose=True):
+    """
+    The ids of the features kept, sorted.
+    """
+    minCount = settings.get("feature_min_count", 1)
+    candidates = [x for x in counter.counts if counter.counts[x] >= minCount]
+    if verbose:
+        print >> sys.stderr, "Features occurring in at least", minCount, "examples:", len(candidates), "/", len(counter.counts)
+    if "feature_select" not in settings:
+        return sorted(candidates)
+    score = chi2 if settings["feature_select"] == "chi2" else informationGain
+    topK = settings["feature_top_k"]
+    n = counter.numExamples
+    selected = set()
+    for classId in sorted(counter.classExamples.keys()):
+        classCount = counter.classExamples[classId]
+        classCounts = counter.classCounts[classId]
+        scores = []
+        for featureId in candidates:
+            a = classCounts.get(featureId, 0)
+            b = counter.counts[featureId] - a
+            c = classCount - a
+            scores.append((score(a, b, c, n - classCount - b), featureId))
+        scores.sort(key=lambda x: (-x[0], x[1]))
+        selected.update([x[1] for x in scores[:topK]])
+    if verbose:
+        print >> sys.stderr, "Features in the top", topK, "by", settings["feature_select"], "of the", len(counter.classExamples), "classes:", len(selected)
+    return sorted(selected)
+
+def remapIdSet(featureIdFile, keptIds):
+    """
+    Replace the feature IdSet file with one containing only the kept features, numbered
+    consecutively in their original order. Returns the old id to new id mapping.
+    """
+    featureSet = IdSet(filename=featureIdFile)
+    newSet = IdSet()
+    idMap = {}
+    for featureId in keptIds:
+        name = featureSet.getName(featureId)
+        assert name != None, ("Feature id not defined", featureId, featureIdFile)
+        idMap[featureId] = newSet.getId(name)
+    newSet.write(featureIdFile)
+    return idMap
+
+def remapExampleFile(filename, idMap):
+    """
+    Rewrite an example file with the features not in idMap removed and the others renumbered.
+    """
+    if filename.endswith(".gz"):
+        inFile, outFile = gzip.open(filename, "rt"), gzip.open(filename + "-remap", "wt")
+    else:
+        inFile, outFile = open(filename, "rt"), open(filename + "-remap", "wt")
+    removed = 0
+    for line in inFile:
+        if "#" in line:
+            line, comment = line.split("#", 1)
+            comment = "#" + comment
+        else:
+            line, comment = line.rstrip("\n"), "\n"
+        tokens = line.split()
+        features = []
+        for token in tokens[1:]:
+            featureId, value = token.split(":", 1)
+            featureId = int(featureId)
+            if featureId in idMap:
+                features.append(str(idMap[featureId]) + ":" + value)
+            else:
+                removed += 1
+        outFile.write(" ".join([tokens[0]] + features) + " " + comment)
+    inFile.close()
+    outFile.close()
+    shutil.move(filename + "-remap", filename)
+    return removed
+
+def apply(counter, settings, featureIdFile, exampleFiles, verbose=True):
+    """
+    Select features and rewrite the feature IdSet file and the example files accordingly.
+    Returns a dictionary describing the selection.
+    """
+    print >> sys.stderr, "Feature selection:", settings
+    keptIds = select(counter, settings, verbose)
+    idMap = remapIdSet(featureIdFile, keptIds)
+    for exampleFile in exampleFiles:
+        removed = remapExampleFile(exampleFile, idMap)
+        if verbose:
+            print >> sys.stderr, "Removed", removed, "feature values from", exampleFile
+    result = dict(settings)
+    result.update({"features":len(counter.counts), "kept":len(keptIds), "examples":counter.numExamples})
+    print >> sys.stderr, "Kept", len(keptIds), "of", len(counter.counts), "features"
+    return result
@@ -0,0 +1,40 @@
+"""
+Typed access to the prediction confidences of interaction XML elements.
+
+The ExampleWriters store the classifier confidences of each predicted element
+as a "label:confidence,label:confidence" string attribute (usually "conf").
+Code that needs the values should use the accessors in this module instead of
+splitting the strings itself.
+"""
+
+NOT_AVAILABLE = "N/A"
+
+def parse(predictionString):
+    """
+    Parse a prediction string into a list of (label, confidence) pairs. Confidences
+    not available ("N/A") are returned as None.
+    """
+    if predictionString == None or predictionString == "":
+        return []
+    pairs = []
+    for labelConfidence in predictionString.split(","):
+        label, confidence = labelConfidence.rsplit(":", 1)
+        pairs.append((label, float(confidence) if confidence != NOT_AVAILABLE else None))
+    return pairs
+
+def toString(labels, confidences, skipLabels=None):
+    """
+    Render labels and confidences as a prediction string.
+    """
+    parts = []
+    for label, confidence in zip(labels, confidences):
+        if skipLabels != None and label in skipLabels:
+            continue
+        parts.append(label + ":" + (str(confidence) if confidence != None else NOT_AVAILABLE))
+    return ",".join(parts)
+
+def getPredictions(element, attribute="conf"):
+    """
+    The (label, confidence) pairs of an element, parsed from the string attribute.
+    """
+    return parse(element.get(attribute))
@@ -10,7 +10,9 @@ import sys, os
 thisPath = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(os.path.abspath(os.path.join(thisPath,"..")))
 import Utils.ElementTreeUtils as ETUtils
+import Core.Predictions as Predictions
 import math
+import types
 from optparse import OptionParser
 import sys
 
@@ -32,46 +34,45 @@ def scaleRange(val, boost, classRange):
     #        return -val - 1
     return val
 
-def adjustEntity(entityNode,targetLabel,multiplier,classRange=None):
-    """Adjust the confidence of targetLabel in entityNode by multiplier"""
-    predictions=entityNode.get("predictions")
-    if not predictions: #nothing to do
-        return
+def adjustPredictions(pairs,targetLabel,multiplier,classRange=None):
+    """Adjust the confidence of targetLabel in a list of (label, confidence) pairs by multiplier.
+    Returns the adjusted pairs and the label with the highest confidence."""
     maxConfidence=None
     maxLabel=None
-    labMod=[] #list with modified "label:confidence"
-    for labelConfidence in predictions.split(","):
-        label,confidence=labelConfidence.split(":")
-        confidence=float(confidence)
-        if label!=targetLabel: #nothing to do
-            labMod.append(labelConfidence)
-        else:
+    adjusted=[]
+    for label,confidence in pairs:
+        if label==targetLabel:
             if classRange == None: #multiclass
-                confidence=scaleVal(float(confidence),multiplier) #modify...
+                confidence=scaleVal(confidence,multiplier) #modify...
             else: #binary
-                confidence=scaleRange(float(confidence),multiplier, classRange[label]) #modify...
-            labMod.append(label+":"+str(confidence))
+                confidence=scaleRange(confidence,multiplier,classRange[label]) #modify...
+        adjusted.append((label,confidence))
         if maxConfidence==None or maxConfidence<confidence:
             maxConfidence=confidence
             maxLabel=label
+    return adjusted, maxLabel
 
+def adjustEntity(entityNode,targetLabel,multiplier,classRange=None,attribute="predictions"):
+    """Adjust the confidence of targetLabel in entityNode by multiplier"""
+    pairs=Predictions.getPredictions(entityNode,attribute)
+    if not pairs: #nothing to do
+        return
+    adjusted, maxLabel = adjustPredictions(pairs,targetLabel,multiplier,classRange)
     #Done
-    entityNode.set("predictions",",".join(labMod))
+    entityNode.set(attribute,Predictions.toString([x[0] for x in adjusted],[x[1] for x in adjusted]))
     entityNode.set("type",maxLabel)
     
-def getClassRanges(entities):
+def getClassRanges(entities,attribute="predictions"):
     classRanges = {}
     for entity in entities:
         if entity.get("given") == "True":
             continue
-        predictions=entity.get("predictions")
-        if predictions:
-            for labelConfidence in predictions.split(","):
-                label,confidence=labelConfidence.split(":")
-                confidence=float(confidence)
-                if not classRanges.has_key(label):
-                    classRanges[label] = [sys.maxint,-sys.maxint]
-                classRanges[label] = [min(classRanges[label][0], confidence), max(classRanges[label][1], confidence)]
+        for label,confidence in Predictions.getPredictions(entity,attribute):
+            if confidence == None: # not available
+                continue
+            if not classRanges.has_key(label):
+                classRanges[label] = [sys.maxint,-sys.maxint]
+            classRanges[label] = [min(classRanges[label][0], confidence), max(classRanges[label][1], confidence)]
     return classRanges
 
 def getClassRangesFromPredictions(predictions):
@@ -82,10 +83,130 @@ def getClassRangesFromPredictions(predictions):
             classRanges[cls][1] = max(float(prediction[cls]), classRanges[cls][1])
     return classRanges       
 
+def adjustPrediction(pred, recallAdjust=None, classRange=None, threshold=None):
+    """
+    Recall adjust and threshold a classifier prediction in the format of
+    ExampleUtils.loadPredictions ([class, confidence1, confidence2, ...], where
+    class 1 is the negative class). The prediction list is modified in place.
+    """
+    if recallAdjust != None and recallAdjust != 1.0:
+        if classRange == None:
+            pred[1] = scaleVal(pred[1], recallAdjust)
+        else: # SVM multiclass two class "binary" classification 
+            pred[1] = scaleRange(pred[1], recallAdjust, classRange)
+        maxStrength = pred[1]
+        pred[0] = 1
+        for i in range(2, len(pred)):
+            if pred[i] > maxStrength:
+                maxStrength = pred[i]
+                pred[0] = i
+    if threshold != None:
+        if pred[1] > threshold:
+            pred[0] = 1
+        else:
+            maxStrength = pred[2]
+            pred[0] = 2
+            for i in range(2, len(pred)):
+                if pred[i] > maxStrength:
+                    maxStrength = pred[i]
+                    pred[0] = i
+    return pred
+
+class RecallAdjustEngine:
+    """
+    Recall adjustment of the same classifications with many boost values.
+    
+    The classifications are read once and, if numpy is available, their confidences
+    are stored in a matrix, so that the labels for a boost value are produced with a
+    single vectorized scaling and argmax over all examples. The result is identical to
+    loading the classifications with ExampleUtils.loadPredictions and the same recallAdjust
+    and threshold. Only the boost value that is actually used needs to be turned into
+    prediction lists (getPredictions) and written to XML by the ExampleWriter. Without
+    numpy, the predictions are adjusted one at a time with adjustPrediction.
+    """
+    def __init__(self, predictions, threshold=None, source=None):
+        self.predictions = predictions
+        self.threshold = threshold
+        self.source = source
+        self.classRange = None
+        self.confidences = None
+        if len(predictions) == 0 or len(predictions[0]) == 1: # true binary, can't be adjusted
+            return
+        if len(predictions[0]) == 3: # SVM multiclass two class "binary" classification
+            self.classRange = getClassRangesFromPredictions(predictions)[1]
+        # numpy is imported only here, as this module is used also by ExampleUtils
+        try:
+            import numpy
+        except ImportError:
+            return
+        widths = set([len(x) for x in predictions])
+        if len(widths) == 1 and not any(["N/A" in x for x in predictions]):
+            self.confidences = numpy.array([x[1:] for x in predictions], dtype=numpy.float64)
+            self.labels = [x[0] for x in predictions]
+    
+    @classmethod
+    def fromFile(cls, classifications, threshold=None):
+        import Core.ExampleUtils as ExampleUtils
+        return cls(list(ExampleUtils.loadPredictions(classifications)), threshold, classifications)
+    
+    def getConfidences(self, boost=None):
+        """
+        The confidence matrix with the negative class (the first column) scaled by boost.
+        """
+        if boost == None or boost == 1.0:
+            return self.confidences
+        import numpy
+        adjusted = self.confidences.copy()
+        negative = adjusted[:,0]
+        if self.classRange == None: # scaleVal
+            absolute = numpy.abs(negative)
+            adjusted[:,0] = numpy.where(negative >= 0, negative * boost, negative + (absolute * boost - absolute))
+        elif boost < 1.0: # scaleRange
+            adjusted[:,0] = numpy.where((negative > 0) & (negative < (1.0 - boost) * self.classRange[1]), -negative - 1, negative)
+        return adjusted
+    
+    def getLabels(self, boost=None, confidences=None):
+        """
+        The predicted class of each example for a boost value.
+        """
+        if self.confidences is None:
+            return [x[0] for x in self.getPredictions(boost)]
+        import numpy
+        if confidences is None:
+            confidences = self.getConfidences(boost)
+        if self.threshold != None:
+            labels = numpy.where(confidences[:,0] > self.threshold, 1, numpy.argmax(confidences[:,1:], axis=1) + 2)
+        elif boost == None or boost == 1.0:
+            return list(self.labels)
+        else: # The first maximum, as in adjustPrediction
+            labels = numpy.argmax(confidences, axis=1) + 1
+        return labels.tolist()
+    
+    def countLabels(self, boost=None):
+        counts = {}
+        for label in self.getLabels(boost):
+            if type(label) == types.ListType:
+                label = tuple(label)
+            counts[label] = counts.get(label, 0) + 1
+        return counts
+    
+    def getPredictions(self, boost=None):
+        """
+        The adjusted predictions in the format of ExampleUtils.loadPredictions.
+        """
+        if self.confidences is None:
+            if len(self.predictions) > 0 and len(self.predictions[0]) == 1:
+                assert boost == None or boost == 1.0 # not implemented for binary classification
+                return [list(x) for x in self.predictions]
+            return [adjustPrediction(list(x), boost, self.classRange, self.threshold) for x in self.predictions]
+        confidences = self.getConfidences(boost)
+        labels = self.getLabels(boost, confidences)
+        return [[label] + row for label, row in zip(labels, confidences.tolist())]
+
 class RecallAdjust:    
 
     @classmethod
-    def run(cls,inFile,multiplier=1.0,outFile=None,targetLabel="neg", binary=False):
+    def run(cls,inFile,multiplier=1.0,outFile=None,targetLabel="neg", binary=False, attribute="predictions"):
         """inFile can be a string with file name (.xml or .xml.gz) or an ElementTree or an Element or an open input stream
         multiplier adjusts the level of boosting the non-negative predictions, it is a real number (0,inf)
         multiplier 1.0 does nothing, <1.0 decreases negative class confidence, >1.0 increases negative class confidence
@@ -101,7 +222,7 @@ class RecallAdjust:
         if multiplier != -1:
             if binary:
                 print >> sys.stderr, "Recall binary mode"
-                classRanges = getClassRanges(root.getiterator("entity"))
+                classRanges = getClassRanges(root.getiterator("entity"),attribute)
                 assert len(classRanges.keys()) in [0,2]
                 if len(classRanges.keys()) == 0:
                     print >> sys.stderr, "Warning, recall adjustment skipped because no prediction weights found"
@@ -109,7 +230,7 @@ class RecallAdjust:
                 print >> sys.stderr, "Recall multiclass mode"
                 classRanges = None
             for entityNode in root.getiterator("entity"):
-                adjustEntity(entityNode,targetLabel,multiplier,classRanges)
+                adjustEntity(entityNode,targetLabel,multiplier,classRanges,attribute)
         if outFile:
             ETUtils.write(root,outFile)
         return tree
@@ -121,6 +242,7 @@ if __name__=="__main__":
     parser.add_option("-o", "--output", default=None, dest="output", help="Predictions in interaction XML", metavar="FILE")
     parser.add_option("-l","--lambda",dest="l",action="store",default=None,type="float",help="The adjustment weight for the negative class. 1.0 does nothing, <1.0 decreases the predictions, >1.0 increases the predictions. No default.")
     parser.add_option("-t","--targetLabel",dest="targetLabel",action="store",default="neg",help="The label of the class to be adjusted. Defaults to 'neg'.")
+    parser.add_option("-a","--attribute",dest="attribute",action="store",default="predictions",help="The element attribute containing the predictions. Defaults to 'predictions'.")
 
     (options, args) = parser.parse_args()
 
@@ -129,4 +251,4 @@ if __name__=="__main__":
         sys.exit(1)
 
     #RecallAdjust.run(sys.stdin,options.l,sys.stdout,options.targetLabel)
-    RecallAdjust.run(options.input,options.l,options.output,options.targetLabel)
+    RecallAdjust.run(options.input,options.l,options.output,options.targetLabel,attribute=options.attribute)
@@ -14,15 +14,21 @@ import re
 
 #multiedges = True
 
-def loadCorpus(corpus, parse, tokenization=None, removeNameInfo=False, removeIntersentenceInteractionsFromCorpusElements=True):
+def loadCorpus(corpus, parse, tokenization=None, removeNameInfo=False, removeIntersentenceInteractionsFromCorpusElements=True, cacheDir=None):
     """
     Load an entire corpus through CorpusElements and add SentenceGraph-objects
-    to its SentenceElements-objects.
+    to its SentenceElements-objects. If a SentenceGraphCache directory is defined
+    (cacheDir or the SENTENCE_GRAPH_CACHE_DIR setting), the graphs of a corpus file
+    are built using the cached head token mappings.
     """
     import Utils.ElementTreeUtils as ETUtils
     import sys
     from Utils.ProgressCounter import ProgressCounter
     from Utils.InteractionXML.CorpusElements import CorpusElements
+    from SentenceGraphCache import CorpusCache
+    
+    graphCache = CorpusCache(corpus, {"loader":"loadCorpus", "parse":parse, "tokenization":tokenization, "removeNameInfo":removeNameInfo, 
+                                      "removeIntersentenceInteractions":removeIntersentenceInteractionsFromCorpusElements}, cacheDir)
     
     # Corpus may be in file or not
     if type(corpus) == types.StringType:
@@ -60,7 +66,9 @@ def loadCorpus(corpus, parse, tokenization=None, removeNameInfo=False, removeInt
         # Construct the basic SentenceGraph (only syntactic information)
         graph = SentenceGraph(sentence.sentence, sentence.tokens, sentence.dependencies)
         # Add semantic information, i.e. the interactions
-        graph.mapInteractions(sentence.entities + [x for x in sentence.sentence.iter("span")], sentence.interactions)
+        skeleton = graphCache.get(graph.getSentenceId(), len(graph.tokens), len(graph.dependencies))
+        graph.mapInteractions(sentence.entities + [x for x in sentence.sentence.iter("span")], sentence.interactions, skeleton=skeleton)
+        graphCache.add(graph.getSentenceId(), graph)
         graph.interSentenceInteractions = sentence.interSentenceInteractions
         duplicateInteractionEdgesRemoved += graph.duplicateInteractionEdgesRemoved
         sentence.sentenceGraph = graph
@@ -69,13 +77,17 @@ def loadCorpus(corpus, parse, tokenization=None, removeNameInfo=False, removeInt
         
         #graph.mapEntityHints()
     print >> sys.stderr, "Skipped", duplicateInteractionEdgesRemoved, "duplicate interaction edges in SentenceGraphs"
+    graphCache.save()
     return corpusElements
 
-def getCorpusIterator(input, output, parse, tokenization=None, removeNameInfo=False, removeIntersentenceInteractions=True):
+def getCorpusIterator(input, output, parse, tokenization=None, removeNameInfo=False, removeIntersentenceInteractions=True, cacheDir=None):
     import Utils.ElementTreeUtils as ETUtils
     from Utils.InteractionXML.SentenceElements import SentenceElements
+    from SentenceGraphCache import CorpusCache
     #import xml.etree.cElementTree as ElementTree
     
+    graphCache = CorpusCache(input, {"loader":"getCorpusIterator", "parse":parse, "tokenization":tokenization, 
+                                     "removeIntersentenceInteractions":removeIntersentenceInteractions}, cacheDir)
     if output != None:
         etWriter = ETUtils.ETWriter(output)
     for eTuple in ETUtils.ETIteratorFromObj(input, ("start", "end")):
@@ -91,7 +103,9 @@ def getCorpusIterator(input, output, parse, tokenization=None, removeNameInfo=Fa
                     # Construct the basic SentenceGraph (only syntactic information)
                     graph = SentenceGraph(sentence.sentence, sentence.tokens, sentence.dependencies)
                     # Add semantic information, i.e. the interactions
-                    graph.mapInteractions(sentence.entities, sentence.interactions)
+                    skeleton = graphCache.get(graph.getSentenceId(), len(graph.tokens), len(graph.dependencies))
+                    graph.mapInteractions(sentence.entities, sentence.interactions, skeleton=skeleton)
+                    graphCache.add(graph.getSentenceId(), graph)
                     graph.interSentenceInteractions = sentence.interSentenceInteractions
                     #duplicateInteractionEdgesRemoved += graph.duplicateInteractionEdgesRemoved
                     sentence.sentenceGraph = graph
@@ -110,6 +124,7 @@ def getCorpusIterator(input, output, parse, tokenization=None, removeNameInfo=Fa
             element.clear()
     if output != None:
         etWriter.close()
+    graphCache.save()
 
 class SentenceGraph:
     """
@@ -146,6 +161,8 @@ class SentenceGraph:
         self.entityGraph = None
         self.duplicateInteractionEdgesRemoved = 0
         self.tokenHeadScores = None
+        self.tokenRangeIndex = None
+        self.headIndices = None # the mapped entity ids and their head token indices, for SentenceGraphCache
         # Merged graph
         self.mergedEntities = None
         self.mergedEntityToDuplicates = None
@@ -182,6 +199,27 @@ class SentenceGraph:
     def getSentenceId(self):
         return self.sentenceElement.get("id")
     
+    def getTokenRangeIndex(self):
+        """
+        Return a Range.RangeIndex mapping the token character offsets to token
+        indices. The index is built once per sentence and used for mapping the
+        entities to the tokens.
+        """
+        if self.tokenRangeIndex == None:
+            self.tokenRangeIndex = Range.RangeIndex([(Range.charOffsetToSingleTuple(self.tokens[i].get("charOffset")), i) for i in range(len(self.tokens))])
+        return self.tokenRangeIndex
+    
+    def getOverlappingTokens(self, offsets):
+        """
+        Return the tokens overlapping any of the offsets, in token order. A token
+        is listed once for each offset it overlaps.
+        """
+        tokenRangeIndex = self.getTokenRangeIndex()
+        indices = []
+        for offset in offsets:
+            indices.extend(tokenRangeIndex.overlapping(offset))
+        return [self.tokens[i] for i in sorted(indices)]
+    
     def makeEntityGraph(self, entities, interactions, entityToDuplicates=None):
         graph = Graph()
         graph.addNodes(entities)
@@ -263,7 +301,7 @@ class SentenceGraph:
 #                rv.append(interaction)
 #        return rv
     
-    def mapInteractions(self, entityElements, interactionElements, verbose=False):
+    def mapInteractions(self, entityElements, interactionElements, verbose=False, skeleton=None):
         """
         Maps the semantic interactions to the syntactic graph.
         
@@ -279,6 +317,8 @@ class SentenceGraph:
         @type interactionElements: list of cElementTree.Element objects
         @param verbose: Print selected head tokens on screen
         @param verbose: boolean
+        @param skeleton: cached head tokens and token head scores from a SentenceGraphCache
+        @type skeleton: dictionary
         """     
         self.interactions = interactionElements
         self.entities = entityElements
@@ -300,8 +340,17 @@ class SentenceGraph:
         self.entitiesById = {}
         self.entityHeadTokenByEntity = {}
         sentenceSpan = (0, len(self.sentenceElement.get("text"))) # for validating the entity offsets
-        for entity in self.entities[:]:
-            headToken = self.mapEntity(entity, verbose)
+        entityIds = [x.get("id") for x in self.entities]
+        cachedHeads = None
+        if skeleton != None and skeleton["entities"] == entityIds:
+            cachedHeads = skeleton["heads"]
+            if skeleton["scores"] != None and self.tokenHeadScores == None:
+                self.setTokenHeadScores(skeleton["scores"])
+        tokenIndex = dict([(self.tokens[i], i) for i in range(len(self.tokens))])
+        heads = []
+        for i, entity in enumerate(self.entities[:]):
+            headToken = self.mapEntity(entity, verbose, cachedHeads[i] if cachedHeads != None else None)
+            heads.append(tokenIndex[headToken] if headToken != None else -1)
             if entity.tag != "entity":
                 self.entities.remove(entity)
             elif headToken != None:
@@ -313,6 +362,7 @@ class SentenceGraph:
                     raise Exception("Entity " + entity.get("id") + ", charOffset " + entity.get("charOffset") + ", does not overlap with sentence " + self.sentenceElement.get("id") + ", length " + str(sentenceSpan[1]) )
                 # Assume there simply is no token corresponding to the entity
                 self.entities.remove(entity)
+        self.headIndices = (entityIds, heads)
         self._markNamedEntities()
         
         for interaction in self.interactions:
@@ -347,7 +397,7 @@ class SentenceGraph:
                 # TODO: "skipped" would be better than "removed"
                 self.duplicateInteractionEdgesRemoved += 1
     
-    def mapEntity(self, entityElement, verbose=False):
+    def mapEntity(self, entityElement, verbose=False, headIndex=None):
         """
         Determine the head token for a named entity or trigger. The head token is the token closest
         to the root for the subtree of the dependency parse spanned by the text of the element.
@@ -356,7 +406,11 @@ class SentenceGraph:
         @type entityElement: cElementTree.Element
         @param verbose: Print selected head tokens on screen
         @param verbose: boolean
+        @param headIndex: a previously determined head token index (-1 for none)
+        @type headIndex: int
         """
+        if headIndex != None:
+            return self._setEntityHead(entityElement, self.tokens[headIndex] if headIndex >= 0 else None)
         headOffset = None
         if entityElement.get("headOffset") != None:
             headOffset = Range.charOffsetToSingleTuple(entityElement.get("headOffset"))
@@ -366,21 +420,14 @@ class SentenceGraph:
             charOffsets = []
         # Each entity can consist of multiple syntactic tokens, covered by its
         # charOffset-range. One of these must be chosen as the head token.
-        headTokens = [] # potential head tokens
-        for token in self.tokens:
-            #print token.attrib["id"], token.attrib["charOffset"]
-            tokenOffset = Range.charOffsetToSingleTuple(token.get("charOffset"))
-            if headOffset != None and entityElement.get("type") != "Binding":
-                # A head token can already be defined in the headOffset-attribute.
-                # However, depending on the tokenization, even this range may
-                # contain multiple tokens. Still, it can always be assumed that
-                # if headOffset is defined, the corret head token is in this range.
-                if Range.overlap(headOffset,tokenOffset):
-                    headTokens.append(token)
-            else:
-                for offset in charOffsets:
-                    if Range.overlap(offset,tokenOffset):
-                        headTokens.append(token)
+        if headOffset != None and entityElement.get("type") != "Binding":
+            # A head token can already be defined in the headOffset-attribute.
+            # However, depending on the tokenization, even this range may
+            # contain multiple tokens. Still, it can always be assumed that
+            # if headOffset is defined, the corret head token is in this range.
+            headTokens = self.getOverlappingTokens([headOffset]) # potential head tokens
+        else:
+            headTokens = self.getOverlappingTokens(charOffsets) # potential head tokens
         if len(headTokens)==1: # An unambiguous head token was found
             token = headTokens[0]
         else: # One head token must be chosen from the candidates
@@ -411,6 +458,9 @@ class SentenceGraph:
             if verbose:
                 print >> sys.stderr, "Selected head:", token.get("id"), token.get("text")
         #assert token != None, entityElement.get("id")
+        return self._setEntityHead(entityElement, token)
+    
+    def _setEntityHead(self, entityElement, token):
         if token != None:
             # The ElementTree entity-element is modified by setting the headOffset attribute
             if entityElement.get("headOffset") == None or entityElement.get("headOffset") != token.get("charOffset"):
@@ -610,6 +660,15 @@ class SentenceGraph:
             token.set("headScore", str(self.tokenHeadScores[token]))
             
         return self.tokenHeadScores
+    
+    def setTokenHeadScores(self, scores):
+        """
+        Set previously calculated token head scores (a list in token order), as in getTokenHeadScores.
+        """
+        self.tokenHeadScores = {}
+        for token, score in zip(self.tokens, scores):
+            self.tokenHeadScores[token] = score
+            token.set("headScore", str(score))
 
     def _markNamedEntities(self):
         """
@@ -629,21 +688,18 @@ class SentenceGraph:
         for entity in self.entities:
             entityOffsets = Range.charOffsetToTuples(entity.get("charOffset"))
             entityHeadOffset = Range.charOffsetToSingleTuple(entity.get("headOffset"))
-            for token in self.tokens:
-                tokenOffset = Range.charOffsetToSingleTuple(token.get("charOffset"))
-                for entityOffset in entityOffsets:
-                    if Range.overlap(entityOffset, tokenOffset):
-                        self.tokenIsEntity[token] = True
-                        if entity.get("given") == "True":
-                            self.tokenIsName[token] = True
-#                        if entity.get("given") != None:
-#                            if entity.get("given") == "True":
-#                                self.tokenIsName[token] = True
-#                        else:
-#                            entity.set("given", "True")
-#                            self.tokenIsName[token] = True
-                if Range.overlap(entityHeadOffset, tokenOffset):
-                    self.tokenIsEntityHead[token].append(entity)
+            for token in self.getOverlappingTokens(entityOffsets):
+                self.tokenIsEntity[token] = True
+                if entity.get("given") == "True":
+                    self.tokenIsName[token] = True
+#                if entity.get("given") != None:
+#                    if entity.get("given") == "True":
+#                        self.tokenIsName[token] = True
+#                else:
+#                    entity.set("given", "True")
+#                    self.tokenIsName[token] = True
+            for token in self.getOverlappingTokens([entityHeadOffset]):
+                self.tokenIsEntityHead[token].append(entity)
                                                           
     def getTokenText(self, token):
         """
@@ -0,0 +1,162 @@
+"""
+On-disk cache of the derived data of SentenceGraphs.
+
+The SentenceGraphs of a corpus refer to the ElementTree elements of the
+corpus, so the XML must always be parsed. Most of the rest of the graph
+building time is spent on mapping the entities to their head tokens, which
+requires the token head scores of the dependency parse. For each sentence,
+the cache stores a compact skeleton of these results: the numbers of tokens
+and dependencies (for validation), the head token index of each mapped entity
+and the token head scores. When the corpus is loaded again, the graphs are
+rehydrated from the skeletons instead of being recomputed.
+
+The cache entries are keyed by the MD5 hash of the corpus file content and the
+loading options (parse, tokenization etc.), so an entry is never used for a
+modified corpus. The hash of each corpus path is kept in an index together
+with the file's mtime and size, so that a file is rehashed only when these
+change. The cache is enabled by defining the SENTENCE_GRAPH_CACHE_DIR setting.
+"""
+import sys, os
+import hashlib
+import json
+import cPickle as pickle
+from array import array
+
+VERSION = 1
+
+def getCacheDir(cacheDir=None):
+    """
+    The cache directory, from the SENTENCE_GRAPH_CACHE_DIR setting if not given. None if caching is disabled.
+    """
+    if cacheDir == None:
+        import Utils.Settings as Settings
+        cacheDir = getattr(Settings, "SENTENCE_GRAPH_CACHE_DIR", None)
+    if cacheDir in (None, False):
+        return None
+    return os.path.expanduser(cacheDir)
+
+def hashFile(path, blockSize=1024*1024):
+    md5 = hashlib.md5()
+    f = open(path, "rb")
+    while True:
+        block = f.read(blockSize)
+        if not block:
+            break
+        md5.update(block)
+    f.close()
+    return md5.hexdigest()
+
+class HashIndex:
+    """
+    The content hashes of corpus files, keyed by path and validated by mtime and size.
+    """
+    def __init__(self, cacheDir):
+        self.path = os.path.join(cacheDir, "index.json")
+        self.entries = {}
+        if os.path.exists(self.path):
+            f = open(self.path, "rt")
+            try:
+                self.entries = json.load(f)
+            except ValueError:
+                self.entries = {}
+            f.close()
+
+    def getHash(self, path):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        entry = self.entries.get(path)
+        if entry != None and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+            return entry["md5"]
+        md5 = hashFile(path)
+        self.entries[path] = {"mtime":stat.st_mtime, "size":stat.st_size, "md5":md5}
+        self.save()
+        return md5
+
+    def save(self):
+        tempPath = self.path + "-" + str(os.getpid())
+        f = open(tempPath, "wt")
+        json.dump(self.entries, f, indent=0, sort_keys=True)
+        f.close()
+        os.rename(tempPath, self.path)
+
+def getSkeleton(graph, entityIds, headIndices):
+    """
+    The cached data of a sentence graph. entityIds and headIndices list the entities passed
+    to SentenceGraph.mapEntity and the indices of their head tokens (-1 for no head).
+    """
+    scores = None
+    if graph.tokenHeadScores != None:
+        scores = array("i", [graph.tokenHeadScores[x] for x in graph.tokens])
+    return {"tokens":len(graph.tokens), "dependencies":len(graph.dependencies), "entities":entityIds,
+            "heads":array("i", headIndices), "scores":scores}
+
+class CorpusCache:
+    """
+    The skeletons of the sentence graphs of one corpus file with one set of loading options.
+    If the cache has no valid entry, the skeletons of the graphs built while loading the corpus
+    are collected with add and stored with save.
+    """
+    def __init__(self, corpus, options, cacheDir=None):
+        self.cacheDir = getCacheDir(cacheDir)
+        self.skeletons = None
+        self.newSkeletons = None
+        self.path = None
+        self.hits = 0
+        self.misses = 0
+        if self.cacheDir == None or not isinstance(corpus, basestring) or not os.path.isfile(corpus):
+            return
+        if not os.path.exists(self.cacheDir):
+            os.makedirs(self.cacheDir)
+        corpusHash = HashIndex(self.cacheDir).getHash(corpus)
+        optionHash = hashlib.md5(json.dumps(options, sort_keys=True)).hexdigest()[:12]
+        self.path = os.path.join(self.cacheDir, corpusHash + "-" + optionHash + ".graphs")
+        if os.path.exists(self.path):
+            self.skeletons = self.load(self.path)
+        if self.skeletons == None:
+            self.newSkeletons = {}
+        else:
+            print >> sys.stderr, "Using cached sentence graphs from", self.path
+
+    def isEnabled(self):
+        return self.path != None
+
+    def get(self, sentenceId, numTokens, numDependencies):
+        """
+        The skeleton of a sentence, or None if there is no valid skeleton for it.
+        """
+        if self.skeletons == None:
+            return None
+        skeleton = self.skeletons.get(sentenceId)
+        if skeleton == None or skeleton["tokens"] != numTokens or skeleton["dependencies"] != numDependencies:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return skeleton
+
+    def add(self, sentenceId, graph):
+        if self.newSkeletons != None and graph.headIndices != None:
+            self.newSkeletons[sentenceId] = getSkeleton(graph, *graph.headIndices)
+
+    def save(self):
+        if self.newSkeletons == None or self.path == None:
+            return
+        tempPath = self.path + "-" + str(os.getpid())
+        f = open(tempPath, "wb")
+        pickle.dump({"version":VERSION, "skeletons":self.newSkeletons}, f, pickle.HIGHEST_PROTOCOL)
+        f.close()
+        os.rename(tempPath, self.path)
+        print >> sys.stderr, "Cached", len(self.newSkeletons), "sentence graphs to", self.path
+        self.newSkeletons = None
+
+    def load(self, path):
+        f = open(path, "rb")
+        try:
+            data = pickle.load(f)
+        except Exception, e:
+            print >> sys.stderr, "Cannot read sentence graph cache", path + ":", e
+            return None
+        finally:
+            f.close()
+        if data.get("version") != VERSION:
+            return None
+        return data["skeletons"]
@@ -10,7 +10,11 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/..")
 from Core.Model import Model
 from StepSelector import StepSelector
 from StructureAnalyzer import StructureAnalyzer
+from ExampleBuilders.MultiExampleBuilder import MultiExampleBuilder
 import Utils.Parameters as Parameters
+import Utils.ClassRegistry as ClassRegistry
+import Core.FeatureSelection as FeatureSelection
+import Core.ExampleDeduplication as ExampleDeduplication
 import Evaluators.BioNLP11GeniaTools
 import types
 import time, datetime
@@ -132,8 +136,7 @@ class Detector():
         if parameters["TEES.classifier"] == None:
             return self.Classifier
         else:
-            exec "from Classifiers." + parameters["TEES.classifier"] + " import " + parameters["TEES.classifier"] + " as " + parameters["TEES.classifier"]
-            return eval(parameters["TEES.classifier"])
+            return ClassRegistry.getClass(parameters["TEES.classifier"], "classifier")
     
     def saveStr(self, name, value, model=None, modelMustExist=True):
         if type(model) in types.StringTypes:
@@ -192,24 +195,86 @@ class Detector():
             parameters = {"convert":False}
         return Parameters.get(parameters, {"convert":None, "evaluate":None, "scores":None, "a2Tag":None, "evalSubTasks":"123"})
     
-    def buildExamples(self, model, datas, outputs, golds=[], exampleStyle=None, saveIdsToModel=False, parse=None):
+    def buildExamples(self, model, datas, outputs, golds=[], exampleStyle=None, saveIdsToModel=False, parse=None, dedupOutputs=None, featureOutputs=None):
+        exampleStyle, parse = self.beginExamples(model, exampleStyle, parse)
+        featureCounts = self.getFeatureCounter(exampleStyle, saveIdsToModel, featureOutputs)
+        builtOutputs = []
+        for data, output, gold, append in self.getExampleJobs(datas, outputs, golds):
+            if data != None:
+                self.exampleBuilder.run(data, output, parse, None, exampleStyle, model.get(self.tag+"ids.classes", 
+                    True), model.get(self.tag+"ids.features", True), gold, append, saveIdsToModel,
+                    structureAnalyzer=self.structureAnalyzer, featureCounts=featureCounts if featureCounts != None and output in featureOutputs else None)
+                builtOutputs.append(output)
+        self.selectFeatures(model, exampleStyle, featureCounts, builtOutputs)
+        self.removeDuplicateExamples(model, exampleStyle, [x for x in builtOutputs if dedupOutputs != None and x in dedupOutputs])
+        self.endExamples(model, saveIdsToModel)
+    
+    def beginExamples(self, model, exampleStyle=None, parse=None):
         if exampleStyle == None:
             exampleStyle = model.getStr(self.tag+"example-style")
         if parse == None:
             parse = self.getStr(self.tag+"parse", model)
         self.structureAnalyzer.load(model)
         self.exampleBuilder.structureAnalyzer = self.structureAnalyzer
+        return exampleStyle, parse
+    
+    def getExampleJobs(self, datas, outputs, golds=[]):
+        """
+        List the (data, output, gold, append) combinations for example generation. A
+        data item can be a list of corpora, whose examples are appended to the same output.
+        """
+        jobs = []
         for data, output, gold in itertools.izip_longest(datas, outputs, golds, fillvalue=[]):
-            print >> sys.stderr, "Example generation for", output
             if not isinstance(data, (list, tuple)): data = [data]
             if not isinstance(gold, (list, tuple)): gold = [gold]
             append = False
             for dataSet, goldSet in itertools.izip_longest(data, gold, fillvalue=None):
-                if dataSet != None:
-                    self.exampleBuilder.run(dataSet, output, parse, None, exampleStyle, model.get(self.tag+"ids.classes", 
-                        True), model.get(self.tag+"ids.features", True), goldSet, append, saveIdsToModel,
-                        structureAnalyzer=self.structureAnalyzer)
+                jobs.append((dataSet, output, goldSet, append))
                 append = True
+        return jobs
+    
+    def getFeatureCounter(self, exampleStyle, saveIdsToModel=False, featureOutputs=None):
+        """
+        A FeatureCounter for the examples, if feature selection is defined in the example style. Features
+        are selected only when building the examples that define the ids saved to the model (i.e. in training),
+        and only the examples written to featureOutputs (the training example files) are counted.
+        """
+        if not saveIdsToModel or FeatureSelection.getSettings(Parameters.get(exampleStyle)) == None:
+            return None
+        if not featureOutputs:
+            print >> sys.stderr, "Warning, feature selection skipped because no training example files were defined"
+            return None
+        return FeatureSelection.FeatureCounter()
+    
+    def selectFeatures(self, model, exampleStyle, featureCounts, outputs):
+        """
+        Prune the features counted while building the examples, rewriting the example files and
+        the feature ids of the model.
+        """
+        if featureCounts == None:
+            return
+        settings = FeatureSelection.getSettings(Parameters.get(exampleStyle))
+        outputs = [x for i, x in enumerate(outputs) if x not in outputs[:i]]
+        result = FeatureSelection.apply(featureCounts, settings, model.get(self.tag+"ids.features"), outputs)
+        model.addStr(self.tag+"feature-selection", Parameters.toString(result))
+    
+    def removeDuplicateExamples(self, model, exampleStyle, outputs):
+        """
+        Remove duplicate examples from the example files, if deduplication is defined in the example
+        style. Only training example files should be deduplicated, as the examples that are classified
+        must correspond to the elements of the corpus.
+        """
+        settings = ExampleDeduplication.getSettings(Parameters.get(exampleStyle))
+        if settings == None or len(outputs) == 0:
+            return
+        outputs = [x for i, x in enumerate(outputs) if x not in outputs[:i]]
+        print >> sys.stderr, "Removing duplicate examples from", outputs
+        stats = ExampleDeduplication.removeDuplicates(outputs, bySentence=settings["bySentence"])
+        if model.mode != "r":
+            stats["bySentence"] = settings["bySentence"]
+            model.addStr(self.tag+"example-dedup", Parameters.toString(stats))
+    
+    def endExamples(self, model, saveIdsToModel=False):
         if hasattr(self.structureAnalyzer, "typeMap") and model.mode != "r":
             print >> sys.stderr, "Saving StructureAnalyzer.typeMap"
             self.structureAnalyzer.save(model)
@@ -225,7 +290,7 @@ class Detector():
                 print >> sys.stderr, "*", self.__class__.__name__ + ":" + state + "(ENTER)", "*"
                 self.enterStateTime = time.time()
             if steps != None:
-                self.select = StepSelector(steps, fromStep, toStep, omitSteps=omitSteps)
+                self.select = StepSelector(steps, fromStep, toStep, omitSteps=omitSteps, name=self.__class__.__name__ + ":" + state)
         else:
             assert self.state == state, (state, self.state)
             assert self.select.steps == steps, (steps, self.select.steps)
@@ -270,3 +335,38 @@ class Detector():
         
     def classify(self, data, model, output):
         pass
+
+def buildExamplesTogether(model, jobs, saveIdsToModel=False, dedupOutputs=None, featureOutputs=None):
+    """
+    Build the examples for several detectors with a shared pass over each corpus, instead of
+    running Detector.buildExamples for each of them in turn. The jobs are (detector, datas, outputs)
+    tuples with the arguments of Detector.buildExamples. The n:th data of all detectors is processed
+    before moving on to the next one, so class and feature ids are saved between the corpora just as
+    when the detectors are run separately. The example files in dedupOutputs are deduplicated
+    and the features of the example files in featureOutputs counted for feature selection
+    as in Detector.buildExamples.
+    """
+    settings = []
+    exampleJobs = []
+    featureCounts = []
+    for detector, datas, outputs in jobs:
+        settings.append(detector.beginExamples(model))
+        exampleJobs.append(detector.getExampleJobs(datas, outputs))
+        featureCounts.append(detector.getFeatureCounter(settings[-1][0], saveIdsToModel, featureOutputs))
+    for i in range(max([len(x) for x in exampleJobs])):
+        multiBuilder = MultiExampleBuilder()
+        for (detector, datas, outputs), (exampleStyle, parse), detectorJobs, detectorCounts in zip(jobs, settings, exampleJobs, featureCounts):
+            if i >= len(detectorJobs) or detectorJobs[i][0] == None:
+                continue
+            data, output, gold, append = detectorJobs[i]
+            if not append:
+                print >> sys.stderr, "Example generation for", output
+            classIds, featureIds = model.get(detector.tag+"ids.classes", True), model.get(detector.tag+"ids.features", True)
+            builder = detector.exampleBuilder.create(data, output, parse, None, exampleStyle, classIds, featureIds, gold, append, saveIdsToModel)
+            builder.featureCounts = detectorCounts if detectorCounts != None and output in featureOutputs else None
+            multiBuilder.add(builder, data, output, gold, append, saveIdsToModel, detector.structureAnalyzer)
+        multiBuilder.run()
+    for (detector, datas, outputs), (exampleStyle, parse), detectorJobs, detectorCounts in zip(jobs, settings, exampleJobs, featureCounts):
+        detector.selectFeatures(model, exampleStyle, detectorCounts, [x[1] for x in detectorJobs if x[0] != None])
+        detector.removeDuplicateExamples(model, exampleStyle, [x[1] for x in detectorJobs if x[0] != None and dedupOutputs != None and x[1] in dedupOutputs])
+        detector.endExamples(model, saveIdsToModel)
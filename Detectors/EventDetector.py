@@ -2,7 +2,7 @@ import sys, os
 import shutil
 import types
 import copy
-from Detector import Detector
+from Detector import Detector, buildExamplesTogether
 from EntityDetector import EntityDetector
 from EdgeDetector import EdgeDetector
 from UnmergingDetector import UnmergingDetector
@@ -113,10 +113,12 @@ class EventDetector(Detector):
                 self.structureAnalyzer.load(self.model)
             self.trainModifiers = self.structureAnalyzer.hasModifiers()
         if self.checkStep("EXAMPLES"):
-            self.triggerDetector.buildExamples(self.model, [optData.replace("-nodup", ""), trainData.replace("-nodup", "")], [self.workDir+self.triggerDetector.tag+"opt-examples.gz", self.workDir+self.triggerDetector.tag+"train-examples.gz"], saveIdsToModel=True)
-            self.edgeDetector.buildExamples(self.model, [optData.replace("-nodup", ""), trainData.replace("-nodup", "")], [self.workDir+self.edgeDetector.tag+"opt-examples.gz", self.workDir+self.edgeDetector.tag+"train-examples.gz"], saveIdsToModel=True)
+            # The corpora are read only once for all the detectors
+            exampleJobs = [(self.triggerDetector, [optData.replace("-nodup", ""), trainData.replace("-nodup", "")], [self.workDir+self.triggerDetector.tag+"opt-examples.gz", self.workDir+self.triggerDetector.tag+"train-examples.gz"]),
+                           (self.edgeDetector, [optData.replace("-nodup", ""), trainData.replace("-nodup", "")], [self.workDir+self.edgeDetector.tag+"opt-examples.gz", self.workDir+self.edgeDetector.tag+"train-examples.gz"])]
             if self.trainModifiers:
-                self.modifierDetector.buildExamples(self.model, [optData, trainData], [self.workDir+self.modifierDetector.tag+"opt-examples.gz", self.workDir+self.modifierDetector.tag+"train-examples.gz"], saveIdsToModel=True)             
+                exampleJobs.append((self.modifierDetector, [optData, trainData], [self.workDir+self.modifierDetector.tag+"opt-examples.gz", self.workDir+self.modifierDetector.tag+"train-examples.gz"]))
+            buildExamplesTogether(self.model, exampleJobs, saveIdsToModel=True, dedupOutputs=[x[2][1] for x in exampleJobs], featureOutputs=[x[2][1] for x in exampleJobs])
         if self.checkStep("BEGIN-MODEL"):
             #for model in [self.model, self.combinedModel]:
             #    if model != None:
@@ -208,7 +210,9 @@ class EventDetector(Detector):
             # Triggers and Boost (the trigger predictions are recalculated only when the relevant parameters change)
             if (prevParams == None) or (prevParams["trigger"] != params["trigger"]) or (prevParams["booster"] != params["booster"]):
                 print >> sys.stderr, "Classifying trigger examples for parameters", "trigger:" + str(params["trigger"]), "booster:" + str(params["booster"])
-                xml = self.triggerDetector.classifyToXML(self.optData, self.model, self.workDir+"grid-trigger-examples", self.workDir+"grid-", classifierModel=TRIGGER_MODEL_STEM + Parameters.toId(params["trigger"]), recallAdjust=params["booster"], useExistingExamples=True)
+                # The trigger classifier is rerun only when its parameters change, otherwise only the recall adjustment is redone
+                sameTriggers = (prevParams != None) and (prevParams["trigger"] == params["trigger"])
+                xml = self.triggerDetector.classifyToXML(self.optData, self.model, self.workDir+"grid-trigger-examples", self.workDir+"grid-", classifierModel=TRIGGER_MODEL_STEM + Parameters.toId(params["trigger"]), recallAdjust=params["booster"], useExistingExamples=True, useExistingClassifications=sameTriggers)
             prevParams = params
             ## Build edge examples
             #self.edgeDetector.buildExamples(self.model, [xml], [self.workDir+"grid-edge-examples"], [self.optData])
@@ -216,6 +220,7 @@ class EventDetector(Detector):
             edgeClassifierModel = EDGE_MODEL_STEM + Parameters.toId(params["edge"])
             xml = self.edgeDetector.classifyToXML(xml, self.model, self.workDir+"grid-edge-examples", self.workDir+"grid-", classifierModel=edgeClassifierModel, goldData=self.optData)
             bestResults = self.evaluateGrid(xml, params, bestResults)
+        self.triggerDetector.recallAdjustEngine = None
         # Remove remaining intermediate grid files
         for tag1 in ["edge", "trigger", "unmerging"]:
             for tag2 in ["examples", "pred.xml.gz"]:
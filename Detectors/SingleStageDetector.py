@@ -7,6 +7,7 @@ import Utils.ElementTreeUtils as ETUtils
 import Utils.Parameters as Parameters
 from Core.Model import Model
 import Core.ExampleUtils as ExampleUtils
+from Core.RecallAdjust import RecallAdjustEngine
 import Utils.STFormat.ConvertXML
 import Utils.STFormat.Compare
 #from Murska.CSCConnection import CSCConnection
@@ -27,6 +28,7 @@ class SingleStageDetector(Detector):
     def __init__(self):
         Detector.__init__(self)
         self.deleteCombinedExamples = True
+        self.recallAdjustEngine = None
         
     def beginModel(self, step, model, trainExampleFiles, testExampleFile, importIdsFromModel=None):
         """
@@ -112,7 +114,8 @@ class SingleStageDetector(Detector):
             print >> sys.stderr, self.structureAnalyzer.toString()
         self.model = self.openModel(model, "a") # Devel model already exists, with ids etc
         if self.checkStep("EXAMPLES"):
-            self.buildExamples(self.model, [optData, trainData], [self.workDir+self.tag+"opt-examples.gz", self.workDir+self.tag+"train-examples.gz"], saveIdsToModel=True)
+            self.buildExamples(self.model, [optData, trainData], [self.workDir+self.tag+"opt-examples.gz", self.workDir+self.tag+"train-examples.gz"], saveIdsToModel=True,
+                               dedupOutputs=[self.workDir+self.tag+"train-examples.gz"], featureOutputs=[self.workDir+self.tag+"train-examples.gz"])
         self.beginModel("BEGIN-MODEL", self.model, [self.workDir+self.tag+"train-examples.gz"], self.workDir+self.tag+"opt-examples.gz")
         self.endModel("END-MODEL", self.model, self.workDir+self.tag+"opt-examples.gz")
         if self.combinedModel != None:
@@ -151,7 +154,23 @@ class SingleStageDetector(Detector):
         self.deleteTempWorkDir()
         self.exitState()
         
-    def classifyToXML(self, data, model, exampleFileName=None, tag="", classifierModel=None, goldData=None, parse=None, recallAdjust=None, compressExamples=True, exampleStyle=None, useExistingExamples=False):
+    def loadPredictions(self, classifications, recallAdjust=None, threshold=None):
+        """
+        Load the classifications, recall adjusted. For a recall adjustment, the classifications
+        are kept in memory in a RecallAdjustEngine, so that adjusting the same file again with
+        another boost value (as in the EventDetector parameter grid) doesn't re-read it.
+        """
+        engine = self.recallAdjustEngine
+        key = (os.path.abspath(classifications), os.path.getmtime(classifications), threshold)
+        if engine == None or engine.source != key:
+            if recallAdjust == None or recallAdjust == 1.0:
+                return ExampleUtils.loadPredictions(classifications, recallAdjust, threshold=threshold)
+            engine = RecallAdjustEngine.fromFile(classifications, threshold)
+            engine.source = key
+            self.recallAdjustEngine = engine
+        return engine.getPredictions(recallAdjust)
+    
+    def classifyToXML(self, data, model, exampleFileName=None, tag="", classifierModel=None, goldData=None, parse=None, recallAdjust=None, compressExamples=True, exampleStyle=None, useExistingExamples=False, useExistingClassifications=False):
         model = self.openModel(model, "r")
         if parse == None:
             parse = self.getStr(self.tag+"parse", model)
@@ -168,10 +187,15 @@ class SingleStageDetector(Detector):
             classifierModel = model.get(self.tag+"classifier-model", defaultIfNotExist=None)
         #else:
         #    assert os.path.exists(classifierModel), classifierModel
-        classifier = self.getClassifier(model.getStr(self.tag+"classifier-parameter", defaultIfNotExist=None))()
-        classifier.classify(exampleFileName, tag+self.tag+"classifications", classifierModel, finishBeforeReturn=True)
+        classifications = tag+self.tag+"classifications"
+        if useExistingClassifications: # e.g. the same classifications with a different recall adjustment
+            assert os.path.exists(classifications), classifications
+        else:
+            classifier = self.getClassifier(model.getStr(self.tag+"classifier-parameter", defaultIfNotExist=None))()
+            classifier.classify(exampleFileName, classifications, classifierModel, finishBeforeReturn=True)
+            self.recallAdjustEngine = None
         threshold = model.getStr(self.tag+"threshold", defaultIfNotExist=None, asType=float)
-        predictions = ExampleUtils.loadPredictions(tag+self.tag+"classifications", recallAdjust, threshold=threshold)
+        predictions = self.loadPredictions(classifications, recallAdjust, threshold)
         evaluator = self.evaluator.evaluate(exampleFileName, predictions, model.get(self.tag+"ids.classes"))
         #outputFileName = tag+"-"+self.tag+"pred.xml.gz"
         #exampleStyle = self.exampleBuilder.getParameters(model.getStr(self.tag+"example-style"))
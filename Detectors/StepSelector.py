@@ -1,10 +1,13 @@
 import sys
 import types
 import time, datetime
+import Utils.Instrumentation as Instrumentation
 
 class StepSelector:
-    def __init__(self, steps, fromStep=None, toStep=None, verbose=True, omitSteps=None):
+    def __init__(self, steps, fromStep=None, toStep=None, verbose=True, omitSteps=None, name=None):
         self.steps = steps
+        self.name = name
+        self.instrumentedStep = None
         if type(omitSteps) in types.StringTypes:
             omitSteps = [omitSteps]
         self.omitSteps = omitSteps
@@ -49,9 +52,20 @@ class StepSelector:
 #        return allSteps[allStepsIndex]
     
     def printStepTime(self):
+        self._endInstrumentedStep()
         if self.currentStep != None and self.currentStepStartTime != None:
             print >> sys.stderr, "===", "EXIT STEP", self.currentStep + ": " + str(datetime.timedelta(seconds=time.time()-self.currentStepStartTime)), "==="
     
+    def _getInstrumentationName(self, step):
+        if self.name != None:
+            return self.name + ":" + step
+        return step
+    
+    def _endInstrumentedStep(self):
+        if self.instrumentedStep != None:
+            Instrumentation.end(self._getInstrumentationName(self.instrumentedStep))
+            self.instrumentedStep = None
+    
     def getStepStatus(self, step):
         if self.omitSteps != None and step in self.omitSteps:
             return "OMIT"
@@ -99,10 +113,13 @@ class StepSelector:
                     if self.verbose: print >> sys.stderr, "===", "EXIT STEP", self.currentStep, "time:", str(datetime.timedelta(seconds=time.time()-self.currentStepStartTime)), "==="
                 self.currentStep = step
                 self.currentStepStartTime = time.time()
+                self._endInstrumentedStep()
                 if self.omitSteps != None and step in self.omitSteps:
                     if self.verbose: print >> sys.stderr, "Omitting step", step
                     return False
                 else:
+                    Instrumentation.begin(self._getInstrumentationName(step))
+                    self.instrumentedStep = step
                     return True
             else:
                 if self.verbose: print >> sys.stderr, "Step", step, "already done, skipping."
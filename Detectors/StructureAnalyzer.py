@@ -6,6 +6,8 @@ import Utils.ElementTreeUtils as ETUtils
 from collections import defaultdict
 import types
 import collections
+import multiprocessing
+from Utils.FileUtils import getFileMd5
 
 class StructureAnalyzer():
     def __init__(self, defaultFileNameInModel="structure.txt"):
@@ -116,34 +118,38 @@ class StructureAnalyzer():
             self.typeMap["reverse"][shortId] = relTypes
         print "--------------------------------------------------------"           
     
-    def analyze(self, inputs, model=None, verbose=False):
+    def analyze(self, inputs, model=None, verbose=False, parallel=1, cacheDir=None):
+        """
+        Analyze the structure of one or more corpora. Each input is streamed
+        document by document and analyzed separately, after which the per-input
+        analyses are merged. Input files can be analyzed in parallel worker
+        processes, and their analyses can be cached in cacheDir, keyed by the
+        MD5 hash of the file content.
+        """
         self._init()  
         if type(inputs) in types.StringTypes or not isinstance(inputs, collections.Sequence):
             inputs = [inputs]
-        for xml in inputs:
-            print >> sys.stderr, "Analyzing", xml
-            xml = ETUtils.ETFromObj(xml)
-            
-            for document in xml.getiterator("document"):
-                # Collect elements into dictionaries
-                entityById = {}
-                for entity in document.getiterator("entity"):
-                    entityById[entity.get("id")] = entity
-                interactions = []
-                interactionsByE1 = defaultdict(list)
-                for interaction in document.getiterator("interaction"):
-                    interactions.append(interaction)
-                    interactionsByE1[interaction.get("e1")].append(interaction)
-                siteOfTypes = self.buildSiteOfMap(interactions, interactionsByE1, entityById)
-                # Add entity elements to analysis
-                for entity in document.getiterator("entity"):
-                    self.addEntityElement(entity, interactionsByE1)
-                # Add interaction elements to analysis
-                for interaction in interactions:
-                    self.addInteractionElement(interaction, entityById, siteOfTypes[interaction])
-                # Calculate event definition argument limits from event instances
-                for event in self.events.values():
-                    event.countArguments()
+        analyses = [None] * len(inputs)
+        for i in range(len(inputs)):
+            analyses[i] = self._loadCached(inputs[i], cacheDir)
+        pending = [i for i in range(len(inputs)) if analyses[i] == None]
+        if parallel > 1 and len(pending) > 1 and all([type(inputs[i]) in types.StringTypes for i in pending]):
+            print >> sys.stderr, "Analyzing", len(pending), "inputs in", min(parallel, len(pending)), "processes"
+            pool = multiprocessing.Pool(min(parallel, len(pending)))
+            results = pool.map(_analyzeToString, [inputs[i] for i in pending])
+            pool.close()
+            pool.join()
+            for i, result in zip(pending, results):
+                analyses[i] = StructureAnalyzer()
+                analyses[i].loadString(result)
+        else:
+            for i in pending:
+                analyses[i] = StructureAnalyzer()
+                analyses[i].analyzeInput(inputs[i])
+        for i in pending:
+            self._saveCached(inputs[i], cacheDir, analyses[i])
+        for analysis in analyses:
+            self.merge(analysis)
         
         self._updateSupportingAnalyses()
         if verbose:
@@ -151,6 +157,81 @@ class StructureAnalyzer():
         if model != None:
             self.save(model)
     
+    def analyzeInput(self, xml):
+        """
+        Add the documents of a single corpus to the analysis. The corpus is
+        read with ETUtils.ETIteratorFromObj, so only one document at a time is
+        kept in memory when reading from a file.
+        """
+        if not self.isInitialized():
+            self._init()
+        print >> sys.stderr, "Analyzing", xml
+        for event, element in ETUtils.ETIteratorFromObj(xml, ("start", "end")):
+            if event in ("end", "memory") and element.tag == "document":
+                self.analyzeDocument(element)
+            if event == "end" and element.tag in ("document", "corpus"):
+                element.clear()
+        self._updateSupportingAnalyses()
+    
+    def analyzeDocument(self, document):
+        # Collect elements into dictionaries
+        entityById = {}
+        for entity in document.getiterator("entity"):
+            entityById[entity.get("id")] = entity
+        interactions = []
+        interactionsByE1 = defaultdict(list)
+        for interaction in document.getiterator("interaction"):
+            interactions.append(interaction)
+            interactionsByE1[interaction.get("e1")].append(interaction)
+        siteOfTypes = self.buildSiteOfMap(interactions, interactionsByE1, entityById)
+        # Add entity elements to analysis
+        for entity in document.getiterator("entity"):
+            self.addEntityElement(entity, interactionsByE1)
+        # Add interaction elements to analysis
+        for interaction in interactions:
+            self.addInteractionElement(interaction, entityById, siteOfTypes[interaction])
+        # Calculate event definition argument limits from event instances
+        for event in self.events.values():
+            event.countArguments()
+    
+    def merge(self, other):
+        """
+        Merge the analysis of another corpus into this one. The result is the
+        same as if both corpora had been analyzed together.
+        """
+        if not self.isInitialized():
+            self._init()
+        for entityType in other.entities:
+            if entityType not in self.entities:
+                self.entities[entityType] = Entity(entityType)
+        for groupName in ("events", "relations", "modifiers", "targets", "givens"):
+            groups = getattr(self, groupName)
+            otherGroups = getattr(other, groupName)
+            for key in sorted(otherGroups.keys()):
+                if key not in groups:
+                    groups[key] = otherGroups[key]
+                else:
+                    groups[key].merge(otherGroups[key])
+    
+    def _getCachePath(self, xml, cacheDir):
+        if cacheDir == None or type(xml) not in types.StringTypes:
+            return None
+        return os.path.join(cacheDir, "structure-" + getFileMd5(xml) + ".txt")
+    
+    def _loadCached(self, xml, cacheDir):
+        cachePath = self._getCachePath(xml, cacheDir)
+        if cachePath == None or not os.path.exists(cachePath):
+            return None
+        print >> sys.stderr, "Using cached structure analysis", cachePath, "for", xml
+        analysis = StructureAnalyzer()
+        analysis.load(None, cachePath)
+        return analysis
+    
+    def _saveCached(self, xml, cacheDir, analysis):
+        cachePath = self._getCachePath(xml, cacheDir)
+        if cachePath != None:
+            analysis.save(None, cachePath)
+    
     def buildSiteOfMap(self, interactions, interactionsByE1, entityById):
         siteOfTypes = defaultdict(set)
         #interactionsByE2 = {}
@@ -593,7 +674,32 @@ class StructureAnalyzer():
                 if len(interactions) == len(keptInteractions) and len(entities) == len(keptEntities):
                     break
 
-        print >> sys.stderr, "Validation removed:", counts
+        if printCounts:
+            print >> sys.stderr, "Validation removed:", counts
+        return counts
+    
+    def validateStream(self, input, output, printCounts=True, simulation=False, debug=False):
+        """
+        Validate a corpus one document at a time, writing the validated documents
+        to output as they are processed.
+        """
+        counts = defaultdict(int)
+        etWriter = ETUtils.ETWriter(output)
+        for event, element in ETUtils.ETIteratorFromObj(input, ("start", "end")):
+            if event in ("end", "memory") and element.tag == "document":
+                for key, value in self.validate(element, False, simulation, debug).iteritems():
+                    counts[key] += value
+                etWriter.write(element)
+            elif element.tag == "corpus":
+                if event == "start":
+                    etWriter.begin(element)
+                elif event == "end":
+                    etWriter.end(element)
+            if event == "end" and element.tag in ("document", "corpus"):
+                element.clear()
+        etWriter.close()
+        if printCounts:
+            print >> sys.stderr, "Validation removed:", counts
         return counts
     
     # Saving and Loading ######################################################
@@ -656,6 +762,10 @@ class StructureAnalyzer():
         f = open(filename, "rt")
         lines = f.readlines()
         f.close()
+        self.loadString("".join(lines))
+    
+    def loadString(self, string):
+        lines = [x for x in string.split("\n") if x.strip() != ""]
         # initialize
         self._init()
         # add definitions
@@ -686,6 +796,12 @@ class StructureAnalyzer():
         
         self._updateSupportingAnalyses()
 
+def _analyzeToString(input):
+    # Worker function for StructureAnalyzer.analyze
+    analysis = StructureAnalyzer()
+    analysis.analyzeInput(input)
+    return analysis.toString()
+
 def rangeToTuple(string):
     assert string.startswith("["), string
     assert string.endswith("]"), string
@@ -706,6 +822,9 @@ class Group():
     def __repr__(self):
         return self.name + " " + self.type + "\t" + ",".join(sorted(list(self.targetTypes)))
     
+    def merge(self, other):
+        self.targetTypes.update(other.targetTypes)
+    
     def load(self, line):
         line = line.strip()
         if not line.startswith(self.name):
@@ -778,6 +897,20 @@ class Event():
         self._argumentsByE1Instance = defaultdict(lambda:defaultdict(int))
         self._firstInstanceCache = False
     
+    def merge(self, other):
+        # An argument type missing from the instances of either event has a minimum of zero
+        for argType in other.arguments:
+            if argType in self.arguments:
+                self.arguments[argType].merge(other.arguments[argType])
+            else:
+                self.arguments[argType] = other.arguments[argType]
+                self.arguments[argType].min = 0
+        for argType in self.arguments:
+            if argType not in other.arguments:
+                self.arguments[argType].min = 0
+        self.minArgs = min(self.minArgs, other.minArgs)
+        self.maxArgs = max(self.maxArgs, other.maxArgs)
+    
     def __repr__(self):
         s = "EVENT " + self.type + " [" + str(self.minArgs) + "," + str(self.maxArgs) + "]"
         for argType in sorted(self.arguments.keys()):
@@ -820,6 +953,12 @@ class Argument():
         if self.max == -1 or self.max < count:
             self.max = count
 
+    def merge(self, other):
+        self.addCount(other.min)
+        self.addCount(other.max)
+        self.targetTypes.update(other.targetTypes)
+        self.siteOfTypes.update(other.siteOfTypes)
+
     def __repr__(self):
         s = self.type
         if len(self.siteOfTypes) > 0:
@@ -841,6 +980,9 @@ class Modifier():
         self.type = modType
         self.entityTypes = set()
 
+    def merge(self, other):
+        self.entityTypes.update(other.entityTypes)
+
     def __repr__(self):
         return "MODIFIER " + self.type + "\t" + ",".join(sorted(list(self.entityTypes)))
     
@@ -877,6 +1019,16 @@ class Relation():
         elif self.e2Role != e2Role:
             raise Exception("Conflicting relation e2Role-attribute (" + str(e2Role) + ") for already defined relation of type " + self.type + " in relation " + id)
     
+    def merge(self, other):
+        self.e1Types.update(other.e1Types)
+        self.e2Types.update(other.e2Types)
+        for attrName in ("directed", "e1Role", "e2Role"):
+            value = getattr(other, attrName)
+            if getattr(self, attrName) == None:
+                setattr(self, attrName, value)
+            elif getattr(self, attrName) != value:
+                raise Exception("Conflicting relation " + attrName + "-attribute (" + str(value) + ") for already defined relation of type " + self.type)
+    
     def load(self, line):
         line = line.strip()
         if not line.startswith("RELATION"):
@@ -931,21 +1083,24 @@ if __name__=="__main__":
     optparser.add_option("-l", "--load", default=False, action="store_true", dest="load", help="Input is a saved structure analyzer file")
     optparser.add_option("-d", "--debug", default=False, action="store_true", dest="debug", help="Debug mode")
     optparser.add_option("-v", "--validate", default=None, dest="validate", help="validate input", metavar="FILE")
+    optparser.add_option("-p", "--parallel", default=1, type="int", dest="parallel", help="Number of processes for analyzing the input files")
+    optparser.add_option("-c", "--cache", default=None, dest="cache", help="Directory for cached analyses of the input files")
     (options, args) = optparser.parse_args()
     
     s = StructureAnalyzer()
     if options.load:
         s.load(None, options.input)
     else:
-        s.analyze(options.input.split(","))
+        s.analyze(options.input.split(","), parallel=options.parallel, cacheDir=options.cache)
     print >> sys.stderr, "--- Structure Analysis ----"
     print >> sys.stderr, s.toString()
     if options.validate != None:
         print >> sys.stderr, "--- Validation ----"
-        xml = ETUtils.ETFromObj(options.validate)
-        s.validate(xml, simulation=False, debug=options.debug)
         if options.output != None:
-            ETUtils.write(xml, options.output)
+            s.validateStream(options.validate, options.output, simulation=False, debug=options.debug)
+        else:
+            xml = ETUtils.ETFromObj(options.validate)
+            s.validate(xml, simulation=False, debug=options.debug)
     elif options.output != None:
         print >> sys.stderr, "Structure analysis saved to", options.output
         s.save(None, options.output)
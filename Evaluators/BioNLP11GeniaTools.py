@@ -97,13 +97,55 @@ def removeDocuments(path, folds, foldToRemove):
             if folds[numPart] == foldToRemove:
                 os.remove(os.path.join(path, file))
 
-def evaluateVariance(sourceDir, task, folds):
-    results = []
-    for i in range(folds):
-        results.append( evaluate(sourceDir, task, folds, i) )
+def linkDocuments(path, subsetPath, folds, foldToRemove):
+    """
+    Make a subset of a source directory without the documents of one fold. The files
+    are linked instead of copied where the platform allows it.
+    """
+    if not os.path.exists(subsetPath):
+        os.makedirs(subsetPath)
+    for file in os.listdir(path):
+        numPart = file.split(".",1)[0]
+        if numPart.isdigit():
+            assert folds.has_key(int(numPart))
+            if folds[int(numPart)] == foldToRemove:
+                continue
+        if hasattr(os, "symlink"):
+            os.symlink(os.path.abspath(os.path.join(path, file)), os.path.join(subsetPath, file))
+        else:
+            shutil.copy2(os.path.join(path, file), os.path.join(subsetPath, file))
+
+def _evaluateFold(args):
+    sourceDir, task, goldDir, folds, foldToRemove = args
+    result = evaluate(sourceDir, task, goldDir, folds=folds, foldToRemove=foldToRemove)
+    return result[0] if result != None else None
+
+def evaluateVariance(sourceDir, task, folds, goldDir=None, parallel=None):
+    """
+    Evaluate the predictions with each of the document folds left out in turn, in parallel
+    processes, and report the variance of the F-scores.
+    """
+    import multiprocessing
+    from Core.CrossValidation import getStatistics
+    if parallel == None:
+        parallel = multiprocessing.cpu_count()
+    parallel = max(1, min(parallel, folds))
+    args = [(sourceDir, task, goldDir, folds, i) for i in range(folds)]
+    if parallel > 1:
+        pool = multiprocessing.Pool(parallel)
+        results = pool.map(_evaluateFold, args)
+        pool.close()
+        pool.join()
+    else:
+        results = [_evaluateFold(x) for x in args]
+    stats = getStatistics(results)
     print >> sys.stderr, "##### Variance estimation results #####"
-    for r in results:
-        print >> sys.stderr, r["approximate"]["ALL-TOTAL"]
+    for i in range(folds):
+        print >> sys.stderr, "Without fold", i, ":", results[i]
+    if stats["n"] > 0:
+        print >> sys.stderr, "Mean %.4f, variance %.6f, stdev %.4f over %d folds" % (stats["mean"], stats["variance"], stats["stdev"], stats["n"])
+    stats["folds"] = results
+    return stats
 
 def hasGoldDocuments(sourceDir, goldDir):
     goldDocIds = set()
@@ -187,7 +229,7 @@ def convertAndEvaluate(xml, task, a2Tag, goldDir=None, debug=False):
     shutil.rmtree(tempdir)
     return xml
 
-def evaluate(source, task, goldDir=None, debug=False):
+def evaluate(source, task, goldDir=None, debug=False, folds=-1, foldToRemove=-1):
     print >> sys.stderr, "BioNLP task", task, "devel evaluation"
     # Determine task
     subTasks = "1"
@@ -195,10 +237,11 @@ def evaluate(source, task, goldDir=None, debug=False):
         task, subTasks = task.split(".")
         subTasks = [int(x) for x in subTasks]
     # Do the evaluation
+    assert folds == -1 or task in ["GE11", "GE09"], ("Fold subsets are only supported for the GENIA tasks", task)
     if task in ["GE11", "GE09"]:
         for subTask in subTasks:
             print >> sys.stderr, "---------------", "Evaluating GENIA sub task", subTask, "---------------"
-            results = evaluateGE(source, task, int(subTask), goldDir=goldDir, debug=debug)
+            results = evaluateGE(source, task, int(subTask), goldDir=goldDir, folds=folds, foldToRemove=foldToRemove, debug=debug)
     elif task in ["EPI11", "ID11"]:
         results = evaluateEPIorID(task, source, goldDir)
     elif task == "REN11":
@@ -323,8 +366,7 @@ def evaluateGE(sourceDir, mainTask="GE11", task=1, goldDir=None, folds=-1, foldT
         sourceSubsetDir = tempDir + "/source-subset"
         if os.path.exists(sourceSubsetDir):
             shutil.rmtree(sourceSubsetDir)
-        shutil.copytree(sourceDir, sourceSubsetDir)
-        removeDocuments(sourceSubsetDir, folds, foldToRemove)
+        linkDocuments(sourceDir, sourceSubsetDir, folds, foldToRemove)
     else:
         sourceSubsetDir = sourceDir
     
@@ -665,7 +707,10 @@ if __name__=="__main__":
     (options, args) = optparser.parse_args()
     #assert(options.task in [1,2,3])
     
-    if options.install == None:
+    if options.install == None and options.variance > 0:
+        assert(options.input != None)
+        evaluateVariance(options.input, options.task, options.variance, options.gold)
+    elif options.install == None:
         assert(options.input != None)
         evalResult = evaluate(options.input, options.task, options.gold, debug=options.debug)
         if options.debug:
@@ -20,11 +20,11 @@ from FeatureBuilders.EVEXFeatureBuilder import EVEXFeatureBuilder
 from FeatureBuilders.GiulianoFeatureBuilder import GiulianoFeatureBuilder
 from FeatureBuilders.OntoBiotopeFeatureBuilder import OntoBiotopeFeatureBuilder
 from FeatureBuilders.WordNetFeatureBuilder import WordNetFeatureBuilder
-from FeatureBuilders.WordVectorFeatureBuilder import WordVectorFeatureBuilder
 #import Graph.networkx_v10rc1 as NX10
 from Core.SimpleGraph import Graph
 from FeatureBuilders.TriggerFeatureBuilder import TriggerFeatureBuilder
 import Utils.Range as Range
+import Utils.ClassRegistry as ClassRegistry
 from multiprocessing import Process
 import itertools
 
@@ -106,6 +106,8 @@ class EdgeExampleBuilder(ExampleBuilder):
         if self.styles["wordnet"]:
             self.wordNetFeatureBuilder = WordNetFeatureBuilder(featureSet)
         if self.styles["wordvector"]:
+            # Imported only when used, as it requires numpy
+            WordVectorFeatureBuilder = ClassRegistry.getClass("WordVectorFeatureBuilder", "featureBuilder")
             self.wordVectorFeatureBuilder = WordVectorFeatureBuilder(featureSet, self.styles)
         if self.styles["giuliano"]:
             self.giulianoFeatureBuilder = GiulianoFeatureBuilder(featureSet)
@@ -216,11 +218,11 @@ class EdgeExampleBuilder(ExampleBuilder):
 #                 break
 #         return categoryName
     
-    def processCorpus(self, input, output, gold=None, append=False, allowNewIds=True, structureAnalyzer=None):
+    def beginCorpus(self, input, output, append=False, structureAnalyzer=None, elementCounts=None, sentences=None):
         if self.styles["sdb_merge"]:
             structureAnalyzer.determineNonOverlappingTypes()
             self.structureAnalyzer = structureAnalyzer
-        ExampleBuilder.processCorpus(self, input, output, gold, append, allowNewIds, structureAnalyzer)
+        return ExampleBuilder.beginCorpus(self, input, output, append, structureAnalyzer, elementCounts, sentences)
     
     def isValidInteraction(self, e1, e2, structureAnalyzer,forceUndirected=False):
         return len(structureAnalyzer.getValidEdgeTypes(e1.get("type"), e2.get("type"), forceUndirected=forceUndirected)) > 0
@@ -294,6 +296,8 @@ class EdgeExampleBuilder(ExampleBuilder):
             self.triggerFeatureBuilder.initSentence(sentenceGraph)
         if self.styles["evex"]: 
             self.evexFeatureBuilder.initSentence(sentenceGraph)
+        if self.styles["giuliano"]:
+            self.giulianoFeatureBuilder.initSentence(sentenceGraph)
 #         if self.styles["sdb_merge"]:
 #             self.determineNonOverlappingTypes(structureAnalyzer)
             
@@ -355,7 +359,7 @@ class EdgeExampleBuilder(ExampleBuilder):
                     else:
                         category = self.classSet.getId(categoryName)
                     example = [sentenceGraph.getSentenceId()+".x"+str(exampleIndex), category, features, extra]
-                    ExampleUtils.appendExamples([example], outfile)
+                    ExampleUtils.appendExamples([example], outfile, self.featureCounts)
                     exampleIndex += 1
 
         return exampleIndex
@@ -10,16 +10,16 @@ from ExampleBuilder import ExampleBuilder
 import Utils.Libraries.PorterStemmer as PorterStemmer
 from Core.IdSet import IdSet
 import Core.ExampleUtils as ExampleUtils
-#from Core.Gazetteer import Gazetteer
+from FeatureBuilders.NameGazetteer import NameGazetteer
 from FeatureBuilders.RELFeatureBuilder import RELFeatureBuilder
 from FeatureBuilders.WordNetFeatureBuilder import WordNetFeatureBuilder
 from FeatureBuilders.GiulianoFeatureBuilder import GiulianoFeatureBuilder
 from FeatureBuilders.DrugFeatureBuilder import DrugFeatureBuilder
 from FeatureBuilders.OntoBiotopeFeatureBuilder import OntoBiotopeFeatureBuilder
-from FeatureBuilders.WordVectorFeatureBuilder import WordVectorFeatureBuilder
 import PhraseTriggerExampleBuilder
 import Utils.InteractionXML.ResolveEPITriggerTypes
 import Utils.Range as Range
+import Utils.ClassRegistry as ClassRegistry
 
 class EntityExampleBuilder(ExampleBuilder):
     def __init__(self, style=None, classSet=None, featureSet=None, gazetteerFileName=None, skiplist=None):
@@ -32,11 +32,12 @@ class EntityExampleBuilder(ExampleBuilder):
         assert( classSet.getId("neg") == 1 )
         #gazetteerFileName="/usr/share/biotext/GeniaChallenge/SharedTaskTriggerTest/gazetteer-train"
         if gazetteerFileName!=None:
-            self.gazetteer=Gazetteer.loadGztr(gazetteerFileName)
+            self.gazetteer=NameGazetteer.load(gazetteerFileName)
             print >> sys.stderr, "Loaded gazetteer from",gazetteerFileName
         else:
             print >> sys.stderr, "No gazetteer loaded"
             self.gazetteer=None
+        self.chainTrees = {} # the roots of the dependency chain trees by starting depth
         self._setDefaultParameters(["rel_features", "wordnet", "bb_features", "giuliano", 
                                   "epi_merge_negated", "limit_merged_types", "genia_task1",
                                   "names", "build_for_nameless", "skip_for_nameless",
@@ -80,6 +81,8 @@ class EntityExampleBuilder(ExampleBuilder):
         if self.styles["ontobiotope_features"]:
             self.ontobiotopeFeatureBuilder = OntoBiotopeFeatureBuilder(self.featureSet)
         if self.styles["wordvector"]:
+            # Imported only when used, as it requires numpy
+            WordVectorFeatureBuilder = ClassRegistry.getClass("WordVectorFeatureBuilder", "featureBuilder")
             self.wordVectorFeatureBuilder = WordVectorFeatureBuilder(featureSet, self.styles)
     
     def getMergedEntityType(self, entities):
@@ -222,6 +225,7 @@ class EntityExampleBuilder(ExampleBuilder):
         
         self.tokenFeatures = {}
         self.tokenFeatureWeights = {}
+        self.chainSteps = {}
         
         # determine (manually or automatically) the setting for whether sentences with no given entities should be skipped
         buildForNameless = False
@@ -568,66 +572,85 @@ class EntityExampleBuilder(ExampleBuilder):
                 self.wordVectorFeatureBuilder.setFeatureVector(None)
             
             example = (sentenceGraph.getSentenceId()+".x"+str(exampleIndex), category, features, extra)
-            ExampleUtils.appendExamples([example], outfile)
+            ExampleUtils.appendExamples([example], outfile, self.featureCounts)
             exampleIndex += 1
             self.exampleStats.endExample()
         #return examples
         return exampleIndex
     
-    def buildChains(self,token,sentenceGraph,features,depthLeft=3,chain="",visited=None):
-        if depthLeft == 0:
+    def buildChains(self,token,sentenceGraph,features,depthLeft=3,chain=None,path=()):
+        """
+        Build the features of the dependency chains of up to depthLeft edges starting from
+        the token. A chain doesn't return to the tokens already on its path. The chain steps
+        are cached for the sentence (see getChainStep) and the chain feature ids for the
+        builder, in trees of the chains (see getChainNode).
+        """
+        if depthLeft == 0 or token in path:
             return
+        if chain == None:
+            if depthLeft not in self.chainTrees:
+                self.chainTrees[depthLeft] = ["", {}, None, None]
+            chain = self.chainTrees[depthLeft]
+        previous = path
+        path = path + (token,)
+        key = (token, depthLeft)
+        if key not in self.chainSteps:
+            edges = [(x, 0) for x in self.inEdgesByToken[token]] + [(x, 1) for x in self.outEdgesByToken[token]]
+            self.chainSteps[key] = (edges, [None] * len(edges))
+        edges, steps = self.chainSteps[key]
+        for i in range(len(edges)):
+            edge, nextIndex = edges[i]
+            if edge[0] in previous or edge[1] in previous:
+                continue
+            if steps[i] == None:
+                steps[i] = self.getChainStep(edge, nextIndex, depthLeft, sentenceGraph)
+            stepTag, stepFeatures, isName = steps[i]
+            for featureId, weight in stepFeatures:
+                features[featureId] = weight
+            node = chain[1].get(stepTag)
+            if node == None or (isName and node[3] == None):
+                node = self.getChainNode(chain, stepTag, depthLeft, isName)
+            if isName:
+                features[node[3][0]] = 1
+            features[node[2]] = 1
+            self.buildChains(edge[nextIndex],sentenceGraph,features,depthLeft-1,node,path)
+    
+    def getChainStep(self, edge, nextIndex, depthLeft, sentenceGraph):
+        """
+        The parts of a chain step that don't depend on the preceding chain: the chain tag,
+        the ids and weights of the edge type and next token features and whether the next
+        token is a name. The steps are built when they are first reached, so new feature ids
+        are defined in the same order as without the cache.
+        """
         strDepthLeft = "dist_" + str(depthLeft)
-        
-        if visited == None:
-            visited = set()
-
-        inEdges = self.inEdgesByToken[token]
-        outEdges = self.outEdgesByToken[token]
-        edgeSet = visited.union(self.edgeSetByToken[token])
-        for edge in inEdges:
-            if not edge in visited:
-                edgeType = edge[2].get("type")
-                features[self.featureSet.getId("dep_"+strDepthLeft+edgeType)] = 1
-
-                nextToken = edge[0]
-                tokenFeatures, tokenWeights = self.getTokenFeatures(nextToken, sentenceGraph)
-                for tokenFeature in tokenFeatures:
-                    features[self.featureSet.getId(strDepthLeft + tokenFeature)] = tokenWeights[tokenFeature]
-#                for entity in sentenceGraph.tokenIsEntityHead[nextToken]:
-#                    if entity.get("given") == "True":
-#                        features[self.featureSet.getId("name_dist_"+strDepthLeft)] = 1
-#                        features[self.featureSet.getId("name_dist_"+strDepthLeft+entity.get("type"))] = 1
-#                features[self.featureSet.getId("POS_dist_"+strDepthLeft+nextToken.get("POS"))] = 1
-#                tokenText = sentenceGraph.getTokenText(nextToken)
-#                features[self.featureSet.getId("text_dist_"+strDepthLeft+tokenText)] = 1
-                
-                if sentenceGraph.tokenIsName[nextToken] and not self.styles["names"]:
-                    features[self.featureSet.getId("name_chain_dist_"+strDepthLeft+chain+"-frw_"+edgeType)] = 1
-                features[self.featureSet.getId("chain_dist_"+strDepthLeft+chain+"-frw_"+edgeType)] = 1
-                self.buildChains(nextToken,sentenceGraph,features,depthLeft-1,chain+"-frw_"+edgeType,edgeSet)
-
-        for edge in outEdges:
-            if not edge in visited:
-                edgeType = edge[2].get("type")
-                features[self.featureSet.getId("dep_dist_"+strDepthLeft+edgeType)] = 1
-
-                nextToken = edge[1]
-                tokenFeatures, tokenWeights = self.getTokenFeatures(nextToken, sentenceGraph)
-                for tokenFeature in tokenFeatures:
-                    features[self.featureSet.getId(strDepthLeft + tokenFeature)] = tokenWeights[tokenFeature]
-#                for entity in sentenceGraph.tokenIsEntityHead[nextToken]:
-#                    if entity.get("given") == "True":
-#                        features[self.featureSet.getId("name_dist_"+strDepthLeft)] = 1
-#                        features[self.featureSet.getId("name_dist_"+strDepthLeft+entity.get("type"))] = 1
-#                features[self.featureSet.getId("POS_dist_"+strDepthLeft+nextToken.get("POS"))] = 1
-#                tokenText = sentenceGraph.getTokenText(nextToken)
-#                features[self.featureSet.getId("text_dist_"+strDepthLeft+tokenText)] = 1
-                if sentenceGraph.tokenIsName[nextToken] and not self.styles["names"]:
-                    features[self.featureSet.getId("name_chain_dist_"+strDepthLeft+chain+"-rev_"+edgeType)] = 1
-                
-                features[self.featureSet.getId("chain_dist_"+strDepthLeft+chain+"-rev_"+edgeType)] = 1
-                self.buildChains(nextToken,sentenceGraph,features,depthLeft-1,chain+"-rev_"+edgeType,edgeSet)
+        edgeType = edge[2].get("type")
+        nextToken = edge[nextIndex]
+        if nextIndex == 0:
+            stepFeatures = [(self.featureSet.getId("dep_"+strDepthLeft+edgeType), 1)]
+        else:
+            stepFeatures = [(self.featureSet.getId("dep_dist_"+strDepthLeft+edgeType), 1)]
+        tokenFeatures, tokenWeights = self.getTokenFeatures(nextToken, sentenceGraph)
+        for tokenFeature in tokenFeatures:
+            stepFeatures.append((self.featureSet.getId(strDepthLeft + tokenFeature), tokenWeights[tokenFeature]))
+        isName = sentenceGraph.tokenIsName[nextToken] and not self.styles["names"]
+        return (("-frw_" if nextIndex == 0 else "-rev_") + edgeType, stepFeatures, isName)
+    
+    def getChainNode(self, parent, stepTag, depthLeft, isName):
+        """
+        The node of a chain in the chain tree of its starting depth. A node is a list of the
+        chain string, the child nodes by step tag, the chain feature id and the (one item)
+        tuple of the name chain feature id, or None if the latter is not yet defined.
+        """
+        node = parent[1].get(stepTag)
+        if node == None:
+            node = [parent[0] + stepTag, {}, None, None]
+            if isName:
+                node[3] = (self.featureSet.getId("name_chain_dist_"+str(depthLeft)+node[0]),)
+            node[2] = self.featureSet.getId("chain_dist_"+str(depthLeft)+node[0])
+            parent[1][stepTag] = node
+        elif isName and node[3] == None:
+            node[3] = (self.featureSet.getId("name_chain_dist_"+str(depthLeft)+node[0]),)
+        return node
     
     def getNamedEntityHeadTokens(self, sentenceGraph):
         headTokens = []
@@ -10,7 +10,11 @@ import itertools
 from Utils.ProgressCounter import ProgressCounter
 import Utils.Parameters
 import Core.ExampleUtils as ExampleUtils
+import Core.FeatureSelection as FeatureSelection
+import Core.FeatureHashing as FeatureHashing
+import Core.ExampleDeduplication as ExampleDeduplication
 import Core.SentenceGraph
+import Utils.Instrumentation as Instrumentation
 from ExampleBuilders.ExampleStats import ExampleStats
 from Detectors.StructureAnalyzer import StructureAnalyzer
 
@@ -37,6 +41,8 @@ class ExampleBuilder:
             self.featureSet = featureSet
         
         self.featureTag = ""      
+        if getattr(self.featureSet, "signed", False): # signed feature hashing
+            self.setFeature = self.setSignedFeature
         self.exampleStats = ExampleStats()
         self.parse = None
         self.tokenization = None
@@ -47,7 +53,8 @@ class ExampleBuilder:
         self.styles = {}
         self._defaultParameters = None
         self._parameterValueLimits = None
-        self._setDefaultParameters(["sentenceLimit"])
+        self._setDefaultParameters(["sentenceLimit"] + FeatureSelection.STYLE_KEYS + FeatureHashing.STYLE_KEYS + ExampleDeduplication.STYLE_KEYS)
+        self.featureCounts = None # a FeatureSelection.FeatureCounter when feature selection is used
         self.debug = False
     
     def hasStyle(self, style):
@@ -70,6 +77,11 @@ class ExampleBuilder:
     def setFeature(self, name, value):
         self.features[self.featureSet.getId(self.featureTag+name)] = value
     
+    def setSignedFeature(self, name, value):
+        # Colliding features are summed, so that their signed values partly cancel
+        featureId, sign = self.featureSet.getSignedId(self.featureTag+name)
+        self.features[featureId] = self.features.get(featureId, 0) + sign * value
+    
     def getElementCounts(self, filename):
         print >> sys.stderr, "Counting elements:",
         if filename.endswith(".gz"):
@@ -98,7 +110,30 @@ class ExampleBuilder:
         else:
             print >> sys.stderr, "Feature names not saved"
 
+    @Instrumentation.instrument("ExampleBuilder.processCorpus")
     def processCorpus(self, input, output, gold=None, append=False, allowNewIds=True, structureAnalyzer=None):
+        outfile = self.beginCorpus(input, output, append, structureAnalyzer)
+        removeIntersentenceInteractions, removeGoldIntersentenceInteractions = self.getIntersentenceSettings(gold)
+        inputIterator = getCorpusIterator(input, None, self.parse, self.tokenization, removeIntersentenceInteractions=removeIntersentenceInteractions)            
+        
+        #goldIterator = []
+        if gold != None:
+            goldIterator = getCorpusIterator(gold, None, self.parse, self.tokenization, removeIntersentenceInteractions=removeGoldIntersentenceInteractions)
+            for inputSentences, goldSentences in itertools.izip_longest(inputIterator, goldIterator, fillvalue=None):
+                assert inputSentences != None
+                assert goldSentences != None
+                self.processDocument(inputSentences, goldSentences, outfile, structureAnalyzer=structureAnalyzer)
+        else:
+            for inputSentences in inputIterator:
+                self.processDocument(inputSentences, None, outfile, structureAnalyzer=structureAnalyzer)
+        self.endCorpus(outfile, allowNewIds)
+    
+    def beginCorpus(self, input, output, append=False, structureAnalyzer=None, elementCounts=None, sentences=None):
+        """
+        Open the output file and initialize the builder for processing a corpus. The element
+        counts and the sentences for the predicted value range can be given if they have
+        already been determined for the same input.
+        """
         # Create intermediate paths if needed
         if os.path.dirname(output) != "" and not os.path.exists(os.path.dirname(output)):
             os.makedirs(os.path.dirname(output))
@@ -115,7 +150,7 @@ class ExampleBuilder:
         # Build examples
         self.exampleCount = 0
         if type(input) in types.StringTypes:
-            self.elementCounts = self.getElementCounts(input)
+            self.elementCounts = elementCounts if elementCounts != None else self.getElementCounts(input)
             if self.elementCounts["sentences"] > 0:
                 self.progress = ProgressCounter(self.elementCounts["sentences"], "Build examples")
             else:
@@ -125,31 +160,31 @@ class ExampleBuilder:
             self.elementCounts = None
             self.progress = ProgressCounter(None, "Build examples")
         
-        self.calculatePredictedRange(self.getSentences(input, self.parse, self.tokenization))
-        
+        if sentences == None:
+            sentences = self.getSentences(input, self.parse, self.tokenization)
+        self.calculatePredictedRange(sentences)
+        return outfile
+    
+    def getIntersentenceSettings(self, gold=None):
+        """
+        Whether intersentence interactions are removed from the input and gold corpora.
+        """
         removeIntersentenceInteractions = True
         if "keep_intersentence" in self.styles and self.styles["keep_intersentence"]:
             print >> sys.stderr, "Keeping intersentence interactions for input corpus"
             removeIntersentenceInteractions = False
-        inputIterator = getCorpusIterator(input, None, self.parse, self.tokenization, removeIntersentenceInteractions=removeIntersentenceInteractions)            
-        
-        #goldIterator = []
+        removeGoldIntersentenceInteractions = True
         if gold != None:
-            removeGoldIntersentenceInteractions = True
             if "keep_intersentence_gold" in self.styles and self.styles["keep_intersentence_gold"]:
                 print >> sys.stderr, "Keeping intersentence interactions for gold corpus"
                 removeGoldIntersentenceInteractions = False
-            goldIterator = getCorpusIterator(gold, None, self.parse, self.tokenization, removeIntersentenceInteractions=removeGoldIntersentenceInteractions)
-            for inputSentences, goldSentences in itertools.izip_longest(inputIterator, goldIterator, fillvalue=None):
-                assert inputSentences != None
-                assert goldSentences != None
-                self.processDocument(inputSentences, goldSentences, outfile, structureAnalyzer=structureAnalyzer)
-        else:
-            for inputSentences in inputIterator:
-                self.processDocument(inputSentences, None, outfile, structureAnalyzer=structureAnalyzer)
+        return removeIntersentenceInteractions, removeGoldIntersentenceInteractions
+    
+    def endCorpus(self, outfile, allowNewIds=True):
         outfile.close()
         self.progress.endUpdate()
         
+        Instrumentation.count("examples", self.exampleCount)
         # Show statistics
         print >> sys.stderr, "Examples built:", self.exampleCount
         print >> sys.stderr, "Features:", len(self.featureSet.getNames())
@@ -157,6 +192,8 @@ class ExampleBuilder:
         print >> sys.stderr, "Style:", Utils.Parameters.toString(self.getParameters(self.styles))
         if self.exampleStats.getExampleCount() > 0:
             self.exampleStats.printStats()
+        if isinstance(self.featureSet, FeatureHashing.HashedIdSet):
+            self.featureSet.writeAudit(outfile.name + "-hash-collisions.tsv")
     
         # Save Ids
         if allowNewIds:
@@ -164,6 +201,8 @@ class ExampleBuilder:
     
     def processDocument(self, sentences, goldSentences, outfile, structureAnalyzer=None):
         #calculatePredictedRange(self, sentences)            
+        Instrumentation.count("documents")
+        Instrumentation.count("sentences", len(sentences))
         for i in range(len(sentences)):
             sentence = sentences[i]
             goldSentence = None
@@ -200,7 +239,17 @@ class ExampleBuilder:
             self.exampleCount += self.buildExamplesFromGraph(sentence.sentenceGraph, outfile, goldGraph, structureAnalyzer=structureAnalyzer)
 
     @classmethod
-    def run(cls, input, output, parse, tokenization, style, classIds=None, featureIds=None, gold=None, append=False, allowNewIds=True, structureAnalyzer=None, debug=False):
+    def run(cls, input, output, parse, tokenization, style, classIds=None, featureIds=None, gold=None, append=False, allowNewIds=True, structureAnalyzer=None, debug=False, featureCounts=None):
+        builder = cls.create(input, output, parse, tokenization, style, classIds, featureIds, gold, append, allowNewIds, debug)
+        builder.featureCounts = featureCounts
+        builder.processCorpus(input, output, gold, append=append, allowNewIds=allowNewIds, structureAnalyzer=structureAnalyzer)
+        return builder
+    
+    @classmethod
+    def create(cls, input, output, parse, tokenization, style, classIds=None, featureIds=None, gold=None, append=False, allowNewIds=True, debug=False):
+        """
+        Initialize a builder for processing a corpus, without processing it yet.
+        """
         print >> sys.stderr, "Running", cls.__name__
         print >> sys.stderr, "  input:", input
         if gold != None:
@@ -215,13 +264,16 @@ class ExampleBuilder:
         else:
             print >> sys.stderr, "  parse:", parse + ", tokenization:", tokenization
         classSet, featureSet = cls.getIdSets(classIds, featureIds, allowNewIds) #cls.getIdSets(idFileTag)
+        hashing = FeatureHashing.getSettings(Utils.Parameters.get(style))
+        if hashing != None:
+            print >> sys.stderr, "Using hashed feature ids (bits, signed, audit):", hashing
+            featureSet = FeatureHashing.HashedIdSet(*hashing)
         builder = cls(style=style, classSet=classSet, featureSet=featureSet)
         builder.debug = debug
         #builder.idFileTag = idFileTag
         builder.classIdFilename = classIds
         builder.featureIdFilename = featureIds
         builder.parse = parse ; builder.tokenization = tokenization
-        builder.processCorpus(input, output, gold, append=append, allowNewIds=allowNewIds, structureAnalyzer=structureAnalyzer)
         return builder
 
     def buildExamplesFromGraph(self, sentenceGraph, outfile, goldGraph=None):
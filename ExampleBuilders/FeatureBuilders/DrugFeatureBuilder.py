@@ -6,8 +6,13 @@ from FeatureBuilder import FeatureBuilder
 import Utils.Settings as Settings
 import Utils.Download
 import Utils.ElementTreeUtils as ETUtils
+import Utils.MappedIndex as MappedIndex
+import marshal
 from collections import defaultdict
 
+INDEX_KIND = "drugbank"
+INDEX_VERSION = 1
+
 def installDrugBank(destPath=None, downloadPath=None, redownload=False, updateLocalSettings=False):
     print >> sys.stderr, "---------------", "Downloading Drug Bank XML", "---------------"
     print >> sys.stderr, "See http://www.drugbank.ca/downloads for conditions of use"
@@ -20,32 +25,30 @@ def installDrugBank(destPath=None, downloadPath=None, redownload=False, updateLo
     Settings.setLocal("DRUG_BANK_XML", os.path.join(destPath, filenames[0]), updateLocalSettings)
 
 class DrugFeatureBuilder(FeatureBuilder):
-    data = None
+    index = None
     
     def __init__(self, featureSet=None):
         FeatureBuilder.__init__(self, featureSet)
         if not hasattr(Settings, "DRUG_BANK_XML"):
             print >> sys.stderr, "Drug Bank XML not installed, installing now"
             installDrugBank(updateLocalSettings=True)
-        drugBankFile = Settings.DRUG_BANK_XML
-        #drugBankFile = "/home/jari/data/DDIExtraction2011/resources/drugbank.xml"
-        # Load drug data into memory on first call to constructor
-        if DrugFeatureBuilder.data == None:
-            DrugFeatureBuilder.data, DrugFeatureBuilder.nameToId = prepareDrugBank(drugBankFile)
-            
-            DrugFeatureBuilder.tokenToId = {}
-            for name in DrugFeatureBuilder.nameToId:
-                splits = name.split()
-                if len(splits) < 2:
-                    continue
-                for split in splits:
-                    if split not in DrugFeatureBuilder.tokenToId:
-                        DrugFeatureBuilder.tokenToId[split] = []
-                    DrugFeatureBuilder.tokenToId[split].extend(DrugFeatureBuilder.nameToId[name])
-            for token in DrugFeatureBuilder.tokenToId:
-                DrugFeatureBuilder.tokenToId[token] = sorted(list(set(DrugFeatureBuilder.tokenToId[token])))
-            
-            DrugFeatureBuilder.interactionPairs = buildInteractionPairs(DrugFeatureBuilder.data)
+    
+    @classmethod
+    def getIndex(cls):
+        """
+        The compiled DrugBank index, opened on first use and shared by all instances (and by
+        processes forked after opening it). The index is compiled if it doesn't exist or is
+        older than the DrugBank XML.
+        """
+        if cls.index == None:
+            drugBankFile = Settings.DRUG_BANK_XML
+            indexFile = getattr(Settings, "DRUG_BANK_INDEX", None)
+            if indexFile == None:
+                indexFile = drugBankFile + ".index"
+            if not MappedIndex.isCurrent(indexFile, INDEX_KIND, INDEX_VERSION, drugBankFile):
+                compileDrugBank(drugBankFile, indexFile)
+            cls.index = MappedIndex.MappedIndex(indexFile)
+        return cls.index
     
     def buildDrugFeatures(self, token):
         norText = normalizeDrugName(token.get("text"))
@@ -58,10 +61,7 @@ class DrugFeatureBuilder(FeatureBuilder):
             else:
                 self.setFeature("DrugBank_noMatch" + tag)
             for drug in drugList:
-                for category in drug:
-                    if category == "interaction":
-                        continue
-                    values = drug[category]
+                for category, values in drug:
                     if isinstance(values, basestring):
                         values = [values]
                     for value in values:
@@ -131,30 +131,30 @@ class DrugFeatureBuilder(FeatureBuilder):
     def getInteraction(self, e1Name, e2Name):
         e1Name = normalizeDrugName(e1Name)
         e2Name = normalizeDrugName(e2Name)
-        e1Ids = DrugFeatureBuilder.nameToId[e1Name]
-        e2Ids = DrugFeatureBuilder.nameToId[e2Name]
+        index = self.getIndex()
+        e1Ids = getIds(index["names"], e1Name)
+        e2Ids = getIds(index["names"], e2Name)
         #print e1Ids, e2Ids
         if len(e1Ids) == 0 or len(e2Ids) == 0:
             return "UNKNOWN_NAME" # unknown drug name
+        interactionPairs = index["pairs"]
         for id1 in e1Ids:
             for id2 in e2Ids:
-                if DrugFeatureBuilder.interactionPairs[id1][id2]:
+                if (id1 + "\t" + id2) in interactionPairs:
                     return True
         return False
     
     def getDrugs(self, name, isToken=False):
         name = normalizeDrugName(name)
+        index = self.getIndex()
         if isToken:
-            nameToId = DrugFeatureBuilder.nameToId
+            nameToId = index["names"]
         else:
-            nameToId = DrugFeatureBuilder.tokenToId
-            
-        if name not in nameToId:
-            return []
+            nameToId = index["tokens"]
         
         datas = []
-        for id in nameToId[name]:
-            datas.append(DrugFeatureBuilder.data[id])
+        for id in getIds(nameToId, name):
+            datas.append(marshal.loads(index["drugs"].get(id)))
         return datas
 
 def normalizeDrugName(text):
@@ -246,16 +246,63 @@ def prepareDrugBank(drugBankFile):
     nameToId = mapNamesToIds(data)
     return data, nameToId
 
+def mapTokensToIds(nameToId):
+    tokenToId = {}
+    for name in nameToId:
+        splits = name.split()
+        if len(splits) < 2:
+            continue
+        for split in splits:
+            if split not in tokenToId:
+                tokenToId[split] = []
+            tokenToId[split].extend(nameToId[name])
+    for token in tokenToId:
+        tokenToId[token] = sorted(list(set(tokenToId[token])))
+    return tokenToId
+
+def getIds(table, name):
+    ids = table.get(name)
+    if not ids: # not in the table or no ids
+        return []
+    return ids.split("\t")
+
+def compileDrugBank(drugBankFile, indexFile):
+    """
+    Compile the DrugBank XML into a MappedIndex with the tables "names" (normalized name to
+    drug ids), "tokens" (name token to drug ids), "pairs" (the interacting drug id pairs, as
+    "id1\tid2" keys) and "drugs" (drug id to the marshalled list of the (category, value)
+    items used for the features).
+    """
+    print >> sys.stderr, "Compiling DrugBank index", indexFile
+    data, nameToId = prepareDrugBank(drugBankFile)
+    tables = {"names":{}, "tokens":{}, "pairs":{}, "drugs":{}}
+    for name, ids in nameToId.iteritems():
+        tables["names"][name] = "\t".join(ids)
+    for token, ids in mapTokensToIds(nameToId).iteritems():
+        tables["tokens"][token] = "\t".join(ids)
+    for id1, partners in buildInteractionPairs(data).iteritems():
+        for id2 in partners:
+            if partners[id2]:
+                tables["pairs"][id1 + "\t" + id2] = ""
+    for id in data:
+        # The items are stored in the dictionary order, which defines the order of the features
+        tables["drugs"][id] = marshal.dumps([(category, values) for category, values in data[id].items() if category != "interaction"])
+    MappedIndex.write(indexFile, tables, INDEX_KIND, INDEX_VERSION, MappedIndex.getSourceInfo(drugBankFile))
+    print >> sys.stderr, "DrugBank index:", ", ".join([x + " " + str(len(tables[x])) for x in sorted(tables.keys())])
+
 if __name__=="__main__":
 #    drugBankFile = "/home/jari/data/DDIExtraction2011/resources/drugbank.xml"
 #    data = loadDrugBank(drugBankFile, verbose=True)
 #    nameToId = mapNamesToIds(data, verbose=True)
 #    #print nameToId
 #    #resolveInteractions(data)
+    if len(sys.argv) == 3: # compile an index: DrugFeatureBuilder.py [DrugBank XML] [index]
+        compileDrugBank(sys.argv[1], sys.argv[2])
+        sys.exit()
     f = DrugFeatureBuilder()
-    print "A:", f.getDrug("Lepirudin")
-    print "B:", f.getDrug("Refludan")
-    print "C:", f.getDrug("Treprostinil")
+    print "A:", f.getDrugs("Lepirudin")
+    print "B:", f.getDrugs("Refludan")
+    print "C:", f.getDrugs("Treprostinil")
     #print f.interactionPairs
     print "1:", f.getInteraction("Refludan", "Treprostinil")
     print "2:", f.getInteraction("Refludan", "TreprostinilBlahBlah")
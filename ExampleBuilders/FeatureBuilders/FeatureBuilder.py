@@ -30,6 +30,8 @@ class FeatureBuilder:
         
         self.maskNamedEntities = True # named entity text strings are replaced with NAMED_ENT
         self.tag = "" # a prefix that is added to each feature name
+        if getattr(featureSet, "signed", False): # signed feature hashing
+            self.setFeature = self.setSignedFeature
     
     def setTag(self, tag=""):
         self.tag = tag
@@ -59,6 +61,15 @@ class FeatureBuilder:
         @type value: float
         """
         self.features[self.featureSet.getId(self.tag+name)] = value
+    
+    def setSignedFeature(self, name, value=1):
+        """
+        setFeature for signed feature hashing, where the sign of the value depends on the name.
+        The value is added to the current value of the feature id, so that the values of
+        colliding features partly cancel instead of replacing each other.
+        """
+        featureId, sign = self.featureSet.getSignedId(self.tag+name)
+        self.features[featureId] = self.features.get(featureId, 0) + sign * value
         
     def normalizeFeatureVector(self):
         """
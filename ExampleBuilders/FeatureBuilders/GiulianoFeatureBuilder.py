@@ -4,6 +4,7 @@ Giuliano Feature Builder
 __version__ = "$Revision: 1.1 $"
 
 import sys,os
+import math
 from FeatureBuilder import FeatureBuilder
 thisPath = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(os.path.abspath(os.path.join(thisPath,"../..")))
@@ -18,6 +19,7 @@ class GiulianoFeatureBuilder(FeatureBuilder):
         @param featureSet: The feature ids
         """
         FeatureBuilder.__init__(self, featureSet)
+        self.sentenceGraph = None
     
     def initSentence(self, sentenceGraph):
         """
@@ -29,8 +31,28 @@ class GiulianoFeatureBuilder(FeatureBuilder):
                        information of the sentence. The underlying XML can also be accessed through
                        this class.
         """
-        ### Sentence initialization code here ###
-        pass
+        self.sentenceGraph = sentenceGraph
+        # The character offsets and the n-grams ending at each token, for the tokens that are not names
+        self.tokenBegins = []
+        self.tokenEnds = []
+        self.unigrams = []
+        self.bigrams = []
+        self.trigrams = []
+        for token in sentenceGraph.tokens:
+            if sentenceGraph.tokenIsName[token]:
+                continue
+            offset = Range.charOffsetToSingleTuple(token.get("charOffset"))
+            self.tokenBegins.append(offset[0])
+            self.tokenEnds.append(offset[1])
+            self.unigrams.append(token.get("text").lower())
+            self.bigrams.append(self.unigrams[-2] + "_" + self.unigrams[-1] if len(self.unigrams) > 1 else None)
+            self.trigrams.append(self.unigrams[-3] + "_" + self.bigrams[-1] if len(self.unigrams) > 2 else None)
+        self.ranges = {}
+    
+    def getRange(self, element):
+        if element not in self.ranges:
+            self.ranges[element] = Range.charOffsetToSingleTuple(element.get("charOffset"))
+        return self.ranges[element]
     
     def buildEdgeFeatures(self, entity1, entity2, token1, token2, path, sentenceGraph):
         """
@@ -56,7 +78,8 @@ class GiulianoFeatureBuilder(FeatureBuilder):
                        this class.
         """
         ### Feature generation code here ###
-        self.sentenceGraph = sentenceGraph
+        if sentenceGraph is not self.sentenceGraph:
+            self.initSentence(sentenceGraph)
         patternForeBetween, patternBetween, patternBetweenAfter = self.getPatterns(entity1, entity2)
         for feature in patternForeBetween:
             self.setFeature("pFB_" + feature, patternForeBetween[feature])
@@ -67,7 +90,8 @@ class GiulianoFeatureBuilder(FeatureBuilder):
     
     def buildTriggerFeatures(self, token, sentenceGraph):
         ### Feature generation code here ###
-        self.sentenceGraph = sentenceGraph
+        if sentenceGraph is not self.sentenceGraph:
+            self.initSentence(sentenceGraph)
         patternForeBetween, patternBetween, patternBetweenAfter = self.getPatterns(token, token)
         for feature in patternForeBetween:
             self.setFeature("pFB_" + feature, patternForeBetween[feature])
@@ -96,86 +120,83 @@ class GiulianoFeatureBuilder(FeatureBuilder):
         else:
             return "Between"
     
-    def getPatterns(self, e1, e2):
-        e1Range = Range.charOffsetToSingleTuple(e1.get("charOffset"))
-        e2Range = Range.charOffsetToSingleTuple(e2.get("charOffset"))
-        
-        tokenPositions = {}
-        for token in self.sentenceGraph.tokens:
-            tokenPositions[token.get("id")] = self.getRelativePosition(e1Range,e2Range,token)
-        
-        prevTokenText = None
-        prevToken2Text = None
+    def getPositionRuns(self, e1Range, e2Range):
+        """
+        The runs of consecutive (non-name) tokens with the same position relative to the
+        entities (see getRelativePosition), as (begin, end, position) tuples.
+        """
+        begins, ends = self.tokenBegins, self.tokenEnds
+        entitiesBegin = min(e1Range[0], e2Range[0])
+        entitiesEnd = max(e1Range[1], e2Range[1])
+        runs = []
+        runBegin = 0
         prevPosition = None
+        for i in range(len(begins)):
+            if not (e1Range[1] <= begins[i] or ends[i] <= e1Range[0]):
+                position = "Entity1"
+            elif not (e2Range[1] <= begins[i] or ends[i] <= e2Range[0]):
+                position = "Entity2"
+            elif ends[i] < entitiesBegin:
+                position = "Fore"
+            elif ends[i] > entitiesEnd:
+                position = "After"
+            else:
+                position = "Between"
+            if position != prevPosition:
+                if prevPosition != None:
+                    runs.append((runBegin, i, prevPosition))
+                runBegin = i
+                prevPosition = position
+        if prevPosition != None:
+            runs.append((runBegin, len(begins), prevPosition))
+        return runs
+    
+    def getPatterns(self, e1, e2):
+        """
+        The n-gram counts of the Fore-Between, Between and Between-After windows of an entity
+        pair. The n-grams don't cross the window borders and are built from the n-grams
+        precomputed in initSentence, so only the token positions are determined for each pair.
+        """
         patternForeBetween = {}
         patternBetween = {}
         patternBetweenAfter = {}
-        for token in self.sentenceGraph.tokens:
-            if self.sentenceGraph.tokenIsName[token]:
-                continue
-                
-            id = token.get("id")
-            text = token.get("text").lower()
-            
-            if prevPosition != tokenPositions[id]:
-                prevTokenText = None
-                prevToken2Text = None
-            
-            if tokenPositions[id] == "Fore":
-                self.addToPattern(patternForeBetween, text, prevTokenText, prevToken2Text)
-            elif tokenPositions[id] == "Between":
-                self.addToPattern(patternForeBetween, text, prevTokenText, prevToken2Text)
-                self.addToPattern(patternBetween, text, prevTokenText, prevToken2Text)
-                self.addToPattern(patternBetweenAfter, text, prevTokenText, prevToken2Text)
-            elif tokenPositions[id] == "After":
-                self.addToPattern(patternBetweenAfter, text, prevTokenText, prevToken2Text)
-            
-            prevPosition = tokenPositions[id]
-            #if tokenPositions[id].find("Entity") != -1:
-            prevToken2Text = prevTokenText
-            prevTokenText = text
-    
+        for begin, end, position in self.getPositionRuns(self.getRange(e1), self.getRange(e2)):
+            if position == "Fore":
+                self.addToPatterns((patternForeBetween,), begin, end)
+            elif position == "Between":
+                self.addToPatterns((patternForeBetween, patternBetween, patternBetweenAfter), begin, end)
+            elif position == "After":
+                self.addToPatterns((patternBetweenAfter,), begin, end)
         return patternForeBetween, patternBetween, patternBetweenAfter
-
-    def addToPattern(self, pattern, tokenText, prevTokenText, prevToken2Text):
-        if not pattern.has_key(tokenText):
-            pattern[tokenText] = 0
-        pattern[tokenText] += 1
-        
-        # Should the n-grams be unordered?
-        if prevTokenText != None:
-            ngram1 = prevTokenText + "_" + tokenText
-            if not pattern.has_key(ngram1):
-                pattern[ngram1] = 0
-            pattern[ngram1] += 1
-        
-        if prevToken2Text != None:
-            ngram2 = prevToken2Text + "_" + ngram1
-            if not pattern.has_key(ngram2):
-                pattern[ngram2] = 0
-            pattern[ngram2] += 1
-
+    
+    def addToPatterns(self, patterns, begin, end):
+        """
+        Add the n-grams within a run of tokens to the patterns.
+        """
+        for i in range(begin, end):
+            ngrams = (self.unigrams[i],)
+            if i - begin >= 2:
+                ngrams = (self.unigrams[i], self.bigrams[i], self.trigrams[i])
+            elif i - begin == 1:
+                ngrams = (self.unigrams[i], self.bigrams[i])
+            for pattern in patterns:
+                for ngram in ngrams:
+                    pattern[ngram] = pattern.get(ngram, 0) + 1
+    
     def calculateKernel(self, pattern1, pattern2):
-        dotProduct = 0.0
-        length1 = 0.0
-        length2 = 0.0
-        # The dotProduct is the numerator
-        for k,v in pattern1.iteritems():
-            if pattern2.has_key(k):
-               dotProduct += v * pattern2[k]
-        # Get the length of the first vector
-        for v in pattern1.values():
-            length1 += v * v
-        length1 = math.sqrt(length1)
-        # Get the length of the second vector
-        for v in pattern2.values():
-            length2 += v * v
-        length2 = math.sqrt(length2)
-        
-        if length1 == 0 or length2 == 0:
+        """
+        The cosine similarity of two sparse pattern vectors. The dot product iterates
+        over the smaller pattern.
+        """
+        if len(pattern1) == 0 or len(pattern2) == 0:
             return 0.0
-        else:
-            return dotProduct / (length1 * length2)
+        if len(pattern2) < len(pattern1):
+            pattern1, pattern2 = pattern2, pattern1
+        # The dotProduct is the numerator
+        dotProduct = float(sum([v * pattern2.get(k, 0) for k, v in pattern1.iteritems()]))
+        length1 = math.sqrt(sum([v * v for v in pattern1.itervalues()]))
+        length2 = math.sqrt(sum([v * v for v in pattern2.itervalues()]))
+        return dotProduct / (length1 * length2)
 
 if __name__=="__main__":
     """
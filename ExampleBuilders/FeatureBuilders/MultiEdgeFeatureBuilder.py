@@ -7,6 +7,7 @@ from FeatureBuilder import FeatureBuilder
 import Utils.Libraries.PorterStemmer as PorterStemmer
 #from EdgeFeatureBuilder import EdgeFeatureBuilder
 import Utils.Libraries.combine as combine
+import Core.Predictions as Predictions
 
 class MultiEdgeFeatureBuilder(FeatureBuilder):
     """
@@ -46,16 +47,11 @@ class MultiEdgeFeatureBuilder(FeatureBuilder):
         for sentence in sentences:
             targetElements = sentence.findall(elementName)
             for element in targetElements:
-                predictions = element.get("predictions")
-                if predictions != None and predictions != "":
-                    predictions = predictions.split(",")
-                    for p in predictions:
-                        splits = p.split(":")
-                        value = float(splits[1])
-                        if self.predictedRange[0] == None or self.predictedRange[0] > value:
-                            self.predictedRange[0] = value
-                        if self.predictedRange[1] == None or self.predictedRange[1] < value:
-                            self.predictedRange[1] = value
+                for label, value in Predictions.getPredictions(element, "predictions"):
+                    if self.predictedRange[0] == None or self.predictedRange[0] > value:
+                        self.predictedRange[0] = value
+                    if self.predictedRange[1] == None or self.predictedRange[1] < value:
+                        self.predictedRange[1] = value
     
 #    def buildStructureFeatures(self, sentenceGraph, paths):
 #        t1 = sentenceGraph.entityHeadTokenByEntity[self.entity1]
@@ -107,20 +103,17 @@ class MultiEdgeFeatureBuilder(FeatureBuilder):
         can be used as features for edge detection. For these features to be used, the model must also have
         been trained on data that contains prediction confidence scores.
         """
-        predictions = element.get("predictions")
-        if predictions != None and predictions != "":
-            predictions = predictions.split(",")
-            for p in predictions:
-                splits = p.split(":")
+        predictions = Predictions.getPredictions(element, "predictions")
+        if len(predictions) > 0:
+            for label, value in predictions:
                 if self.predictedRange[0] == None or self.predictedRange[1] == None:
                     value = 1.0
                 else: 
-                    value = float(splits[1])
                     value -= self.predictedRange[0]
                     value /= (self.predictedRange[1] - self.predictedRange[0])
                     assert(value >= 0 and value <= 1)
-                    #print tag + "_strength_"+splits[0], value
-                self.setFeature(tag + "_strength_"+splits[0], value)
+                    #print tag + "_strength_"+label, value
+                self.setFeature(tag + "_strength_"+label, value)
         else:
             #print tag + "_strength_"+str(element.get("type")), 1.0
             self.setFeature(tag + "_strength_" + str(element.get("type")), 1.0)
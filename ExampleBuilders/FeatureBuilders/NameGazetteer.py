@@ -1,71 +1,109 @@
-__version__ = "$Revision: 1.1 $"
+"""
+Token-level gazetteer of (multi-token) names.
+
+The names are sequences of normalized tokens, each with a dictionary of types
+(e.g. entity types) and weights. For matching, the names are compiled into an
+Aho-Corasick automaton over the tokens, so all names occurring in a sentence
+are found in one pass over its tokens, regardless of the size of the
+gazetteer. The automaton can be saved as a MappedIndex file, which is opened
+with mmap, so that large lexicons are not loaded into memory and the same
+file is shared by all processes using it.
+
+Gazetteers are stored either as text files, with one name per line as the
+space-separated tokens and the comma-separated types (optionally as
+type:weight), or as compiled automata.
+"""
+__version__ = "$Revision: 1.2 $"
 
 import sys, os, types
 thisPath = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(os.path.abspath(os.path.join(thisPath,"../..")))
+import marshal
 import Core.SentenceGraph as SentenceGraph
 import Utils.ElementTreeUtils as ETUtils
 #from Utils.ProgressCounter import ProgressCounter
 import Utils.InteractionXML.CorpusElements as CorpusElements
 import Utils.Range as Range
+import Utils.MappedIndex as MappedIndex
+
+INDEX_KIND = "gazetteer"
+INDEX_VERSION = 1
 
 class NameGazetteer:
-    
-    def __init__(self):
+
+    def __init__(self, normalize=True):
         self.names = {}
-        self.normalize = True
-    
+        self.normalize = normalize
+        self.tables = None
+
     def normalizeText(self, text):
         return text.replace("-","").replace("/","").replace(",","").replace("\\","").replace(" ","").lower()
-    
+
+    def normalizeTokens(self, tokens):
+        """
+        The (normalized) tokens as UTF-8 strings, the form used as keys in the automaton.
+        """
+        if self.normalize:
+            tokens = [self.normalizeText(x) for x in tokens]
+        return [MappedIndex.encodeKey(x) for x in tokens]
+
     @classmethod
     def build(cls, input, output, parse, tokenization=None):
         gaz = NameGazetteer()
         gaz.fromXML(input, parse, tokenization)
         gaz.save(output)
         return gaz
-    
-    def addName(self, tokens, parent=None):
+
+    ###########################################################################
+    # Names
+    ###########################################################################
+
+    def addName(self, tokens, nameType=None, weight=1.0):
+        """
+        Add a name (a list of token texts), optionally with a type. The weight of
+        a type is the maximum of its added weights.
+        """
         if len(tokens) == 0:
             return
-        
-        if parent == None:
-            parent = self.names
-        
-        texts = []
-        tokText = tokens[0]
-        if self.normalize:
-            tokText = self.normalizeText(tokText)
-        noDigits = tokText.replace("0","").replace("1","").replace("2","").replace("0","")
-        if len(texts[0]) > 2 and texts[0][-1].isdigit():
-            texts.append(texts[0][:-1])
-        for text in texts:
-            if not parent.has_key(text):
-                parent[text] = {}
-            if len(tokens) == 1:
-                parent[text][None] = None # mark string end
-            else:
-                self.addName(tokens[1:], parent[text])
-    
-    def save(self, output, parent=None, path=[]):
+        key = tuple(self.normalizeTokens(tokens))
+        if key not in self.names:
+            self.names[key] = {}
+        if nameType != None:
+            nameType = MappedIndex.encodeKey(nameType)
+            self.names[key][nameType] = max(weight, self.names[key].get(nameType, weight))
+        self.tables = None
+
+    def save(self, output):
         if type(output) == types.StringType:
             output = open(output, "wt")
-        topLevel = False
-        if parent == None:
-            parent = self.names
-            topLevel = True
-        
-        if parent.has_key(None) and len(path) > 0:
-            output.write("\t".join(path)+"\n")
-        for key in sorted(parent.keys()):
-            if key == None:
+        for key in sorted(self.names.keys()):
+            output.write(" ".join(key) + "\t" + ",".join([x + ":" + str(self.names[key][x]) for x in sorted(self.names[key].keys())]) + "\n")
+        output.close()
+
+    def loadNames(self, input):
+        """
+        Add the names of a gazetteer text file. The tokens are normalized like the matched tokens,
+        which leaves the already normalized tokens of a saved gazetteer unchanged.
+        """
+        f = open(input, "rt")
+        for line in f:
+            line = line.rstrip("\r\n")
+            if line == "" or line[0] == "#":
                 continue
-            self.save(output, parent[key], path+[key])
-        if topLevel:
-            output.close()
-    
+            tokens, typeString = (line.split("\t", 1) + [""])[:2]
+            tokens = tokens.split(" ")
+            self.addName(tokens)
+            for item in typeString.split(","):
+                if ":" in item:
+                    nameType, weight = item.rsplit(":", 1)
+                    self.addName(tokens, nameType, float(weight))
+                elif item != "":
+                    self.addName(tokens, item)
+        f.close()
+
     def fromXML(self, input, parse, tokenization=None):
         self.names = {}
+        self.tables = None
         if type(input) == types.StringType:
             corpus = CorpusElements.loadCorpus(input, parse, tokenization)
         else:
@@ -76,15 +114,15 @@ class NameGazetteer:
                 if entity.get("given") == "True":
                     tokens = self.getTokens(entity, tokenTuples)
                     assert len(tokens) > 0
-                    self.addName(tokens)
-                    self.addName(["".join(tokens)])
-    
+                    self.addName(tokens, entity.get("type"))
+                    self.addName(["".join(tokens)], entity.get("type"))
+
     def prepareTokens(self, tokens):
         tokenTuples = []
         for token in tokens:
             tokenTuples.append( (Range.charOffsetToSingleTuple(token.get("charOffset")), token) )
         return tokenTuples
-    
+
     def getTokens(self, entity, tokenTuples):
         offset = entity.get("charOffset")
         assert offset != None
@@ -96,31 +134,152 @@ class NameGazetteer:
             elif len(match) > 0: # passed end
                 break
         return match
-        
-    def matchTokens(self, tokens, tokenIsName, nameDict=None, tokenSet=None, tokenChain=[]):
-        if len(tokens) == 0:
-            return
-        if tokenSet == None:
-            tokenSet = set()
-        if nameDict == None:
-            nameDict = self.names
-        
-        token = tokens[0]
-        self.matchTokens(tokens[1:], tokenIsName, self.names)
-        if not tokenIsName[token]:
-            text = token.get("text")
-            assert text != None
-            if self.normalize:
-                text = self.normalizeText(text)
-            for key in nameDict.keys():
-                if key == text:
-                    if nameDict[key].has_key(None): # string end
-                        for prevToken in tokenChain:
-                            tokenSet.add(prevToken)
-                        tokenSet.add(token)
-                    self.matchTokens(tokens[1:], tokenIsName, nameDict[key], tokenSet, tokenChain+[token])
+
+    ###########################################################################
+    # Automaton
+    ###########################################################################
+
+    def compileTables(self):
+        """
+        Build the Aho-Corasick automaton of the names. The states are numbered from
+        the root (0). The "goto" table maps "state\\ttoken" to the next state, the "fail"
+        table maps a state to its failure state (if not the root) and the "output" table
+        maps a state to the marshalled list of the (length, types) of the names ending there.
+        """
+        gotos = [{}]
+        outputs = [[]]
+        for key in sorted(self.names.keys()):
+            state = 0
+            for token in key:
+                if token not in gotos[state]:
+                    gotos.append({})
+                    outputs.append([])
+                    gotos[state][token] = len(gotos) - 1
+                state = gotos[state][token]
+            outputs[state].append((len(key), self.names[key]))
+        # Breadth-first computation of the failure states
+        fails = [0] * len(gotos)
+        queue = sorted(gotos[0].values())
+        index = 0
+        while index < len(queue):
+            state = queue[index]
+            index += 1
+            for token in sorted(gotos[state].keys()):
+                nextState = gotos[state][token]
+                queue.append(nextState)
+                fail = fails[state]
+                while fail != 0 and token not in gotos[fail]:
+                    fail = fails[fail]
+                fails[nextState] = gotos[fail].get(token, 0)
+                outputs[nextState] = outputs[nextState] + outputs[fails[nextState]]
+        tables = {"goto":{}, "fail":{}, "output":{}}
+        for state in range(len(gotos)):
+            for token, nextState in gotos[state].iteritems():
+                tables["goto"][str(state) + "\t" + token] = str(nextState)
+            if fails[state] != 0:
+                tables["fail"][str(state)] = str(fails[state])
+            if len(outputs[state]) > 0:
+                tables["output"][str(state)] = marshal.dumps(outputs[state])
+        return tables
+
+    def compile(self, output):
+        """
+        Save the automaton as a MappedIndex file.
+        """
+        tables = self.compileTables()
+        print >> sys.stderr, "Compiling gazetteer", output, "(" + str(len(self.names)) + " names, " + str(len(tables["goto"]) + 1) + " states)"
+        MappedIndex.write(output, tables, INDEX_KIND, INDEX_VERSION, {"normalize":self.normalize})
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Load a compiled (memory-mapped) or a text gazetteer.
+        """
+        header = MappedIndex.readHeader(filename)
+        if header != None:
+            assert header["kind"] == INDEX_KIND and header["version"] == INDEX_VERSION, ("Incompatible gazetteer", filename)
+            gaz = cls(header["source"]["normalize"])
+            gaz.tables = MappedIndex.MappedIndex(filename)
+        else:
+            gaz = cls()
+            gaz.loadNames(filename)
+        return gaz
+
+    def getTables(self):
+        if self.tables == None:
+            self.tables = self.compileTables()
+        return self.tables
+
+    ###########################################################################
+    # Matching
+    ###########################################################################
+
+    def match(self, texts):
+        """
+        All names in a sequence of token texts, in one pass over the tokens. Returns a
+        list of (begin, end, types) spans, with end exclusive, in the order of their end.
+        """
+        tables = self.getTables()
+        gotos, fails, outputs = tables["goto"], tables["fail"], tables["output"]
+        spans = []
+        state = "0"
+        for i, text in enumerate(self.normalizeTokens(texts)):
+            nextState = gotos.get(state + "\t" + text)
+            while nextState == None and state != "0":
+                state = fails.get(state, "0")
+                nextState = gotos.get(state + "\t" + text)
+            state = nextState if nextState != None else "0"
+            output = outputs.get(state)
+            if output != None:
+                for length, nameTypes in marshal.loads(output):
+                    spans.append((i - length + 1, i + 1, nameTypes))
+        return spans
+
+    def longestMatches(self, spans):
+        """
+        The non-overlapping spans, preferring the leftmost and then the longest ones.
+        """
+        selected = []
+        end = 0
+        for span in sorted(spans, key=lambda x: (x[0], -x[1])):
+            if span[0] >= end:
+                selected.append(span)
+                end = span[1]
+        return selected
+
+    def __contains__(self, text):
+        return self.getTypes(text) != None
+
+    def __getitem__(self, text):
+        nameTypes = self.getTypes(text)
+        if nameTypes == None:
+            raise KeyError(text)
+        return nameTypes
+
+    def getTypes(self, text):
+        """
+        The types of a single token name, or None if the token is not a name.
+        """
+        for begin, end, nameTypes in self.match([text]):
+            return nameTypes
+        return None
+
+    def matchTokens(self, tokens, tokenIsName):
+        """
+        The set of the tokens that are part of a name. Tokens that are already names
+        (in tokenIsName) are not matched.
+        """
+        tokenSet = set()
+        run = []
+        for token in tokens + [None]:
+            if token == None or tokenIsName[token]:
+                for begin, end, nameTypes in self.match([x.get("text") for x in run]):
+                    tokenSet.update(run[begin:end])
+                run = []
+            else:
+                run.append(token)
         return tokenSet
-            
+
 if __name__=="__main__":
     # Import Psyco if available
     try:
@@ -132,17 +291,22 @@ if __name__=="__main__":
 
     from optparse import OptionParser
     import os
-    optparser = OptionParser(usage="%prog [options]\nCreate an html visualization for a corpus.")
+    optparser = OptionParser(usage="%prog [options]\nBuild a gazetteer of the given names in a corpus and match it against a corpus.")
     optparser.add_option("-i", "--input", default=None, dest="input", help="Input file (interaction XML)")
     optparser.add_option("-o", "--output", default=None, dest="output", help="Output file name")
+    optparser.add_option("-c", "--compile", default=False, action="store_true", dest="compile", help="Compile a gazetteer text file (-i) into a memory-mapped automaton (-o)")
     optparser.add_option("-e", "--test", default=None, dest="test", help="")
     optparser.add_option("-p", "--parse", default="split-McClosky", dest="parse", help="Parse XML element name")
     optparser.add_option("-t", "--tokenization", default="split-McClosky", dest="tokenization", help="Tokenization XML element name")
     (options, args) = optparser.parse_args()
-    
+
+    if options.compile:
+        NameGazetteer.load(options.input).compile(options.output)
+        sys.exit()
+
     corpus = SentenceGraph.loadCorpus(options.input, options.parse, options.tokenization)
     gaz = NameGazetteer.build(corpus, options.output, options.parse, options.tokenization)
-    
+
     if options.test != None:
         corpus = SentenceGraph.loadCorpus(options.test, options.parse, options.tokenization)
     for sentence in corpus.sentences:
@@ -160,4 +324,4 @@ if __name__=="__main__":
         if chain:
             string += "\n"
         if string != "":
-            print sentence.sentence.get("id") + "\n" + string
\ No newline at end of file
+            print sentence.sentence.get("id") + "\n" + string
@@ -1,48 +1,50 @@
 from FeatureBuilder import FeatureBuilder
 import sys, os
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../..")
+import Utils.Settings as Settings
+import Utils.OBOIndex as OBOIndex
 
-class Term():
-    def __init__(self, identifier=None, name=None):
-        self.id = identifier
-        self.name = name
-        self.fullId = None
-        self.parents = []
-        #self.children = children
+OBO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "OntoBiotope_BioNLP-ST-2016.obo")
+
+def getIndexPath():
+    """
+    The compiled index of the ontology, from the ONTOBIOTOPE_INDEX setting or in the
+    resources directory under DATAPATH, so that it is not written into the source tree.
+    """
+    indexPath = getattr(Settings, "ONTOBIOTOPE_INDEX", None)
+    if indexPath == None:
+        indexPath = os.path.join(Settings.DATAPATH, "resources", os.path.basename(OBO_PATH) + ".index")
+    return indexPath
 
 class OntoBiotopeFeatureBuilder(FeatureBuilder):
     def __init__(self, featureSet):
         FeatureBuilder.__init__(self, featureSet)
-        self.terms = {}
-        self.byName = {}
-        self.byKeyword = {}
-        self.loadOBO(os.path.join(os.path.dirname(os.path.abspath(__file__)), "OntoBiotope_BioNLP-ST-2016.obo"))
+        self.ontology = OBOIndex.getIndex(OBO_PATH, getIndexPath())
+        self.parentCache = {}
+    
+    def getFullId(self, termId):
+        return termId + "_" + "_".join(self.ontology.getName(termId).lower().split())
     
     def getParents(self, name):
-        terms = []
-        if name:
-            terms += self.byName.get(name, [])
-        for keyword in name.split():
-            terms += self.byKeyword.get(keyword, [])
-        terms = sorted(set(terms), key=lambda x: x.id)
-        visited = set()
-        while terms:
-            for term in terms:
-                visited.add(term)
-            parents = []
-            for term in terms:
-                parents.extend(term.parents)
-            parents = sorted(set(parents), key=lambda x: x.id)
-            terms = [x for x in parents if x not in visited]
-        return sorted(visited, key=lambda x: x.id)
+        """
+        The full ids of the terms matching the name or its keywords and of all their ancestors.
+        """
+        if name not in self.parentCache:
+            termIds = []
+            if name:
+                termIds += self.ontology.getIdsByName(name)
+            for keyword in name.split():
+                termIds += self.ontology.getIdsByKeyword(keyword)
+            self.parentCache[name] = [self.getFullId(x) for x in self.ontology.getClosure(termIds)]
+        return self.parentCache[name]
     
     def getOBOFeaturesForEntity(self, entity, tag):
         names = []
         if entity.get("type") in ("Geographical", "Habitat"):
-            terms = self.getParents(entity.get("text").lower())
-            for term in terms:
-                names.append("OBO-" + tag + term.fullId)
-                #print term.id, term.name
-                #self.features[self.featureSet.getId(tag + term.fullId)] = 1
+            fullIds = self.getParents(entity.get("text").lower())
+            for fullId in fullIds:
+                names.append("OBO-" + tag + fullId)
+                #self.features[self.featureSet.getId(tag + fullId)] = 1
         return names
     
     def buildOBOFeaturesForEntityPair(self, e1, e2):
@@ -55,56 +57,8 @@ class OntoBiotopeFeatureBuilder(FeatureBuilder):
                 self.features[self.featureSet.getId(e1Name + "__" + e2Name)] = 1
     
     def buildOBOFeaturesForToken(self, token, tag=""):
-        terms = self.getParents(token.get("text").lower())
-        if len(terms) > 0:
+        fullIds = self.getParents(token.get("text").lower())
+        if len(fullIds) > 0:
             self.features[self.featureSet.getId("OntoBiotope_match")] = 1
-        for term in terms:
-            self.features[self.featureSet.getId(tag + term.fullId)] = 1
-    
-    ###########################################################################
-    # OBO Loading
-    ###########################################################################    
-    
-    def addTerm(self, term):
-        assert term.id not in self.terms
-        self.terms[term.id] = term
-        if term.name not in self.byName:
-            self.byName[term.name] = set()
-        self.byName[term.name].add(term)
-        for keyword in term.name.split():
-            if keyword not in self.byKeyword:
-                self.byKeyword[keyword] = set()
-            self.byKeyword[keyword].add(term)
-    
-    def prepareTerms(self):
-        for key in sorted(self.terms.keys()):
-            term = self.terms[key]
-            term.fullId = term.id + "_" + "_".join(term.name.split())
-            term.parents = [self.terms[x] for x in term.parents]
-        for key in self.byName:
-            self.byName[key] = sorted(self.byName[key], key=lambda x: x.id)
-        for key in self.byKeyword:
-            self.byKeyword[key] = sorted(self.byKeyword[key], key=lambda x: x.id)
-    
-    def loadOBO(self, oboPath):
-        print >> sys.stderr, "Loading OBO from", oboPath
-        f = open(oboPath, "rt")
-        lines = f.readlines()
-        f.close()
-        term = None
-        for line in lines:
-            line = line.strip()
-            if line == "[Term]":
-                if term:
-                    self.addTerm(term)
-                term = Term()
-            elif ":" in line:
-                tag, content = [x.strip() for x in line.split(":", 1)]
-                if tag == "id":
-                    term.id = content
-                elif tag == "name":
-                    term.name = content.lower()
-                if tag == "is_a":
-                    term.parents.append(content.split("!")[0].strip())
-        self.addTerm(term)
-        self.prepareTerms()
\ No newline at end of file
+        for fullId in fullIds:
+            self.features[self.featureSet.getId(tag + fullId)] = 1
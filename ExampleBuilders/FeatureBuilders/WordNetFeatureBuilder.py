@@ -5,59 +5,146 @@ from Core.IdSet import IdSet
 import Utils.Libraries.PorterStemmer as PorterStemmer
 import Core.ExampleUtils as ExampleUtils
 from FeatureBuilder import FeatureBuilder
+import Utils.Settings as Settings
+import Utils.MappedIndex as MappedIndex
+import marshal
+from collections import OrderedDict
+
+TABLE_KIND = "wordnet"
+TABLE_VERSION = 1
+WORDNET_POS = ["n", "v", "a", "r"]
+
+def pennPOSToWordNet(pos):
+    if pos == None:
+        return None
+    if pos.startswith("JJ"):
+        return "a" #wn.ADJ
+    elif pos.startswith("NN"):
+        return "n" #wn.NOUN
+    elif pos.startswith("VB"):
+        #print "JEP"
+        #print "VERB", wn.VERB
+        return "v" #wn.VERB
+    elif pos.startswith("RB"):
+        return "r" #wn.ADV
+    else:
+        return None
+
+def getKey(text, wordNetPos):
+    # WordNet lookups are case-insensitive
+    if isinstance(text, unicode):
+        text = text.encode("utf-8")
+    return text.lower() + "\t" + (wordNetPos if wordNetPos != None else "")
+
+def makeEntry(synsets, allLexnames=False):
+    """
+    The data used for the features from a list of NLTK synsets: the name, lexname and hypernym
+    names of the first synset, and optionally the lexnames of all synsets. None if there are no synsets.
+    """
+    if len(synsets) == 0:
+        return None
+    first = synsets[0]
+    return (first.name(), first.lexname(), tuple([x.name() for x in first.hypernyms()]),
+            tuple([x.lexname() for x in synsets]) if allLexnames else ())
+
+class WordNetLexicon:
+    """
+    WordNet lookups by (text, WordNet POS). The results are read from a precompiled table
+    (see compileTable) if one is defined, otherwise (or for texts not in the table) from
+    NLTK, which is imported only when first needed. Recently used results are kept in an
+    LRU cache of at most cacheSize entries.
+    """
+    def __init__(self, table=None, cacheSize=100000):
+        self.table = MappedIndex.MappedIndex(table)["entries"] if table != None else None
+        self.cacheSize = cacheSize
+        self.cache = OrderedDict()
+        self.wordnet = None
+    
+    def getWordNet(self):
+        if self.wordnet == None:
+            from nltk.corpus import wordnet
+            self.wordnet = wordnet
+            print >> sys.stderr, "Using WordNet via NLTK"
+        return self.wordnet
+    
+    def lookup(self, text, wordNetPos):
+        key = getKey(text, wordNetPos)
+        if key in self.cache:
+            entry = self.cache.pop(key)
+        else:
+            value = self.table.get(key) if self.table != None else None
+            if value != None:
+                entry = marshal.loads(value)
+            else:
+                entry = makeEntry(self.getWordNet().synsets(text, wordNetPos), wordNetPos == None)
+            if len(self.cache) >= self.cacheSize:
+                self.cache.popitem(last=False)
+        self.cache[key] = entry
+        return entry
+    
+    def getLexname(self, text, wordNetPos):
+        entry = self.lookup(text, wordNetPos)
+        return entry[1] if entry != None else None
+
+def compileTable(output, corpora=None):
+    """
+    Compile a table of the WordNet lookups for all lemma names of the local NLTK WordNet data, with
+    and without their POS. The texts and POS tags of the tokens in the (optional) interaction XML
+    corpora are added, so that their inflected forms are also found in the table.
+    """
+    from nltk.corpus import wordnet
+    keys = set()
+    for wordNetPos in WORDNET_POS:
+        for lemma in wordnet.all_lemma_names(wordNetPos):
+            keys.add((lemma, wordNetPos))
+            keys.add((lemma, None))
+    if corpora != None:
+        import Utils.ElementTreeUtils as ETUtils
+        for corpus in corpora:
+            print >> sys.stderr, "Reading tokens from", corpus
+            for event, element in ETUtils.ETIteratorFromObj(corpus, ("start",)):
+                if element.tag == "token" and element.get("text") != None:
+                    keys.add((element.get("text"), pennPOSToWordNet(element.get("POS"))))
+                    keys.add((element.get("text"), None))
+    entries = {}
+    for text, wordNetPos in keys:
+        key = getKey(text, wordNetPos)
+        if key not in entries:
+            entries[key] = marshal.dumps(makeEntry(wordnet.synsets(text, wordNetPos), wordNetPos == None))
+    MappedIndex.write(output, {"entries":entries}, TABLE_KIND, TABLE_VERSION)
+    print >> sys.stderr, "WordNet table with", len(entries), "entries written to", output
 
 class WordNetFeatureBuilder(FeatureBuilder):
+    lexicon = None
+    
     def __init__(self, featureSet=None):
         FeatureBuilder.__init__(self, featureSet)
-        from nltk.corpus import wordnet
-        self.wordnet = wordnet
-        print >> sys.stderr, "Using WordNet via NLTK"
+        if WordNetFeatureBuilder.lexicon == None:
+            table = getattr(Settings, "WORDNET_TABLE", None)
+            if table != None and not MappedIndex.isCurrent(table, TABLE_KIND, TABLE_VERSION):
+                print >> sys.stderr, "WordNet table", table, "not found or out of date, not used"
+                table = None
+            elif table != None:
+                print >> sys.stderr, "Using WordNet table", table
+            WordNetFeatureBuilder.lexicon = WordNetLexicon(table)
+        self.lexicon = WordNetFeatureBuilder.lexicon
     
     def pennPOSToWordNet(self, pos):
-        if pos.startswith("JJ"):
-            return "a" #wn.ADJ
-        elif pos.startswith("NN"):
-            return "n" #wn.NOUN
-        elif pos.startswith("VB"):
-            #print "JEP"
-            #print "VERB", wn.VERB
-            return "v" #wn.VERB
-        elif pos.startswith("RB"):
-            return "r" #wn.ADV
-        else:
-            return None
-    
-    def getSynset(self, text, wordNetPos):
-        if wordNetPos == None:
-            return None
-        synsets = self.wordnet.synsets(text, pos=wordNetPos)
-        if len(synsets) > 0:
-            return [synsets[0]]
-        else:
-            return None
-        
-    def getHypernyms(self, synset, tag=""):
-        rv = []
-        rv.append("SYNSET_" + tag + synset.name()) # add also the base level
-        for hypernym in synset.hypernyms():
-            rv.append("HYPER_" + tag + hypernym.name())
-        return rv
+        return pennPOSToWordNet(pos)
     
     def getTokenFeatures(self, tokenText, pennPos, tag=""):
-        #print tokenText, pennPos, "X",
         rv = []
         if tokenText == None:
             return rv
-        #print "A",
         wordNetPos = self.pennPOSToWordNet(pennPos)
-        #print "B",
-        synsets = self.getSynset(tokenText, wordNetPos)
-        #print "C",
-        if synsets != None:
-            rv.extend(self.getHypernyms(synsets[0], tag))
-            #rv.append("SYNSET_" + tag + synsets[0].name())
-            rv.append("LEX_" + tag + synsets[0].lexname())
-        #print "D"
+        if wordNetPos == None:
+            return rv
+        entry = self.lexicon.lookup(tokenText, wordNetPos)
+        if entry != None:
+            rv.append("SYNSET_" + tag + entry[0]) # add also the base level
+            for hypernym in entry[2]:
+                rv.append("HYPER_" + tag + hypernym)
+            rv.append("LEX_" + tag + entry[1])
         return rv
     
     def buildPathFeatures(self, path):
@@ -66,11 +153,8 @@ class WordNetFeatureBuilder(FeatureBuilder):
         lexnames = []
         for token in path[1:-1]:
             pos = self.pennPOSToWordNet(token.get("POS"))
-            synsets = self.getSynset(token.get("text"), pos)
-            if synsets != None:
-                lexnames.append(synsets[0].lexname())
-            else:
-                lexnames.append("NONE")
+            lexname = self.lexicon.getLexname(token.get("text"), pos) if pos != None else None
+            lexnames.append(lexname if lexname != None else "NONE")
         lexnames = ["ENT"] + lexnames + ["ENT"]
         if len(lexnames) <= 4:
             self.features[self.featureSet.getId("WNP_" + "-".join(lexnames))] = 1
@@ -91,13 +175,11 @@ class WordNetFeatureBuilder(FeatureBuilder):
         t2Index = tokens.index(token1)
         if abs(t1Index - t2Index) > 1:
             return
-        synsets = self.wordnet.synsets(token1.get("text") + "_" + token2.get("text"))
-        if synsets != None:
-            self.features[self.featureSet.getId("WNC_True")] = 1
-            for synset in synsets:
-                self.features[self.featureSet.getId("WNC_" + synset.lexname())] = 1
-        else:
-            self.features[self.featureSet.getId("WNC_False")] = 1
+        entry = self.lexicon.lookup(token1.get("text") + "_" + token2.get("text"), None)
+        self.features[self.featureSet.getId("WNC_True")] = 1
+        if entry != None:
+            for lexname in entry[3]:
+                self.features[self.featureSet.getId("WNC_" + lexname)] = 1
     
     def buildLinearFeatures(self, token, tokens, before=1, after=1, tag=""):
         tokenIndex = tokens.index(token)
@@ -107,11 +189,19 @@ class WordNetFeatureBuilder(FeatureBuilder):
             if currentIndex < 0 or currentIndex >= numTokens:
                 continue
             t = tokens[currentIndex]
-            synsets = self.wordnet.synsets(t.get("text"), self.pennPOSToWordNet(t.get("POS")))
-            if len(synsets) > 0:
-                self.features[self.featureSet.getId("WNL_" + tag + "_lin" + str(i) + "_" + synsets[0].lexname())] = 1
+            lexname = self.lexicon.getLexname(t.get("text"), self.pennPOSToWordNet(t.get("POS")))
+            if lexname != None:
+                self.features[self.featureSet.getId("WNL_" + tag + "_lin" + str(i) + "_" + lexname)] = 1
 
 if __name__=="__main__":
+    from optparse import OptionParser
+    optparser = OptionParser(usage="%prog [options]\nCompile a WordNet table or test the WordNet features.")
+    optparser.add_option("-c", "--compile", default=None, dest="compile", help="Compile a WordNet table to this file")
+    optparser.add_option("-i", "--input", default=None, dest="input", help="Comma-separated corpora whose tokens are added to the table")
+    (options, args) = optparser.parse_args()
+    if options.compile != None:
+        compileTable(options.compile, options.input.split(",") if options.input != None else None)
+        sys.exit()
     w = WordNetFeatureBuilder()
     print w.getTokenFeatures("cat", "NN")
     print w.getTokenFeatures("rivers", "NN")
@@ -11,7 +11,7 @@ from ExampleBuilder import ExampleBuilder
 import Utils.Libraries.PorterStemmer as PorterStemmer
 from Core.IdSet import IdSet
 import Core.ExampleUtils as ExampleUtils
-#from Core.Gazetteer import Gazetteer
+from FeatureBuilders.NameGazetteer import NameGazetteer
 # For gold mapping
 import Evaluators.EvaluateInteractionXML as EvaluateInteractionXML
 
@@ -78,7 +78,7 @@ class ModifierExampleBuilder(ExampleBuilder):
         ExampleBuilder.__init__(self, classSet, featureSet)
         #gazetteerFileName="/usr/share/biotext/GeniaChallenge/SharedTaskTriggerTest/gazetteer-train"
         if gazetteerFileName!=None:
-            self.gazetteer=Gazetteer.loadGztr(gazetteerFileName)
+            self.gazetteer=NameGazetteer.load(gazetteerFileName)
             print >> sys.stderr, "Loaded gazetteer from",gazetteerFileName
         else:
             self.gazetteer=None
@@ -358,7 +358,7 @@ class ModifierExampleBuilder(ExampleBuilder):
             extra = {"xtype":"task3","t3type":task3Type,"t":token.get("id"),"entity":entity.get("id")}
             #examples.append( (sentenceGraph.getSentenceId()+".x"+str(exampleIndex),category,features,extra) )
             example = (sentenceGraph.getSentenceId()+".x"+str(exampleIndex),category,features,extra)
-            ExampleUtils.appendExamples([example], outfile)
+            ExampleUtils.appendExamples([example], outfile, self.featureCounts)
             exampleIndex += 1            
             self.exampleStats.endExample()
         #return examples
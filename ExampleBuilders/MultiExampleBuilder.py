@@ -0,0 +1,83 @@
+"""
+Build examples for several ExampleBuilders in a single pass over a corpus
+"""
+import sys, os
+import types
+import itertools
+from collections import OrderedDict
+from Core.SentenceGraph import getCorpusIterator
+import Utils.Instrumentation as Instrumentation
+
+class MultiExampleBuilder:
+    """
+    Example generation for several detectors usually processes the same corpus with
+    each ExampleBuilder in turn, parsing the XML and building the SentenceGraphs once
+    for every builder. MultiExampleBuilder instead reads each document once and passes
+    its sentences to all of the builders registered for that input. Each builder still
+    writes its own example file and class/feature ids. Builders that use a different
+    input, gold corpus, parse or intersentence interaction setting get a separate pass.
+    The builders must not modify the SentenceGraphs they are given.
+    """
+    def __init__(self):
+        self.jobs = []
+
+    def add(self, builder, input, output, gold=None, append=False, allowNewIds=True, structureAnalyzer=None):
+        """
+        Register an ExampleBuilder (as initialized by ExampleBuilder.create) for processing a corpus.
+        """
+        self.jobs.append({"builder":builder, "input":input, "output":output, "gold":gold,
+                          "append":append, "allowNewIds":allowNewIds, "structureAnalyzer":structureAnalyzer})
+
+    def getPasses(self):
+        """
+        Group the registered builders by the corpus pass they can share, in the order they were added.
+        """
+        passes = OrderedDict()
+        for job in self.jobs:
+            builder = job["builder"]
+            job["intersentence"] = builder.getIntersentenceSettings(job["gold"])
+            # Inputs that are not filenames (e.g. in-memory trees) can only be shared if they are the same object
+            key = (job["input"] if type(job["input"]) in types.StringTypes else id(job["input"]),
+                   job["gold"] if (job["gold"] == None or type(job["gold"]) in types.StringTypes) else id(job["gold"]),
+                   builder.parse, builder.tokenization, job["intersentence"])
+            if key not in passes:
+                passes[key] = []
+            passes[key].append(job)
+        return passes.values()
+
+    def run(self):
+        for jobs in self.getPasses():
+            self.processCorpus(jobs)
+        self.jobs = []
+
+    @Instrumentation.instrument("MultiExampleBuilder.processCorpus")
+    def processCorpus(self, jobs):
+        input, gold = jobs[0]["input"], jobs[0]["gold"]
+        first = jobs[0]["builder"]
+        print >> sys.stderr, "Building examples with", len(jobs), "builder(s) in one pass over", input, ":", ", ".join([x["builder"].__class__.__name__ for x in jobs])
+        # The element counts and the sentences for the predicted value range are determined only once
+        elementCounts = None
+        if type(input) in types.StringTypes:
+            elementCounts = first.getElementCounts(input)
+        sentences = first.getSentences(input, first.parse, first.tokenization)
+        outfiles = []
+        for job in jobs:
+            outfiles.append(job["builder"].beginCorpus(input, job["output"], job["append"], job["structureAnalyzer"], elementCounts, sentences))
+        sentences = None
+
+        removeIntersentenceInteractions, removeGoldIntersentenceInteractions = jobs[0]["intersentence"]
+        inputIterator = getCorpusIterator(input, None, first.parse, first.tokenization, removeIntersentenceInteractions=removeIntersentenceInteractions)
+        if gold != None:
+            goldIterator = getCorpusIterator(gold, None, first.parse, first.tokenization, removeIntersentenceInteractions=removeGoldIntersentenceInteractions)
+        else:
+            goldIterator = []
+        for inputSentences, goldSentences in itertools.izip_longest(inputIterator, goldIterator, fillvalue=None):
+            assert inputSentences != None
+            if gold != None:
+                assert goldSentences != None
+            for job, outfile in zip(jobs, outfiles):
+                job["builder"].processDocument(inputSentences, goldSentences, outfile, structureAnalyzer=job["structureAnalyzer"])
+
+        for job, outfile in zip(jobs, outfiles):
+            print >> sys.stderr, "Finished", job["builder"].__class__.__name__, "examples for", job["output"]
+            job["builder"].endCorpus(outfile, job["allowNewIds"])
@@ -225,7 +225,7 @@ class PhraseTriggerExampleBuilder(ExampleBuilder):
             else:
                 extra["eids"] = ",".join([x.get("id") for x in phraseToEntity[phrase]])
             example = (sentenceGraph.getSentenceId()+".x"+str(exampleIndex), category, features, extra)
-            ExampleUtils.appendExamples([example], outfile)
+            ExampleUtils.appendExamples([example], outfile, self.featureCounts)
             self.exampleStats.endExample()
             exampleIndex += 1
         
@@ -398,7 +398,7 @@ class UnmergingExampleBuilder(ExampleBuilder):
                     example[1] = self.classSet.getId(category)
                     example[3] = extra
                     #examples.append( example )
-                    ExampleUtils.appendExamples([example], outfile)
+                    ExampleUtils.appendExamples([example], outfile, self.featureCounts)
                     exampleIndex += 1
                 else: # not a valid event or valid entity
                     if len(issues) == 0: # must be > 0 so that it gets filtered
@@ -8,6 +8,7 @@ thisPath = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(os.path.abspath(os.path.join(thisPath,"..")))
 import Core.ExampleUtils as ExampleUtils
 import Core.SentenceGraph as SentenceGraph
+import Core.Predictions as Predictions
 from Core.IdSet import IdSet
 from Utils.ProgressCounter import ProgressCounter
 try:
@@ -234,17 +235,17 @@ class SentenceExampleWriter:
                 predictionString += className + ":" + str(classWeights[i])
             element.attrib["predictions"] = predictionString
     
-    def getPredictionStrengthString(self, prediction, classSet, classIds, skipClasses=None):
+    def getPredictionStrength(self, prediction, classSet, classIds):
+        """
+        The class names and confidences of a prediction.
+        """
         if isinstance(prediction, dict):
             classWeights = prediction.get("confidence", [])
         else:
             classWeights = prediction[1:]
-        predictionString = ""
-        for i in range(len(classWeights)):
-            className = classSet.getName(classIds[i])
-            if skipClasses != None and className in skipClasses:
-                continue
-            if predictionString != "":
-                predictionString += ","
-            predictionString += classSet.getName(classIds[i]) + ":" + str(classWeights[i])
-        return predictionString
+        return [classSet.getName(classIds[i]) for i in range(len(classWeights))], classWeights
+    
+    def getPredictionStrengthString(self, prediction, classSet, classIds, skipClasses=None):
+        labels, confidences = self.getPredictionStrength(prediction, classSet, classIds)
+        return Predictions.toString(labels, confidences, skipClasses)
+    
@@ -0,0 +1,247 @@
+"""
+Resumable job scheduling for batch.py.
+
+The scheduler keeps a persistent manifest of all batch inputs as a JSON-lines
+file. Each state change of an input is appended to the manifest as a new line,
+so the manifest survives crashes and a restarted scheduler continues exactly
+where the previous one stopped. Inputs are submitted largest first, so that
+long jobs do not end up running alone at the end of the batch.
+"""
+import sys, os
+import time
+import json
+from collections import defaultdict
+
+class Manifest:
+    """
+    An append-only JSON-lines log of batch job states. The last record for
+    an input defines its current state.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.records = {}
+        self.order = []
+        if os.path.exists(filename):
+            self.load()
+
+    def load(self):
+        f = open(self.filename, "rt")
+        for line in f:
+            line = line.strip()
+            if line == "":
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError: # a partially written last line
+                print >> sys.stderr, "Warning, skipping invalid manifest line", line
+                continue
+            self._setRecord(record)
+        f.close()
+        print >> sys.stderr, "Loaded manifest", self.filename, "with", len(self.records), "inputs"
+
+    def compact(self):
+        """
+        Rewrite the manifest so that it contains only the current record for each input.
+        """
+        tempFilename = self.filename + ".tmp"
+        f = open(tempFilename, "wt")
+        for input in self.order:
+            f.write(json.dumps(self.records[input], sort_keys=True) + "\n")
+        f.close()
+        os.rename(tempFilename, self.filename)
+
+    def _setRecord(self, record):
+        if record["input"] not in self.records:
+            self.order.append(record["input"])
+        self.records[record["input"]] = record
+
+    def get(self, input):
+        return self.records.get(input)
+
+    def update(self, input, **values):
+        """
+        Change the record of an input and append the new record to the manifest.
+        """
+        record = dict(self.records.get(input, {"input":input, "attempts":0}))
+        record.update(values)
+        record["time"] = time.time()
+        self._setRecord(record)
+        if os.path.dirname(self.filename) != "" and not os.path.exists(os.path.dirname(self.filename)):
+            os.makedirs(os.path.dirname(self.filename))
+        f = open(self.filename, "at")
+        f.write(json.dumps(record, sort_keys=True) + "\n")
+        f.close()
+        return record
+
+    def getStatistics(self):
+        """
+        Per-state counts and runtime statistics of the finished jobs, for capacity planning.
+        """
+        stats = {"states":defaultdict(int), "jobs":0, "runtime":0.0, "bytes":0}
+        runtimes = []
+        for record in self.records.values():
+            stats["states"][record.get("state")] += 1
+            if record.get("state") == "FINISHED" and record.get("runtime") != None:
+                runtimes.append(record["runtime"])
+                stats["bytes"] += record.get("size", 0)
+        stats["states"] = dict(stats["states"])
+        stats["jobs"] = len(runtimes)
+        if len(runtimes) > 0:
+            runtimes.sort()
+            stats["runtime"] = sum(runtimes)
+            stats["min"] = runtimes[0]
+            stats["max"] = runtimes[-1]
+            stats["mean"] = stats["runtime"] / len(runtimes)
+            stats["median"] = runtimes[len(runtimes) / 2]
+            if stats["runtime"] > 0:
+                stats["bytesPerSecond"] = stats["bytes"] / stats["runtime"]
+        return stats
+
+    def printStatistics(self, out=None):
+        if out == None:
+            out = sys.stderr
+        stats = self.getStatistics()
+        print >> out, "Manifest", self.filename, "states:", ", ".join([str(key) + "=" + str(stats["states"][key]) for key in sorted(stats["states"])])
+        if stats["jobs"] > 0:
+            print >> out, "Finished jobs:", stats["jobs"], "total runtime %.1f s, mean %.1f s, median %.1f s, min %.1f s, max %.1f s" % (stats["runtime"], stats["mean"], stats["median"], stats["min"], stats["max"])
+            if "bytesPerSecond" in stats:
+                print >> out, "Throughput: %.1f input bytes per second" % stats["bytesPerSecond"]
+        return stats
+
+def getInputSize(input):
+    """
+    Size of an input file, or the total size of the files in an input directory.
+    """
+    if os.path.isfile(input):
+        return os.path.getsize(input)
+    size = 0
+    for triple in os.walk(input):
+        for filename in triple[2]:
+            path = os.path.join(triple[0], filename)
+            if os.path.isfile(path):
+                size += os.path.getsize(path)
+    return size
+
+class BatchScheduler:
+    """
+    Submits batch jobs through a Connection in largest-first order, keeping
+    at most maxJobs of them running. The state, runtime and return code of
+    each job are recorded in a Manifest. Failed jobs are resubmitted until
+    they have been tried retries + 1 times.
+    """
+    def __init__(self, manifest, connection, maxJobs=None, retries=0, sleepTime=15, getMaxJobs=None):
+        if not isinstance(manifest, Manifest):
+            manifest = Manifest(manifest)
+        self.manifest = manifest
+        self.connection = connection
+        self.maxJobs = maxJobs
+        self.retries = retries
+        self.sleepTime = sleepTime
+        self.getMaxJobs = getMaxJobs
+        self.jobs = {}
+        self.running = set()
+
+    def add(self, input, command, jobDir, jobName):
+        """
+        Add a job for an input. The command must be fully prepared.
+        """
+        self.jobs[input] = {"command":command, "jobDir":jobDir, "jobName":jobName}
+
+    def _getMaxJobs(self):
+        if self.getMaxJobs != None:
+            return self.getMaxJobs()
+        return self.maxJobs
+
+    def _getPending(self, rerun=None):
+        pending = []
+        for input in self.jobs:
+            record = self.manifest.get(input)
+            if record == None:
+                # A job file from a run without a manifest may already exist
+                job = self.jobs[input]
+                jobStatus = self.connection.getJobStatusByName(job["jobDir"], job["jobName"])
+                if jobStatus in ("FINISHED", "FAILED", "RUNNING") and (rerun == None or jobStatus not in rerun):
+                    print >> sys.stderr, "Recording existing job", job["jobName"], "with status", jobStatus
+                    record = self.manifest.update(input, state=jobStatus, attempts=1, size=getInputSize(input), jobDir=job["jobDir"], jobName=job["jobName"])
+                    if jobStatus == "RUNNING":
+                        self.running.add(input)
+                    continue
+                record = self.manifest.update(input, state="QUEUED", size=getInputSize(input), jobDir=job["jobDir"], jobName=job["jobName"])
+            elif rerun != None and record["state"] in rerun:
+                record = self.manifest.update(input, state="QUEUED", attempts=0)
+            if record["state"] == "QUEUED" or (record["state"] == "FAILED" and record["attempts"] <= self.retries):
+                pending.append(input)
+            elif record["state"] == "RUNNING": # left running by a previous scheduler
+                self.running.add(input)
+        # Largest inputs first, input name as a tie-breaker for a deterministic order
+        pending.sort(key=lambda x: (-self.manifest.get(x)["size"], x))
+        return pending
+
+    def _submit(self, input, dummy=False):
+        job = self.jobs[input]
+        record = self.manifest.get(input)
+        print >> sys.stderr, "Submitting job", job["jobName"], "for input", input, "(size " + str(record["size"]) + ", attempt " + str(record["attempts"] + 1) + ")"
+        if dummy:
+            print >> sys.stderr, "Dummy mode"
+            return
+        if self.connection.getJobStatusByName(job["jobDir"], job["jobName"]) in ("RUNNING", "QUEUED"):
+            # The previous scheduler stopped after submitting the job but before recording it
+            print >> sys.stderr, "Job", job["jobName"], "is already running"
+            self.manifest.update(input, state="RUNNING", attempts=record["attempts"] + 1)
+            self.running.add(input)
+            return
+        self.connection.submit(job["command"], job["jobDir"], job["jobName"])
+        self.manifest.update(input, state="RUNNING", attempts=record["attempts"] + 1, submitted=time.time(), runtime=None, retcode=None)
+        self.running.add(input)
+
+    def _poll(self, pending):
+        """
+        Update the manifest for jobs that have stopped. Failed jobs with retries
+        left are returned to the pending list.
+        """
+        for input in sorted(self.running):
+            job = self.jobs.get(input)
+            if job == None: # input no longer part of the batch
+                record = self.manifest.get(input)
+                job = {"jobDir":record["jobDir"], "jobName":record["jobName"]}
+            jobStatus = self.connection.getJobStatusByName(job["jobDir"], job["jobName"])
+            if jobStatus not in ("FINISHED", "FAILED"):
+                continue
+            self.running.remove(input)
+            record = self.manifest.get(input)
+            runtime = None
+            if record.get("submitted") != None:
+                runtime = time.time() - record["submitted"]
+            jobAttr = self.connection.getJobAttributes(self.connection.getJob(job["jobDir"], job["jobName"]))
+            retcode = None
+            if jobAttr != None and "retcode" in jobAttr:
+                retcode = int(jobAttr["retcode"])
+            record = self.manifest.update(input, state=jobStatus, runtime=runtime, retcode=retcode)
+            print >> sys.stderr, "Job", job["jobName"], jobStatus, "with return code", retcode
+            if jobStatus == "FAILED" and input in self.jobs:
+                if record["attempts"] <= self.retries:
+                    print >> sys.stderr, "Retrying job", job["jobName"], "(" + str(record["attempts"]) + "/" + str(self.retries) + " retries used)"
+                    pending.append(input)
+                    pending.sort(key=lambda x: (-self.manifest.get(x)["size"], x))
+                else:
+                    print >> sys.stderr, "Job", job["jobName"], "failed after", record["attempts"], "attempts"
+
+    def run(self, dummy=False, rerun=None):
+        """
+        Submit all pending jobs and wait until they have stopped.
+        """
+        pending = self._getPending(rerun)
+        print >> sys.stderr, "Scheduling", len(pending), "jobs,", len(self.running), "already running"
+        if dummy:
+            for input in pending:
+                self._submit(input, dummy=True)
+            return self.manifest.getStatistics()
+        while len(pending) > 0 or len(self.running) > 0:
+            self._poll(pending)
+            maxJobs = self._getMaxJobs()
+            while len(pending) > 0 and (maxJobs == None or len(self.running) < maxJobs):
+                self._submit(pending.pop(0))
+            if len(pending) > 0 or len(self.running) > 0:
+                time.sleep(self.sleepTime)
+        self.manifest.compact()
+        return self.manifest.printStatistics()
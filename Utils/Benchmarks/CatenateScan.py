@@ -0,0 +1,103 @@
+"""
+Byte-range scanning of interaction XML in Catenate.
+
+Catenate.CorpusScanner reads the input in blocks of Catenate.BLOCK_SIZE bytes
+and splits it into the header, the documents, the text between them and the
+trailer. The corpus is scanned with block sizes chosen so that document
+boundaries land exactly on block edges (and one byte before or after them).
+For each block size the parts are checked to reassemble into the input, the
+documents to be complete elements, and the renumbered catenation to be
+identical to the one made with the default block size. The default block
+size is also timed.
+"""
+import sys, os
+thisPath = os.path.dirname(os.path.abspath(__file__))
+rootPath = os.path.abspath(os.path.join(thisPath, "../.."))
+sys.path.append(rootPath)
+import time
+import shutil
+import tempfile
+import filecmp
+import json
+import StringIO
+from optparse import OptionParser
+import Utils.InteractionXML.Catenate as Catenate
+
+def getBlockSizes(data, maxDocuments=10):
+    """
+    Block sizes that end a block at, just before and just after the end of the
+    first documents of the file.
+    """
+    sizes = set()
+    index = 0
+    for i in range(maxDocuments):
+        index = data.find("</document>", index)
+        if index == -1:
+            break
+        end = index + len("</document>")
+        for size in (end - 1, end, end + 1):
+            if size > 0:
+                sizes.add(size)
+        index = end
+    return sorted(sizes)
+
+def checkScan(data):
+    """
+    Errors in the parts of the data scanned with the current block size.
+    """
+    errors = []
+    parts = list(Catenate.CorpusScanner(StringIO.StringIO(data), True).parts())
+    if "".join([x[1] for x in parts]) != data:
+        errors.append("parts do not reassemble the input")
+    documents = [x[1] for x in parts if x[0] == "document"]
+    if len(documents) != data.count("<document "):
+        errors.append("found " + str(len(documents)) + " documents instead of " + str(data.count("<document ")))
+    for document in documents:
+        if not document.startswith("<document") or not (document.endswith("</document>") or document.endswith("/>")):
+            errors.append("incomplete document " + repr(document[:40]) + "..." + repr(document[-20:]))
+            break
+    return errors
+
+def catenateRenumbered(inputs, output):
+    startTime = time.time()
+    Catenate.catenateFiles(inputs, output, renumber=True)
+    return time.time() - startTime
+
+def benchmark(input, repeats=3, output=None):
+    f = Catenate.openFile(input, "rb")
+    data = f.read()
+    f.close()
+    tempDir = tempfile.mkdtemp()
+    inputs = [input, input]
+    defaultBlockSize = Catenate.BLOCK_SIZE
+    reference = os.path.join(tempDir, "reference.xml")
+    times = [catenateRenumbered(inputs, reference) for i in range(repeats)]
+    results = []
+    for blockSize in getBlockSizes(data):
+        Catenate.BLOCK_SIZE = blockSize
+        errors = checkScan(data)
+        catenated = os.path.join(tempDir, "catenated-" + str(blockSize) + ".xml")
+        catenateRenumbered(inputs, catenated)
+        results.append({"block":blockSize, "errors":errors, "same":filecmp.cmp(reference, catenated, shallow=False)})
+    Catenate.BLOCK_SIZE = defaultBlockSize
+    shutil.rmtree(tempDir)
+    print >> sys.stderr, "Catenated with renumbering in %.3f s (min of %d)" % (min(times), repeats)
+    print >> sys.stderr, "%10s %8s %s" % ("block", "same", "errors")
+    for result in results:
+        print >> sys.stderr, "%10d %8s %s" % (result["block"], result["same"], "; ".join(result["errors"]))
+    if output != None:
+        f = open(output, "wt")
+        json.dump({"time":min(times), "blocks":results}, f, indent=2, sort_keys=True)
+        f.close()
+    return results
+
+if __name__=="__main__":
+    optparser = OptionParser(usage="%prog [options]\nCheck and time the byte-range corpus scanning of Catenate.")
+    optparser.add_option("-i", "--input", default=None, dest="input", help="Corpus file")
+    optparser.add_option("-r", "--repeats", default=3, type="int", dest="repeats", help="Number of timing repeats")
+    optparser.add_option("-o", "--output", default=None, dest="output", help="Save the results as JSON")
+    (options, args) = optparser.parse_args()
+    assert options.input != None
+    results = benchmark(options.input, options.repeats, options.output)
+    if any([len(x["errors"]) > 0 or not x["same"] for x in results]):
+        sys.exit(1)
@@ -0,0 +1,108 @@
+"""
+Entity example building with the legacy and the shared dependency chains.
+
+EntityExampleBuilder.buildChains caches the chain step features (the edge
+type and next token features) per sentence and the ids of the chain features
+per builder, so they are shared by all the candidate tokens whose chains pass
+through the same edges or have the same edge types. The examples of a corpus
+(e.g. the GE devel set) are built with the current builder and with a builder
+using the earlier buildChains, which copies the set of visited edges at each
+step and builds the chain strings and feature ids for every walk. The example
+files are checked to be identical.
+"""
+import sys, os
+thisPath = os.path.dirname(os.path.abspath(__file__))
+rootPath = os.path.abspath(os.path.join(thisPath, "../.."))
+sys.path.append(rootPath)
+import time
+import shutil
+import tempfile
+import filecmp
+import json
+from optparse import OptionParser
+from ExampleBuilders.EntityExampleBuilder import EntityExampleBuilder
+
+class LegacyChainBuilder(EntityExampleBuilder):
+    """
+    Builds the dependency chains as before the chain step caches.
+    """
+    def buildChains(self,token,sentenceGraph,features,depthLeft=3,chain="",visited=None):
+        if depthLeft == 0:
+            return
+        strDepthLeft = "dist_" + str(depthLeft)
+        
+        if visited == None:
+            visited = set()
+
+        inEdges = self.inEdgesByToken[token]
+        outEdges = self.outEdgesByToken[token]
+        edgeSet = visited.union(self.edgeSetByToken[token])
+        for edge in inEdges:
+            if not edge in visited:
+                edgeType = edge[2].get("type")
+                features[self.featureSet.getId("dep_"+strDepthLeft+edgeType)] = 1
+
+                nextToken = edge[0]
+                tokenFeatures, tokenWeights = self.getTokenFeatures(nextToken, sentenceGraph)
+                for tokenFeature in tokenFeatures:
+                    features[self.featureSet.getId(strDepthLeft + tokenFeature)] = tokenWeights[tokenFeature]
+                
+                if sentenceGraph.tokenIsName[nextToken] and not self.styles["names"]:
+                    features[self.featureSet.getId("name_chain_dist_"+strDepthLeft+chain+"-frw_"+edgeType)] = 1
+                features[self.featureSet.getId("chain_dist_"+strDepthLeft+chain+"-frw_"+edgeType)] = 1
+                self.buildChains(nextToken,sentenceGraph,features,depthLeft-1,chain+"-frw_"+edgeType,edgeSet)
+
+        for edge in outEdges:
+            if not edge in visited:
+                edgeType = edge[2].get("type")
+                features[self.featureSet.getId("dep_dist_"+strDepthLeft+edgeType)] = 1
+
+                nextToken = edge[1]
+                tokenFeatures, tokenWeights = self.getTokenFeatures(nextToken, sentenceGraph)
+                for tokenFeature in tokenFeatures:
+                    features[self.featureSet.getId(strDepthLeft + tokenFeature)] = tokenWeights[tokenFeature]
+                if sentenceGraph.tokenIsName[nextToken] and not self.styles["names"]:
+                    features[self.featureSet.getId("name_chain_dist_"+strDepthLeft+chain+"-rev_"+edgeType)] = 1
+                
+                features[self.featureSet.getId("chain_dist_"+strDepthLeft+chain+"-rev_"+edgeType)] = 1
+                self.buildChains(nextToken,sentenceGraph,features,depthLeft-1,chain+"-rev_"+edgeType,edgeSet)
+
+def build(builderClass, corpus, output, parse, style):
+    startTime = time.time()
+    builderClass.run(corpus, output, parse, None, style)
+    return time.time() - startTime
+
+def benchmark(corpus, parse="McCC", style="", repeats=3, output=None):
+    tempDir = tempfile.mkdtemp()
+    results = []
+    reference = None
+    for mode, builderClass in [("legacy", LegacyChainBuilder), ("shared", EntityExampleBuilder)]:
+        exampleFile = os.path.join(tempDir, mode + "-examples")
+        times = [build(builderClass, corpus, exampleFile, parse, style) for i in range(repeats)]
+        if reference == None:
+            reference = exampleFile
+        result = {"mode":mode, "min":min(times), "same":filecmp.cmp(reference, exampleFile, shallow=False)}
+        results.append(result)
+    # The builders print their progress, so the table is printed at the end
+    print >> sys.stderr, "%-10s %10s %8s" % ("mode", "min", "same")
+    for result in results:
+        print >> sys.stderr, "%-10s %10.3f %8s" % (result["mode"], result["min"], result["same"])
+    shutil.rmtree(tempDir)
+    if output != None:
+        f = open(output, "wt")
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.close()
+    return results
+
+if __name__=="__main__":
+    optparser = OptionParser(usage="%prog [options]\nCompare entity example building with the legacy and the shared dependency chains.")
+    optparser.add_option("-i", "--input", default=None, dest="input", help="Corpus file")
+    optparser.add_option("-p", "--parse", default="McCC", dest="parse", help="Parse name")
+    optparser.add_option("-s", "--style", default="", dest="style", help="Example style")
+    optparser.add_option("-r", "--repeats", default=3, type="int", dest="repeats", help="Number of repeats per builder")
+    optparser.add_option("-o", "--output", default=None, dest="output", help="Save the results as JSON")
+    (options, args) = optparser.parse_args()
+    assert options.input != None
+    results = benchmark(options.input, options.parse, options.style, options.repeats, options.output)
+    if not all([x["same"] for x in results]):
+        sys.exit(1)
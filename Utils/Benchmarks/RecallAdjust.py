@@ -0,0 +1,89 @@
+"""
+Recall adjustment of trigger classifications over the booster values of the parameter grid.
+
+The classifications can be a file written by a classifier (e.g. the
+grid-trigger-classifications of a GE09 or GE11 EventDetector training run)
+or are generated with the size and class distribution of the GE development
+set triggers. For each booster value the predictions are produced both with
+ExampleUtils.loadPredictions (re-reading the file, as done before for every
+grid point) and with a RecallAdjustEngine loaded once, and the results are
+checked to be identical.
+"""
+import sys, os
+thisPath = os.path.dirname(os.path.abspath(__file__))
+rootPath = os.path.abspath(os.path.join(thisPath, "../.."))
+sys.path.append(rootPath)
+import time
+import random
+import json
+from optparse import OptionParser
+import Core.ExampleUtils as ExampleUtils
+from Core.RecallAdjust import RecallAdjustEngine
+
+DEFAULT_BOOSTERS = "0.5,0.6,0.65,0.7,0.85,1.0,1.1,1.2"
+
+def generateClassifications(filename, numExamples=60000, numClasses=10, positiveRate=0.08, seed=1):
+    """
+    Write SVM multiclass style classifications: the predicted class followed by the
+    confidence of each class, the negative class first. By default roughly the number
+    of trigger examples and classes of the GE development set.
+    """
+    rand = random.Random(seed)
+    f = open(filename, "wt")
+    for i in range(numExamples):
+        confidences = [rand.gauss(-1.0, 0.5) for j in range(numClasses)]
+        if rand.random() < positiveRate:
+            confidences[rand.randint(1, numClasses - 1)] += rand.uniform(0.5, 2.0)
+        else:
+            confidences[0] += rand.uniform(0.5, 2.0)
+        label = confidences.index(max(confidences)) + 1
+        f.write(" ".join([str(label)] + ["%.6f" % x for x in confidences]) + "\n")
+    f.close()
+
+def timed(func, *args):
+    startTime = time.time()
+    result = func(*args)
+    return result, time.time() - startTime
+
+def benchmark(classifications, boosters, threshold=None, output=None):
+    results = {"classifications":classifications, "threshold":threshold, "boosters":[]}
+    engine, results["engineLoad"] = timed(RecallAdjustEngine.fromFile, classifications, threshold)
+    results["vectorized"] = engine.confidences is not None
+    print >> sys.stderr, "Loaded", len(engine.predictions), "classifications in %.3f s" % results["engineLoad"], "(vectorized)" if results["vectorized"] else "(numpy not available)"
+    print >> sys.stderr, "%8s %10s %10s %10s %10s %8s" % ("booster", "positives", "reload", "labels", "predictions", "same")
+    for booster in boosters:
+        reloaded, reloadTime = timed(lambda: list(ExampleUtils.loadPredictions(classifications, booster, threshold=threshold)))
+        labels, labelTime = timed(engine.getLabels, booster)
+        predictions, predictionTime = timed(engine.getPredictions, booster)
+        same = (predictions == reloaded) and (labels == [x[0] for x in reloaded])
+        positives = len([x for x in labels if x != 1])
+        results["boosters"].append({"booster":booster, "positives":positives, "reload":reloadTime, "labels":labelTime,
+                                    "predictions":predictionTime, "same":same})
+        print >> sys.stderr, "%8.3f %10d %10.4f %10.4f %10.4f %8s" % (booster, positives, reloadTime, labelTime, predictionTime, same)
+    reloadTotal = sum([x["reload"] for x in results["boosters"]])
+    engineTotal = results["engineLoad"] + sum([x["predictions"] for x in results["boosters"]])
+    print >> sys.stderr, "Total: reload %.3f s, engine %.3f s" % (reloadTotal, engineTotal)
+    if output != None:
+        f = open(output, "wt")
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.close()
+    return results
+
+if __name__=="__main__":
+    optparser = OptionParser(usage="%prog [options]\nCompare recall adjustment by reloading the classifications with the RecallAdjustEngine.")
+    optparser.add_option("-i", "--input", default=None, dest="input", help="Classifications file (default: generate GE-sized classifications)")
+    optparser.add_option("-w", "--workfile", default="recall-adjust-benchmark-classifications", dest="workfile", help="Where to write the generated classifications")
+    optparser.add_option("-n", "--examples", default=60000, type="int", dest="examples", help="Number of generated examples")
+    optparser.add_option("-c", "--classes", default=10, type="int", dest="classes", help="Number of generated classes, including the negative one")
+    optparser.add_option("-b", "--boosters", default=DEFAULT_BOOSTERS, dest="boosters", help="Comma-separated booster values")
+    optparser.add_option("-t", "--threshold", default=None, type="float", dest="threshold", help="Negative class threshold")
+    optparser.add_option("-o", "--output", default=None, dest="output", help="Save the results as JSON")
+    (options, args) = optparser.parse_args()
+
+    classifications = options.input
+    if classifications == None:
+        classifications = options.workfile
+        generateClassifications(classifications, options.examples, options.classes)
+    benchmark(classifications, [float(x) for x in options.boosters.split(",")], options.threshold, options.output)
+    if options.input == None:
+        os.remove(classifications)
@@ -0,0 +1,70 @@
+"""
+Loading a corpus with and without the SentenceGraphCache.
+
+The corpus is read with SentenceGraph.getCorpusIterator (as done by the
+ExampleBuilders) without a cache, while building the cache, and with the
+cache. The entity head tokens and token head scores of the rehydrated graphs
+are checked to be identical to the uncached ones.
+"""
+import sys, os
+thisPath = os.path.dirname(os.path.abspath(__file__))
+rootPath = os.path.abspath(os.path.join(thisPath, "../.."))
+sys.path.append(rootPath)
+import time
+import shutil
+import tempfile
+import json
+from optparse import OptionParser
+from Core.SentenceGraph import getCorpusIterator
+
+def load(corpus, parse, cacheDir):
+    """
+    Iterate over the corpus and collect the head token ids and head scores of each sentence.
+    """
+    heads = []
+    startTime = time.time()
+    for sentences in getCorpusIterator(corpus, None, parse, cacheDir=cacheDir):
+        for sentence in sentences:
+            graph = sentence.sentenceGraph
+            if graph == None:
+                continue
+            heads.append([(x.get("id"), graph.entityHeadTokenByEntity[x].get("id")) for x in graph.entities] +
+                         [x.get("headScore") for x in graph.tokens])
+    return time.time() - startTime, heads
+
+def benchmark(corpus, parse="McCC", repeats=3, output=None):
+    cacheDir = tempfile.mkdtemp()
+    results = []
+    reference = None
+    print >> sys.stderr, "%-10s %10s %8s" % ("mode", "min", "same")
+    for mode in ["uncached", "build", "cached"]:
+        if mode == "build":
+            times = []
+            for i in range(repeats):
+                shutil.rmtree(cacheDir)
+                elapsed, heads = load(corpus, parse, cacheDir)
+                times.append(elapsed)
+        else:
+            runs = [load(corpus, parse, cacheDir if mode == "cached" else False) for i in range(repeats)]
+            times, heads = [x[0] for x in runs], runs[-1][1]
+        if reference == None:
+            reference = heads
+        result = {"mode":mode, "min":min(times), "same":heads == reference}
+        print >> sys.stderr, "%-10s %10.3f %8s" % (mode, result["min"], result["same"])
+        results.append(result)
+    shutil.rmtree(cacheDir)
+    if output != None:
+        f = open(output, "wt")
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.close()
+    return results
+
+if __name__=="__main__":
+    optparser = OptionParser(usage="%prog [options]\nMeasure corpus loading with the SentenceGraphCache.")
+    optparser.add_option("-i", "--input", default=None, dest="input", help="Corpus file")
+    optparser.add_option("-p", "--parse", default="McCC", dest="parse", help="Parse name")
+    optparser.add_option("-r", "--repeats", default=3, type="int", dest="repeats", help="Number of repeats per mode")
+    optparser.add_option("-o", "--output", default=None, dest="output", help="Save the results as JSON")
+    (options, args) = optparser.parse_args()
+    assert options.input != None
+    benchmark(options.input, options.parse, options.repeats, options.output)
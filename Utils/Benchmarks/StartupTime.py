@@ -0,0 +1,96 @@
+"""
+Startup time of classify.py for different model types.
+
+Each measurement runs in a fresh Python process, which imports classify.py,
+resolves the detector class the same way classify.py does and initializes
+it. The import time, the number of loaded modules and the optional heavy
+dependencies (numpy, keras etc.) pulled in are reported for each model type.
+"""
+import sys, os
+thisPath = os.path.dirname(os.path.abspath(__file__))
+rootPath = os.path.abspath(os.path.join(thisPath, "../.."))
+sys.path.append(rootPath)
+import subprocess
+import json
+from optparse import OptionParser
+
+DEFAULT_DETECTORS = ["Detectors.EntityDetector", "Detectors.EdgeDetector", "Detectors.EventDetector",
+                     "Detectors.KerasEntityDetector", "Detectors.KerasEdgeDetector"]
+HEAVY_MODULES = ["numpy", "scipy", "sklearn", "keras", "tensorflow", "theano", "nltk", "networkx"]
+
+# Run in the child process. The detector is given either as a class name or as a model path.
+CHILD_SCRIPT = """
+import sys, os, time, json
+startTime = time.time()
+sys.path.insert(0, %(rootPath)r)
+result = {}
+try:
+    import classify
+    result["import"] = time.time() - startTime
+    from train import getDetector
+    if %(isModel)r:
+        detector = getDetector(None, %(target)r)[0]
+    else:
+        detector = getDetector(%(target)r)[0]
+    detector()
+except Exception, e:
+    result["error"] = e.__class__.__name__ + ": " + str(e)
+import Utils.ClassRegistry as ClassRegistry
+result["total"] = time.time() - startTime
+result["modules"] = len(ClassRegistry.getLoadedModules())
+result["heavy"] = sorted(set([x.split(".")[0] for x in ClassRegistry.getLoadedModules(%(heavy)r)]))
+print json.dumps(result)
+"""
+
+def measure(target, isModel=False, python=None):
+    if python == None:
+        python = sys.executable
+    script = CHILD_SCRIPT % {"rootPath":rootPath, "isModel":isModel, "target":target, "heavy":HEAVY_MODULES}
+    devnull = open(os.devnull, "w")
+    p = subprocess.Popen([python, "-c", script], stdout=subprocess.PIPE, stderr=devnull)
+    stdout = p.communicate()[0]
+    devnull.close()
+    lines = [x for x in stdout.strip().split("\n") if x.startswith("{")]
+    if p.returncode != 0 or len(lines) == 0:
+        return {"error":"process exited with code " + str(p.returncode)}
+    return json.loads(lines[-1])
+
+def benchmark(detectors=None, models=None, repeats=5, python=None, output=None):
+    if detectors == None and models == None:
+        detectors = DEFAULT_DETECTORS
+    targets = [(x, False) for x in (detectors if detectors != None else [])]
+    targets += [(x, True) for x in (models if models != None else [])]
+    results = []
+    print >> sys.stderr, "%-40s %8s %8s %8s %8s  %s" % ("model type", "import", "min", "median", "modules", "heavy dependencies")
+    for target, isModel in targets:
+        runs = [measure(target, isModel, python) for i in range(repeats)]
+        errors = [x["error"] for x in runs if "error" in x]
+        totals = sorted([x["total"] for x in runs if "total" in x])
+        imports = sorted([x["import"] for x in runs if "import" in x])
+        result = {"target":target, "model":isModel, "runs":runs}
+        if len(errors) > 0:
+            result["error"] = errors[0]
+            print >> sys.stderr, "%-40s failed: %s" % (target, errors[0])
+        else:
+            result.update({"import":imports[len(imports) / 2], "min":totals[0], "median":totals[len(totals) / 2],
+                           "modules":runs[0]["modules"], "heavy":runs[0]["heavy"]})
+            print >> sys.stderr, "%-40s %8.3f %8.3f %8.3f %8d  %s" % (target, result["import"], result["min"], result["median"], result["modules"], ",".join(result["heavy"]))
+        results.append(result)
+    if output != None:
+        f = open(output, "wt")
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.close()
+    return results
+
+if __name__=="__main__":
+    optparser = OptionParser(usage="%prog [options]\nMeasure the startup time of classify.py for different model types.")
+    optparser.add_option("-d", "--detectors", default=None, dest="detectors", help="Comma-separated detector classes (default: the common detector types)")
+    optparser.add_option("-m", "--models", default=None, dest="models", help="Comma-separated model paths, the detector is read from the model")
+    optparser.add_option("-r", "--repeats", default=5, type="int", dest="repeats", help="Number of fresh processes per model type")
+    optparser.add_option("-p", "--python", default=None, dest="python", help="Python interpreter (default: the current one)")
+    optparser.add_option("-o", "--output", default=None, dest="output", help="Save the results as JSON")
+    (options, args) = optparser.parse_args()
+
+    benchmark(options.detectors.split(",") if options.detectors != None else None,
+              options.models.split(",") if options.models != None else None,
+              options.repeats, options.python, options.output)
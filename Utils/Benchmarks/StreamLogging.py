@@ -0,0 +1,113 @@
+"""
+Logging overhead of the Utils/Stream.py StreamModifier.
+
+Writes a mix of ProgressCounter style carriage return updates and verbose
+output lines through a StreamModifier attached to a log file, using the
+previous character-by-character implementation and the line-buffered one
+(with and without the background writer thread). The screen stream is
+os.devnull, so only the cost of the wrapper and the logging is measured.
+The resulting logs are checked to be identical apart from the time stamps.
+"""
+import sys, os
+thisPath = os.path.dirname(os.path.abspath(__file__))
+rootPath = os.path.abspath(os.path.join(thisPath, "../.."))
+sys.path.append(rootPath)
+import time
+import codecs
+import tempfile
+import json
+from optparse import OptionParser
+import Utils.Stream as Stream
+
+class LegacyStreamModifier(Stream.StreamModifier):
+    """
+    The previous StreamModifier.write, which processes the logged text one
+    character at a time and flushes the log files on every write.
+    """
+    def write(self, text):
+        if text == None or text == "":
+            return
+        self.stream.write(text)
+        self.stream.flush()
+        if len(self.logfiles) > 0:
+            for char in text:
+                if char == "\r":
+                    self.buffer = ""
+                elif char == "\n":
+                    timeString = time.strftime(self.timeStamp)
+                    if timeString == self.prevTime and not self.timeStampDuplicates:
+                        timeString = len(timeString) * " "
+                    else:
+                        self.prevTime = timeString
+                    if self.timeStamp != None:
+                        self.buffer = timeString + "\t" + self.buffer
+                    for logfile in self.logfiles:
+                        logfile.write(self.buffer + "\n")
+                    self.buffer = ""
+                else:
+                    self.buffer += char
+            for logfile in self.logfiles:
+                logfile.flush()
+
+def workload(stream, numUpdates, linesPerUpdate):
+    for i in range(numUpdates):
+        # As in ProgressCounter.update
+        print >> stream, "\rProcessing document " + str(i) + "/" + str(numUpdates) + " (" + str(100.0 * i / numUpdates)[:5] + "%)",
+        for j in range(linesPerUpdate):
+            print >> stream, "Example", i, j, "features:", 50 + j, "class: neg"
+        if i % 1000 == 999:
+            print >> stream
+
+def run(mode, numUpdates, linesPerUpdate, logPath):
+    devnull = open(os.devnull, "wt")
+    logfile = codecs.open(logPath, "wt", "utf-8")
+    if mode == "legacy":
+        stream = LegacyStreamModifier(devnull)
+    else:
+        stream = Stream.StreamModifier(devnull, Stream.LogWriter(threaded=(mode == "threaded")))
+    stream.setTimeStamp("[%H:%M:%S %d/%m]", True)
+    stream.addLog(logfile)
+    startTime = time.time()
+    workload(stream, numUpdates, linesPerUpdate)
+    stream.logWriter.close()
+    elapsed = time.time() - startTime
+    logfile.close()
+    devnull.close()
+    return elapsed
+
+def readLog(logPath):
+    f = codecs.open(logPath, "rt", "utf-8")
+    lines = [x.split("\t", 1)[-1] for x in f]
+    f.close()
+    return lines
+
+def benchmark(numUpdates=20000, linesPerUpdate=2, repeats=3, output=None):
+    tempDir = tempfile.mkdtemp()
+    results = []
+    referenceLog = None
+    print >> sys.stderr, "%-10s %10s %10s %8s" % ("mode", "min", "median", "same log")
+    for mode in ["legacy", "buffered", "threaded"]:
+        logPath = os.path.join(tempDir, mode + "-log.txt")
+        times = sorted([run(mode, numUpdates, linesPerUpdate, logPath) for i in range(repeats)])
+        log = readLog(logPath)
+        if referenceLog == None:
+            referenceLog = log
+        result = {"mode":mode, "min":times[0], "median":times[len(times) / 2], "lines":len(log), "same":log == referenceLog}
+        print >> sys.stderr, "%-10s %10.3f %10.3f %8s" % (mode, result["min"], result["median"], result["same"])
+        results.append(result)
+        os.remove(logPath)
+    os.rmdir(tempDir)
+    if output != None:
+        f = open(output, "wt")
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.close()
+    return results
+
+if __name__=="__main__":
+    optparser = OptionParser(usage="%prog [options]\nMeasure the overhead of logging stream output with StreamModifier.")
+    optparser.add_option("-n", "--updates", default=20000, type="int", dest="updates", help="Number of progress updates")
+    optparser.add_option("-l", "--lines", default=2, type="int", dest="lines", help="Output lines per progress update")
+    optparser.add_option("-r", "--repeats", default=3, type="int", dest="repeats", help="Number of repeats per mode")
+    optparser.add_option("-o", "--output", default=None, dest="output", help="Save the results as JSON")
+    (options, args) = optparser.parse_args()
+    benchmark(options.updates, options.lines, options.repeats, options.output)
@@ -0,0 +1,80 @@
+"""
+Streaming and in-memory document transforms of interaction XML.
+
+The tools ported to Utils/InteractionXML/StreamTransform.py are run on a
+corpus file streamed (input and output given as file names), streamed in
+place (the output is the input file) and in memory (the input given as a
+parsed tree), and the output files are checked to be identical. The outputs are written as bare file names into a temporary
+working directory, so writing to the current directory is covered as well.
+The streamed runs are also timed.
+"""
+import sys, os
+thisPath = os.path.dirname(os.path.abspath(__file__))
+rootPath = os.path.abspath(os.path.join(thisPath, "../.."))
+sys.path.append(rootPath)
+import time
+import shutil
+import tempfile
+import filecmp
+import json
+from optparse import OptionParser
+import Utils.ElementTreeUtils as ETUtils
+import Utils.InteractionXML.DeleteElements as DeleteElements
+import Utils.InteractionXML.DeleteAttributes as DeleteAttributes
+import Utils.InteractionXML.RemoveUnconnectedEntities as RemoveUnconnectedEntities
+import Utils.InteractionXML.RecalculateIds as RecalculateIds
+
+def getTools():
+    """
+    The checked tools as (name, function) pairs, where function(input, output) runs the tool.
+    """
+    return [("DeleteElements", lambda input, output: DeleteElements.processCorpus(input, output, {"interaction":{"type":["Theme"]}})),
+            ("DeleteAttributes", lambda input, output: DeleteAttributes.processCorpus(input, output, {"entity":["headOffset"]})),
+            ("RemoveUnconnectedEntities", lambda input, output: RemoveUnconnectedEntities.removeUnconnectedEntities(input, output)),
+            ("RecalculateIds", lambda input, output: RecalculateIds.recalculateIds(input, output))]
+
+def checkTool(function, input):
+    """
+    Run the tool streamed, streamed in place and in memory in the current directory. Returns
+    the time of the streamed run and whether the outputs are identical.
+    """
+    startTime = time.time()
+    function(input, "streamed.xml")
+    streamTime = time.time() - startTime
+    shutil.copy2(input, "inplace.xml")
+    function("inplace.xml", "inplace.xml")
+    function(ETUtils.ETFromObj(input), "tree.xml")
+    return streamTime, filecmp.cmp("streamed.xml", "tree.xml", shallow=False) and filecmp.cmp("inplace.xml", "tree.xml", shallow=False)
+
+def benchmark(input, output=None):
+    input = os.path.abspath(input)
+    tempDir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    results = []
+    try:
+        os.chdir(tempDir)
+        for name, function in getTools():
+            streamTime, same = checkTool(function, input)
+            results.append({"tool":name, "time":streamTime, "same":same})
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(tempDir)
+    # The tools print their progress, so the table is printed at the end
+    print >> sys.stderr, "%-26s %10s %8s" % ("tool", "time", "same")
+    for result in results:
+        print >> sys.stderr, "%-26s %10.3f %8s" % (result["tool"], result["time"], result["same"])
+    if output != None:
+        f = open(output, "wt")
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.close()
+    return results
+
+if __name__=="__main__":
+    optparser = OptionParser(usage="%prog [options]\nCompare the streamed and in-memory document transforms.")
+    optparser.add_option("-i", "--input", default=None, dest="input", help="Corpus file")
+    optparser.add_option("-o", "--output", default=None, dest="output", help="Save the results as JSON")
+    (options, args) = optparser.parse_args()
+    assert options.input != None
+    results = benchmark(options.input, options.output)
+    if not all([x["same"] for x in results]):
+        sys.exit(1)
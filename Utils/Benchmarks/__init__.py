@@ -0,0 +1,3 @@
+"""
+Benchmarks for measuring the performance of TEES components.
+"""
@@ -0,0 +1,116 @@
+"""
+Lazy lookup of TEES component classes.
+
+Models store the components they use as class names (e.g. "detector" in
+TEES_MODEL_VALUES.tsv). This registry maps such names to their modules by
+listing the package directories, and imports a module only when one of its
+classes is actually requested. This way a process such as classify.py only
+imports the detector, classifier and feature builders the model needs, and
+not optional dependencies such as numpy or keras used by other components.
+"""
+import sys, os
+import types
+thisPath = os.path.dirname(os.path.abspath(__file__))
+rootPath = os.path.abspath(os.path.join(thisPath, ".."))
+
+# Component categories and the packages where their modules are located
+PACKAGES = {"detector":"Detectors",
+            "classifier":"Classifiers",
+            "exampleBuilder":"ExampleBuilders",
+            "featureBuilder":"ExampleBuilders.FeatureBuilders",
+            "evaluator":"Evaluators"}
+
+_moduleNames = {}
+_classes = {}
+
+def getModuleNames(category):
+    """
+    The names of the modules of a category, listed from the package directory
+    without importing any of them.
+    """
+    if category not in _moduleNames:
+        package = PACKAGES[category]
+        packageDir = os.path.join(rootPath, *package.split("."))
+        names = set()
+        for filename in os.listdir(packageDir):
+            name, ext = os.path.splitext(filename)
+            if ext in (".py", ".pyc") and name != "__init__":
+                names.add(name)
+        _moduleNames[category] = sorted(names)
+    return _moduleNames[category]
+
+def resolve(name, category=None):
+    """
+    Get the module and class names for a component name. The name can be an import
+    statement ("from Detectors.EventDetector import EventDetector"), a module path
+    where the class has the same name as the module ("Detectors.EventDetector") or,
+    if the category is defined, just the class name ("EventDetector").
+    """
+    name = name.strip()
+    if name.startswith("from "):
+        parts = name.split()
+        assert len(parts) == 4 and parts[2] == "import", name
+        return parts[1], parts[3]
+    elif "." in name:
+        return name, name.split(".")[-1]
+    elif category != None:
+        if name not in getModuleNames(category):
+            raise Exception("Unknown " + category + " '" + name + "', known ones are " + ", ".join(getModuleNames(category)))
+        return PACKAGES[category] + "." + name, name
+    else:
+        raise Exception("Cannot resolve the module for '" + name + "' without a category")
+
+def importModule(moduleName):
+    __import__(moduleName)
+    return sys.modules[moduleName]
+
+def getClass(name, category=None):
+    """
+    Import a component class by name. Classes are cached, so repeated requests
+    cost only a dictionary lookup. If name is not a string, it is returned as is.
+    """
+    if type(name) not in types.StringTypes:
+        return name
+    key = (name, category)
+    if key not in _classes:
+        moduleName, className = resolve(name, category)
+        module = importModule(moduleName)
+        if not hasattr(module, className):
+            raise Exception("Module " + moduleName + " has no class " + className)
+        _classes[key] = getattr(module, className)
+    return _classes[key]
+
+class LazyModule:
+    """
+    A module placeholder that imports the actual module the first time
+    one of its attributes is accessed.
+    """
+    def __init__(self, moduleName):
+        self.__dict__["_moduleName"] = moduleName
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        if self._module == None:
+            self.__dict__["_module"] = importModule(self._moduleName)
+        return self._module
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._load(), name, value)
+
+def lazyModule(moduleName):
+    if moduleName in sys.modules:
+        return sys.modules[moduleName]
+    return LazyModule(moduleName)
+
+def getLoadedModules(prefixes=None):
+    """
+    The names of the imported modules, optionally limited to those starting with
+    one of the prefixes. Used for checking which dependencies have been loaded.
+    """
+    names = [x for x in sys.modules.keys() if sys.modules[x] != None]
+    if prefixes != None:
+        names = [x for x in names if any([x == p or x.startswith(p + ".") for p in prefixes])]
+    return sorted(names)
@@ -6,6 +6,7 @@ import shutil
 sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/..")
 from Detectors.Preprocessor import Preprocessor
 import Utils.ElementTreeUtils as ETUtils
+import Core.Predictions as Predictions
 import Utils.Stream as Stream
 from Evaluators.ChemProtEvaluator import ChemProtEvaluator
 import Evaluators.EvaluateInteractionXML as EvaluateIXML
@@ -16,11 +17,8 @@ from Utils.ProgressCounter import ProgressCounter
 
 def getConfScores(interaction):
     intType = interaction.get("type")
-    conf = interaction.get("conf")
     confScores = {}
-    for commaSplit in conf.split(","):
-        cls, confidence = commaSplit.rsplit(":", 1)
-        confidence = float(confidence)
+    for cls, confidence in Predictions.getPredictions(interaction, "conf"):
         if "---" not in cls:
             assert cls not in confScores
             confScores[cls] = confidence
@@ -461,6 +461,12 @@ class UnixConnection:
                 break
         return jobStatus
     
+    def getJobAttributes(self, job):
+        """
+        Return the key-value pairs of a job status file, or None if the job does not exist.
+        """
+        return self._readJobFile(job)
+    
     def getJobStatusByName(self, jobDir, jobName):
         return self.getJobStatus(self._getJobPath(jobDir, jobName))
     
@@ -50,6 +50,11 @@ URL["STANFORD_PARSER"] = "http://nlp.stanford.edu/software/stanford-parser-2012-
 RUBY_PATH = "ruby" # for GENIA Sentence Splitter
 JAVA = "java" # for programs using java
 
+# Caches ######################################################################
+
+# Directory for the cached head token mappings of corpus files (see Core/SentenceGraphCache.py). Disabled if None.
+SENTENCE_GRAPH_CACHE_DIR = None
+
 # Corpora #####################################################################
 
 # Preconverted
@@ -18,6 +18,11 @@ except ImportError:
     import xml.etree.cElementTree as ElementTree
 
 from gzip import GzipFile
+try:
+    import Utils.Instrumentation as Instrumentation
+except ImportError: # imported from a script in Utils, before the TEES root is in the path
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")))
+    import Utils.Instrumentation as Instrumentation
 
 def removeAll(element):
     for child in list(element):
@@ -139,7 +144,7 @@ def escapeText(text):
 class ETWriter():
     def __init__(self, out):
         if isinstance(out,str):
-            if not os.path.exists(os.path.dirname(out)):
+            if os.path.dirname(out) != "" and not os.path.exists(os.path.dirname(out)):
                 os.makedirs(os.path.dirname(out))
             if out.endswith(".gz"):
                 self.out = GzipFile(out,"wt") #codecs.getwriter("utf-8")(GzipFile(out,"wt"))
@@ -230,6 +235,7 @@ def ETIteratorFromObj(obj, events=None, parser=None):
         for rv in ElementTree.iterparse(obj, events):
             yield rv
 
+@Instrumentation.instrument("ETUtils.write")
 def write(rootElement, filename):
     if isinstance(rootElement,ElementTree.ElementTree):
         rootElement = rootElement.getroot()
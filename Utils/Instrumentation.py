@@ -0,0 +1,164 @@
+"""
+Per-step resource instrumentation
+
+Records the wall time, CPU time and peak memory use of the processing steps
+of a TEES run, together with item counts (documents, sentences, examples),
+and writes them to a JSON report. Steps can be nested, in which case the
+resources of a step include those of its substeps. Instrumentation is
+disabled by default, and the module-level functions do nothing until
+enable has been called.
+"""
+import sys, os
+import time
+import json
+import atexit
+import resource
+
+_report = None
+
+class StepRecord:
+    def __init__(self, name, parent=None):
+        self.name = name
+        self.parent = parent
+        self.path = name if parent == None else parent.path + "/" + name
+        self.counts = {}
+        self.startTime = time.time()
+        self.startTimes = os.times()
+        self.wall = None
+        self.cpu = None
+        self.childCpu = None
+        self.maxrss = None
+        self.childMaxrss = None
+        self.profiler = None
+        self.profileFile = None
+
+    def stop(self):
+        endTimes = os.times()
+        self.wall = time.time() - self.startTime
+        self.cpu = (endTimes[0] + endTimes[1]) - (self.startTimes[0] + self.startTimes[1])
+        self.childCpu = (endTimes[2] + endTimes[3]) - (self.startTimes[2] + self.startTimes[3])
+        # Peak resident set size in kilobytes (on Linux) for the process and its waited-for children
+        self.maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        self.childMaxrss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+
+    def toDict(self):
+        d = {"name":self.name, "path":self.path, "start":self.startTime, "wall":self.wall, "cpu":self.cpu,
+             "childCpu":self.childCpu, "maxrss":self.maxrss, "childMaxrss":self.childMaxrss, "counts":self.counts}
+        if self.profileFile != None:
+            d["profile"] = self.profileFile
+        return d
+
+class Report:
+    """
+    A stack of open steps and a list of the finished ones.
+    """
+    def __init__(self, output, profile=False):
+        self.output = output
+        self.profile = profile
+        self.stack = []
+        self.steps = []
+        self.startTime = time.time()
+
+    def begin(self, name):
+        parent = self.stack[-1] if len(self.stack) > 0 else None
+        record = StepRecord(name, parent)
+        # Only one profiler can be active, so only the outermost steps are profiled
+        if self.profile and parent == None:
+            import cProfile
+            record.profiler = cProfile.Profile()
+            record.profiler.enable()
+        self.stack.append(record)
+        return record
+
+    def end(self, name=None):
+        """
+        End the named step, and any unfinished substeps it still contains. If no
+        name is given, the innermost step is ended.
+        """
+        if name != None and name not in [x.name for x in self.stack]:
+            return None
+        while len(self.stack) > 0:
+            record = self.stack.pop()
+            record.stop()
+            if record.profiler != None:
+                record.profiler.disable()
+                record.profileFile = os.path.splitext(self.output)[0] + "-" + str(len(self.steps)) + "-" + record.name.replace("/", "_").replace(":", "_") + ".prof"
+                record.profiler.dump_stats(record.profileFile)
+                record.profiler = None
+            self.steps.append(record)
+            if name == None or record.name == name:
+                return record
+        return None
+
+    def count(self, key, value=1):
+        if len(self.stack) > 0:
+            counts = self.stack[-1].counts
+            counts[key] = counts.get(key, 0) + value
+
+    def save(self):
+        while len(self.stack) > 0:
+            self.end()
+        report = {"start":self.startTime, "wall":time.time() - self.startTime, "command":" ".join(sys.argv),
+                  "steps":[x.toDict() for x in sorted(self.steps, key=lambda x: x.startTime)]}
+        if os.path.dirname(self.output) != "" and not os.path.exists(os.path.dirname(self.output)):
+            os.makedirs(os.path.dirname(self.output))
+        f = open(self.output, "wt")
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.close()
+        print >> sys.stderr, "Instrumentation report saved to", self.output
+
+def enable(output, profile=False):
+    """
+    Start recording steps. The report is written to output when the program exits. If
+    profile is True, the outermost steps are also profiled with cProfile, and the profiles
+    are saved next to the report.
+    """
+    global _report
+    if _report != None:
+        return _report
+    _report = Report(os.path.abspath(output), profile)
+    atexit.register(save)
+    print >> sys.stderr, "Instrumentation enabled, report at", _report.output
+    return _report
+
+def isEnabled():
+    return _report != None
+
+def save():
+    global _report
+    if _report != None:
+        _report.save()
+        _report = None
+
+def begin(name):
+    if _report != None:
+        _report.begin(name)
+
+def end(name=None):
+    if _report != None:
+        _report.end(name)
+
+def count(key, value=1):
+    """
+    Add to an item count of the innermost running step.
+    """
+    if _report != None:
+        _report.count(key, value)
+
+def instrument(name):
+    """
+    A decorator that records each call of a function as a step.
+    """
+    def decorator(func):
+        def wrapper(*args, **kwargs):
+            if _report == None:
+                return func(*args, **kwargs)
+            _report.begin(name)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _report.end(name)
+        wrapper.__name__ = func.__name__
+        wrapper.__doc__ = func.__doc__
+        return wrapper
+    return decorator
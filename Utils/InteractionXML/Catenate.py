@@ -2,6 +2,8 @@ import sys, os
 thisPath = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(os.path.abspath(os.path.join(thisPath,"../..")))
 import gzip, codecs
+import re, zlib, struct
+import multiprocessing
 try:
     import xml.etree.cElementTree as ET
 except ImportError:
@@ -10,46 +12,218 @@ import Utils.ElementTreeUtils as ETUtils
 import RecalculateIds
 import DeleteElements
 
-def catenate(inputs, output, fast):
-    if not os.path.exists(os.path.dirname(output)):
+BLOCK_SIZE = 1 << 20 # bytes read at a time from the input files
+MEMBER_SIZE = 4 << 20 # uncompressed bytes per independently compressed gzip member
+ID_PATTERN = re.compile(r'\sid="([^"]*)"')
+SOURCE_PATTERN = re.compile(r'\ssource="([^"]*)"')
+
+def catenate(inputs, output, fast, renumber=False, prefixes=None, source=None, parallel=1):
+    if os.path.dirname(output) != "" and not os.path.exists(os.path.dirname(output)):
         os.makedirs(os.path.dirname(output))
     if fast:
-        catenateFiles(inputs, output)
+        catenateFiles(inputs, output, renumber, prefixes, source, parallel)
     else:
         catenateElements(inputs, output)
     return output
+
+class CorpusScanner:
+    """
+    Splits an interaction XML file into byte ranges without parsing it. The parts are
+    the header (up to and including the corpus start tag), the text between documents,
+    the documents (if splitDocuments is True, otherwise the corpus content is returned
+    as text) and the trailer (from the corpus end tag to the end of the file).
+    """
+    def __init__(self, f, splitDocuments=False):
+        self.f = f
+        self.splitDocuments = splitDocuments
+        self.buffer = ""
+        self.pos = 0
     
-def catenateFiles(inputs, output):
-    print >> sys.stderr, "##### Catenate interaction XML as files #####"
-    assert len(inputs) > 1
-    print >> sys.stderr, "Writing catenated XML to", output
-    if output.endswith(".gz"):
-        outFile = gzip.open(output, 'wb')
+    def _read(self):
+        data = self.f.read(BLOCK_SIZE)
+        self.buffer += data
+        return data != ""
+    
+    def _find(self, string, start):
+        """
+        The index of string in the buffer at or after start, reading more input as needed.
+        """
+        while True:
+            index = self.buffer.find(string, start)
+            if index != -1:
+                return index
+            start = max(start, len(self.buffer) - len(string) + 1)
+            if not self._read():
+                return -1
+    
+    def _take(self, end):
+        data = self.buffer[self.pos:end]
+        self.pos = end
+        return data
+    
+    def _compact(self):
+        """
+        Drop the consumed part of the buffer. This changes the buffer offsets, so it is
+        only called when no offsets are in use.
+        """
+        if self.pos > BLOCK_SIZE:
+            self.buffer = self.buffer[self.pos:]
+            self.pos = 0
+    
+    def _takeRest(self):
+        data = self._take(len(self.buffer))
+        while self._read():
+            data += self._take(len(self.buffer))
+        return data
+    
+    def parts(self):
+        begin = self._find("<corpus", self.pos)
+        assert begin != -1, "No corpus element"
+        end = self._find(">", begin)
+        header = self._take(end + 1)
+        yield "header", header
+        if header.endswith("/>"): # empty corpus
+            self._takeRest()
+            return
+        while True:
+            self._compact()
+            if self.splitDocuments:
+                begin = self._find("<document", self.pos)
+                if begin != -1 and self.buffer.find("</corpus", self.pos, begin) == -1:
+                    if begin > self.pos:
+                        yield "text", self._take(begin)
+                    end = self._find(">", begin)
+                    if self.buffer[end - 1] != "/":
+                        end = self._find("</document>", end) + len("</document>") - 1
+                    yield "document", self._take(end + 1)
+                    continue
+            end = self.buffer.find("</corpus", self.pos)
+            if end != -1:
+                yield "text", self._take(end)
+                break
+            # Keep the end of the buffer, in case the corpus end tag is split between blocks
+            if len(self.buffer) - self.pos > len("</corpus"):
+                yield "text", self._take(len(self.buffer) - len("</corpus"))
+            assert self._read(), "No corpus end tag"
+        yield "trailer", self._takeRest()
+
+def openFile(filename, mode):
+    if filename.endswith(".gz"):
+        return gzip.open(filename, mode)
     else:
-        outFile = open(output, "wb")
-    outWriter = codecs.getwriter("utf-8")(outFile)
+        return open(filename, mode)
+
+def rewriteDocumentIds(document, newId):
+    """
+    Replace the id of a document, and the same prefix of all the ids inside it.
+    """
+    oldId = ID_PATTERN.search(document, 0, document.find(">") + 1).group(1)
+    return re.sub('="' + re.escape(oldId) + '(?=[".])', lambda x: '="' + newId, document)
+
+def iterCatenated(inputs, renumber=False, prefixes=None, source=None):
+    """
+    The byte strings of the catenated corpus.
+    """
+    assert prefixes == None or len(prefixes) == len(inputs)
+    if source != None:
+        source = ETUtils.escapeText(source.encode("utf-8") if isinstance(source, unicode) else source)
+    splitDocuments = renumber or prefixes != None
+    docIndex = 0
+    trailer = "</corpus>\n"
     for i in range(len(inputs)):
         print >> sys.stderr, "Catenating", inputs[i]
-        if inputs[i].endswith(".gz"):
-            f = gzip.open(inputs[i], 'rb')
-        else:
-            f = open(inputs[i], "rb")
-        state = "BEGIN"
-        for line in codecs.getreader("utf-8")(f):
-            if "<corpus" in line:
-                assert state == "BEGIN"
-                state = "MIDDLE"
-                if i > 0:
-                    continue
-            elif "</corpus" in line:
-                assert state == "MIDDLE"
-                state = "END"
-            if state == "BEGIN" and i > 0:
-                continue
-            if state == "END" and i < len(inputs) - 1:
-                continue
-            outWriter.write(line)
+        f = openFile(inputs[i], "rb")
+        for partType, data in CorpusScanner(f, splitDocuments).parts():
+            if partType == "header":
+                match = SOURCE_PATTERN.search(data)
+                inputSource = match.group(1) if match != None else None
+                if i == 0:
+                    if source != None:
+                        if match != None:
+                            data = data[:match.start(1)] + source + data[match.end(1):]
+                        else:
+                            data = data[:data.index("<corpus") + len("<corpus")] + ' source="' + source + '"' + data[data.index("<corpus") + len("<corpus"):]
+                    elif inputSource != None:
+                        source = inputSource
+                    assert source != None or not renumber, "Renumbering requires a corpus source"
+                    if data.endswith("/>"):
+                        data = data[:-2].rstrip() + ">\n"
+                    yield data
+                else:
+                    if inputSource != source and not renumber:
+                        print >> sys.stderr, "Warning, corpus", inputs[i], "has source", inputSource, "instead of", source
+                    skipNewline = True
+            elif partType == "document":
+                if renumber:
+                    data = rewriteDocumentIds(data, source + ".d" + str(docIndex))
+                elif prefixes != None:
+                    oldId = ID_PATTERN.search(data, 0, data.find(">") + 1).group(1)
+                    data = rewriteDocumentIds(data, ETUtils.escapeText(prefixes[i]) + oldId)
+                docIndex += 1
+                yield data
+            elif partType == "text":
+                if i > 0 and skipNewline: # the newline after the corpus start tag is already in the output
+                    data = data[2:] if data.startswith("\r\n") else (data[1:] if data.startswith("\n") else data)
+                skipNewline = False
+                if data != "":
+                    yield data
+            elif data != "":
+                trailer = data
         f.close()
+    yield trailer
+
+def compressMember(data, level=6):
+    """
+    A complete gzip member of the data. A gzip file can consist of several members, so
+    blocks of the output can be compressed independently and in parallel.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    body = compressor.compress(data) + compressor.flush()
+    header = "\x1f\x8b\x08\x00" + struct.pack("<I", 0) + "\x00\xff"
+    return header + body + struct.pack("<II", zlib.crc32(data) & 0xffffffff, len(data) & 0xffffffff)
+
+def iterBlocks(strings, size):
+    block = []
+    length = 0
+    for string in strings:
+        block.append(string)
+        length += len(string)
+        if length >= size:
+            yield "".join(block)
+            block = []
+            length = 0
+    if length > 0:
+        yield "".join(block)
+
+def catenateFiles(inputs, output, renumber=False, prefixes=None, source=None, parallel=1):
+    """
+    Catenate interaction XML files by copying their document byte ranges as they are. The
+    corpus element is taken from the first input. Optionally the document ids (and the
+    ids inside the documents) are renumbered for the output corpus source, or prefixed
+    with a per-input string. Gzipped outputs are compressed in parallel blocks.
+    """
+    print >> sys.stderr, "##### Catenate interaction XML as files #####"
+    assert len(inputs) > 0
+    print >> sys.stderr, "Writing catenated XML to", output
+    strings = iterCatenated(inputs, renumber, prefixes, source)
+    outFile = open(output, "wb")
+    if output.endswith(".gz"):
+        pool = multiprocessing.Pool(parallel) if parallel > 1 else None
+        batch = []
+        for block in iterBlocks(strings, MEMBER_SIZE):
+            batch.append(block)
+            if len(batch) >= 2 * parallel:
+                for member in (pool.map(compressMember, batch) if pool != None else [compressMember(x) for x in batch]):
+                    outFile.write(member)
+                batch = []
+        for member in (pool.map(compressMember, batch) if pool != None else [compressMember(x) for x in batch]):
+            outFile.write(member)
+        if pool != None:
+            pool.close()
+            pool.join()
+    else:
+        for string in strings:
+            outFile.write(string)
     outFile.close()
 
 def catenateElements(inputs, inputDir):
@@ -89,7 +263,11 @@ if __name__=="__main__":
     optparser = OptionParser(usage="%prog [options]\n")
     optparser.add_option("-i", "--inputs", default=None, dest="inputs", help="A comma-separated list of corpora in interaction xml format", metavar="FILE")
     optparser.add_option("-o", "--output", default=None, dest="output", help="Output file in interaction xml format.")
-    optparser.add_option("-f", "--fast", default=False, action="store_true", dest="fast", help="Fast, but unsafe catenation")
+    optparser.add_option("-f", "--fast", default=False, action="store_true", dest="fast", help="Fast catenation of the files as bytes")
+    optparser.add_option("-r", "--renumber", default=False, action="store_true", dest="renumber", help="Renumber the document ids (fast mode)")
+    optparser.add_option("-x", "--prefixes", default=None, dest="prefixes", help="Comma-separated document id prefixes for the inputs (fast mode)")
+    optparser.add_option("-s", "--source", default=None, dest="source", help="Source attribute of the output corpus (fast mode)")
+    optparser.add_option("-p", "--parallel", default=1, type="int", dest="parallel", help="Number of processes for compressing a gzipped output (fast mode)")
     (options, args) = optparser.parse_args()
     
     if options.inputs == None:
@@ -102,4 +280,6 @@ if __name__=="__main__":
         optparser.print_help()
         sys.exit(1)
     
-    catenate(options.inputs, options.output, options.fast)
+    if options.prefixes != None:
+        options.prefixes = options.prefixes.split(",")
+    catenate(options.inputs, options.output, options.fast, options.renumber, options.prefixes, options.source, options.parallel)
@@ -7,7 +7,14 @@ try:
 except ImportError:
     import cElementTree as ET
 import Utils.ElementTreeUtils as ETUtils
+import Utils.TableUtils as TableUtils
+from Utils.FileUtils import getFileMd5
+import ParseStats
 import json
+import multiprocessing
+from collections import defaultdict
+
+NO_TYPE = "null" # the type of elements without one
 
 def addStats(name, value, dict, tags):
     for tag in tags:
@@ -22,9 +29,11 @@ def addAnnotation(elements, stats):
         stats["total"] += 1
         if element.get("given") == "True":
             stats["given"] += 1
-        if element.get("type") not in stats["types"]:
-            stats["types"][element.get("type")] = 0
-        stats["types"][element.get("type")] += 1
+        # Missing types are counted as "null", the key they get in the JSON output and cache
+        elementType = element.get("type", NO_TYPE)
+        if elementType not in stats["types"]:
+            stats["types"][elementType] = 0
+        stats["types"][elementType] += 1
         if element.tag == "interaction":
             if element.get("e1").split(".e")[0] != element.get("e2").split(".e")[0]:
                 if not "intersentence" in stats:
@@ -32,38 +41,178 @@ def addAnnotation(elements, stats):
                 stats["intersentence"] += 1
     return stats
 
-def getStatistics(corpusIds, inputDir):
+def mergeStats(target, source):
+    """
+    Add the counts of a (nested) statistics dictionary into another one.
+    """
+    for key in source:
+        if isinstance(source[key], dict):
+            mergeStats(target.setdefault(key, {}), source[key])
+        else:
+            target[key] = target.get(key, 0) + source[key]
+    return target
+
+def getStatistics(corpusIds, inputDir, parses=False, parallel=1, cacheDir=None):
     stats = {}
+    jobs = []
     for corpusId in corpusIds:
         if not corpusId in stats:
             stats[corpusId] = {"train":{}, "devel":{}, "test":{}, "total":{}}
         for dataSet in ("train", "devel", "test"):
             corpusPath = os.path.join(inputDir, corpusId + "-" + dataSet + ".xml")
-            getFileStatistics(corpusPath, stats, (dataSet, "total"), corpusId)
+            if not os.path.exists(corpusPath):
+                print >> sys.stderr, "Warning, cannot find", corpusPath
+                continue
+            jobs.append((corpusPath, corpusId, (dataSet, "total")))
+    fileStats = getFilesStatistics([x[0] for x in jobs], parses, parallel, cacheDir)
+    for (corpusPath, corpusId, targetSets), result in zip(jobs, fileStats):
+        for targetSet in targetSets:
+            mergeStats(stats[corpusId][targetSet], result)
     return stats
 
-def getFileStatistics(filename, stats, targetSets, corpusId):
+def getFileStatistics(filename, stats, targetSets, corpusId, parses=False, cacheDir=None):
     if stats == None:
         stats = {corpusId:{x:{} for x in targetSets}}
     if not os.path.exists(filename):
         print >> sys.stderr, "Warning, cannot find", filename
         return
+    result = getFilesStatistics([filename], parses, 1, cacheDir)[0]
+    for targetSet in targetSets:
+        mergeStats(stats[corpusId][targetSet], result)
+    return stats
+
+###############################################################################
+# Streaming statistics for a single file
+###############################################################################
+
+def addDocumentStatistics(document, stats, parseCounts=None, tokenCounts=None):
+    stats["document"] += 1
+    sentences = document.findall("sentence")
+    stats["sentence"] += len(sentences)
+    for elementType in ("entity", "interaction"):
+        addAnnotation(document.iter(elementType), stats[elementType])
+    if parseCounts != None:
+        for sentence in sentences:
+            ParseStats.addSentenceParseStats(sentence, parseCounts, tokenCounts)
+
+def analyzeFile(filename, parses=False):
+    """
+    The statistics of a single corpus file. The documents are streamed, so only one
+    document is kept in memory at a time.
+    """
     print >> sys.stderr, "Processing", filename
-    xml = ETUtils.ETFromObj(filename)
-    for elementType in ("sentence", "document"):
-        addStats(elementType, len([x for x in xml.iter(elementType)]), stats[corpusId], targetSets)
+    stats = {"document":0, "sentence":0}
     for elementType in ("entity", "interaction"):
-        elements = [x for x in xml.iter(elementType)]
-        for targetSet in targetSets:
-            stats[corpusId][targetSet][elementType] = addAnnotation(elements, stats[corpusId][targetSet].get(elementType))
+        stats[elementType] = addAnnotation([], None)
+    parseCounts = defaultdict(int) if parses else None
+    tokenCounts = {} if parses else None
+    for event, element in ETUtils.ETIteratorFromObj(filename, ("start", "end")):
+        if event in ("end", "memory") and element.tag == "document":
+            addDocumentStatistics(element, stats, parseCounts, tokenCounts)
+    if parses:
+        stats["parses"] = dict(parseCounts)
+        stats["tokensPerSentence"] = {x:dict(tokenCounts[x]) for x in tokenCounts}
     return stats
 
+def _getCachePath(filename, parses, cacheDir):
+    if cacheDir == None:
+        return None
+    return os.path.join(cacheDir, "statistics-" + ("parses-" if parses else "") + getFileMd5(filename) + ".json")
+
+def _analyzeFileCached(args):
+    # Worker function for getFilesStatistics
+    filename, parses, cacheDir = args
+    cachePath = _getCachePath(filename, parses, cacheDir)
+    if cachePath != None and os.path.exists(cachePath):
+        print >> sys.stderr, "Using cached statistics", cachePath, "for", filename
+        f = open(cachePath, "rt")
+        stats = json.load(f)
+        f.close()
+        return stats
+    stats = analyzeFile(filename, parses)
+    if cachePath != None:
+        if not os.path.exists(cacheDir):
+            os.makedirs(cacheDir)
+        f = open(cachePath, "wt")
+        json.dump(stats, f, indent=2, sort_keys=True)
+        f.close()
+    return stats
+
+def getFilesStatistics(filenames, parses=False, parallel=1, cacheDir=None):
+    """
+    The statistics of each file, computed in parallel processes. The per-file results can
+    be cached in cacheDir, keyed by the MD5 hash of the file content.
+    """
+    args = [(x, parses, cacheDir) for x in filenames]
+    if parallel > 1 and len(filenames) > 1:
+        print >> sys.stderr, "Analyzing", len(filenames), "files in", min(parallel, len(filenames)), "processes"
+        pool = multiprocessing.Pool(min(parallel, len(filenames)))
+        results = pool.map(_analyzeFileCached, args)
+        pool.close()
+        pool.join()
+    else:
+        results = [_analyzeFileCached(x) for x in args]
+    return results
+
+###############################################################################
+# Output
+###############################################################################
+
+def getRows(stats):
+    """
+    The statistics as table rows (one per corpus and set) for TableUtils.writeCSV.
+    """
+    rows = []
+    for corpusId in sorted(stats.keys()):
+        for dataSet in sorted(stats[corpusId].keys()):
+            setStats = stats[corpusId][dataSet]
+            if len(setStats) == 0:
+                continue
+            row = {"corpus":corpusId, "set":dataSet, "documents":setStats["document"], "sentences":setStats["sentence"]}
+            for elementType in ("entity", "interaction"):
+                for key in ("total", "given", "intersentence"):
+                    if key in setStats[elementType]:
+                        row[elementType + ":" + key] = setStats[elementType][key]
+                for typeName, count in setStats[elementType]["types"].iteritems():
+                    row[elementType + ":type:" + str(typeName)] = count
+            for key, count in setStats.get("parses", {}).iteritems():
+                if key != "sentence": # already in "sentences"
+                    row[key] = count
+            for tokenizerName, distribution in setStats.get("tokensPerSentence", {}).iteritems():
+                numSentences = sum(distribution.values())
+                numTokens = sum([int(x) * distribution[x] for x in distribution])
+                row["tokens:" + tokenizerName] = numTokens
+                row["tokens-per-sentence:" + tokenizerName] = float(numTokens) / numSentences if numSentences > 0 else 0
+            rows.append(row)
+    return rows
+
+def writeStatistics(stats, output):
+    """
+    Save the statistics as JSON (.json) or as a TSV (.tsv) or CSV (other extensions) table.
+    """
+    print >> sys.stderr, "Writing statistics to", output
+    if output.endswith(".json"):
+        f = open(output, "wt")
+        json.dump(stats, f, indent=4, sort_keys=True)
+        f.close()
+    else:
+        rows = getRows(stats)
+        keys = set()
+        for row in rows:
+            keys.update(row.keys())
+        fieldnames = ["corpus", "set"] + sorted(keys - set(["corpus", "set"]))
+        TableUtils.writeCSV(rows, output, fieldnames, delimiter="\t" if output.endswith(".tsv") else ",")
+
 if __name__=="__main__":
     from optparse import OptionParser
     optparser = OptionParser(usage="%prog [options]\n")
     optparser.add_option("-i", "--input", default=None, help="Datasets to process")
     optparser.add_option("-c", "--corpora", default="BB11,BB13T2,BB_EVENT_16", help="Datasets to process")
     optparser.add_option("-d", "--inDir", default=os.path.normpath(Settings.DATAPATH + "/corpora"), help="directory for output files")
+    optparser.add_option("-o", "--output", default=None, help="Output file (.json, .tsv or .csv)")
+    optparser.add_option("-s", "--parses", default=False, action="store_true", help="Include parse coverage and tokens per sentence")
+    optparser.add_option("-p", "--parallel", default=1, type="int", help="Number of processes for analyzing the files")
+    optparser.add_option("--cacheDir", default=None, help="Directory for caching the per-file statistics")
     (options, args) = optparser.parse_args()
     
     options.corpora = options.corpora.replace("COMPLETE", "GE09,ALL11,ALL13,ALL16")
@@ -72,7 +221,10 @@ if __name__=="__main__":
     options.corpora = options.corpora.replace("ALL16", "BB_EVENT_16,BB_EVENT_NER_16,SDB16")
         
     if options.input != None:
-        result = getFileStatistics(options.input, None, ("file",), "file")
+        result = getFileStatistics(options.input, None, ("file",), "file", options.parses, options.cacheDir)
+    else:
+        result = getStatistics(options.corpora.split(","), options.inDir, options.parses, options.parallel, options.cacheDir)
+    if options.output != None:
+        writeStatistics(result, options.output)
     else:
-        result = getStatistics(options.corpora.split(","), options.inDir)
-    print json.dumps(result, indent=4)
\ No newline at end of file
+        print json.dumps(result, indent=4)
\ No newline at end of file
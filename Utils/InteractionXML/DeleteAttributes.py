@@ -6,6 +6,7 @@ try:
 except ImportError:
     import cElementTree as ET
 import Utils.ElementTreeUtils as ETUtils
+from Utils.InteractionXML.StreamTransform import DocumentTransform, transformCorpus
     
 def removeAttributes(parent, elementName, attributes, countsByType):
     for element in parent.getchildren():
@@ -16,26 +17,39 @@ def removeAttributes(parent, elementName, attributes, countsByType):
                     countsByType[elementName + ":" + attribute] += 1
         removeAttributes(element, elementName, attributes, countsByType)
 
-def processCorpus(input, output, rules):
-    print >> sys.stderr, "Deleting attributes, rules =", rules
-    print >> sys.stderr, "Loading corpus file", input
-    corpusTree = ETUtils.ETFromObj(input)
-    corpusRoot = corpusTree.getroot()
+class DeleteAttributesTransform(DocumentTransform):
+    """
+    Removes the listed attributes from the elements of the given tags. The rules
+    are a dictionary of element tag to a list of attribute names.
+    """
+    def __init__(self, rules):
+        self.rules = rules
+        self.countsByType = {}
+        for key in sorted(rules.keys()):
+            for attribute in rules[key]:
+                self.countsByType[key + ":" + attribute] = 0
     
-    countsByType = {}
-    for key in sorted(rules.keys()):
-        for attribute in rules[key]:
-            countsByType[key + ":" + attribute] = 0
-        removeAttributes(corpusRoot, key, rules[key], countsByType)
+    def removeAttributes(self, element):
+        if element.tag in self.rules:
+            for attribute in self.rules[element.tag]:
+                if element.get(attribute) != None:
+                    del element.attrib[attribute]
+                    self.countsByType[element.tag + ":" + attribute] += 1
     
-    print >> sys.stderr, "Removed"
-    for k in sorted(countsByType.keys()):
-        print >> sys.stderr, "  " + k + ":", countsByType[k]
+    def process(self, document):
+        for key in sorted(self.rules.keys()):
+            for element in document.getiterator(key):
+                self.removeAttributes(element)
+        return document
     
-    if output != None:
-        print >> sys.stderr, "Writing output to", output
-        ETUtils.write(corpusRoot, output)
-    return corpusTree
+    def end(self):
+        print >> sys.stderr, "Removed"
+        for k in sorted(self.countsByType.keys()):
+            print >> sys.stderr, "  " + k + ":", self.countsByType[k]
+
+def processCorpus(input, output, rules):
+    print >> sys.stderr, "Deleting attributes, rules =", rules
+    return transformCorpus(input, output, DeleteAttributesTransform(rules))
 
 if __name__=="__main__":
     import sys
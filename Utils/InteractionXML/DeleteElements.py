@@ -3,6 +3,7 @@ thisPath = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(os.path.abspath(os.path.join(thisPath,"..")))
 sys.path.append(os.path.abspath(os.path.join(thisPath,"../..")))
 import Utils.ElementTreeUtils as ETUtils
+from Utils.InteractionXML.StreamTransform import DocumentTransform, transformCorpus
 from collections import defaultdict
 import types
 
@@ -33,25 +34,33 @@ def getEmptyCorpus(xml, deletionRules=None, scope="all"):
     # Remove elements and return the emptied XML
     return processCorpus(xml, None, deletionRules)
     
+def matchRules(element, rules, reverse=False):
+    """
+    Whether an element whose tag is in the rules is to be removed, and the matched
+    attribute values (for the counts).
+    """
+    attrType = {}
+    remove = True
+    if rules[element.tag] != None and len(rules[element.tag]) > 0:
+        for attrName in rules[element.tag]:
+            if element.get(attrName) not in rules[element.tag][attrName]:
+                remove = False
+                break
+            else:
+                if attrName not in attrType:
+                    attrType[attrName] = set()
+                attrType[attrName].add(element.get(attrName))
+    if reverse:
+        remove = not remove
+    return remove, attrType
+
 def removeElements(parent, rules, reverse=False, countsByType=None):
     if countsByType == None:
         countsByType = defaultdict(int)
     toRemove = []
     for element in parent:
-        attrType = {}
         if element.tag in rules:
-            remove = True
-            if rules[element.tag] != None and len(rules[element.tag]) > 0:
-                for attrName in rules[element.tag]:
-                    if element.get(attrName) not in rules[element.tag][attrName]:
-                        remove = False
-                        break
-                    else:
-                        if attrName not in attrType:
-                            attrType[attrName] = set()
-                        attrType[attrName].add(element.get(attrName))
-            if reverse:
-                remove = not remove
+            remove, attrType = matchRules(element, rules, reverse)
             if remove:
                 toRemove.append(element)
                 countsByType[element.tag + " " + str(attrType)] += 1
@@ -60,23 +69,36 @@ def removeElements(parent, rules, reverse=False, countsByType=None):
     for element in toRemove:
         parent.remove(element)
 
-def processCorpus(input, output, rules, reverse=False):
-    print >> sys.stderr, "Deleting elements, rules =", rules
-    print >> sys.stderr, "Loading corpus file", input
-    corpusTree = ETUtils.ETFromObj(input)
-    corpusRoot = corpusTree.getroot()
-    
-    countsByType = defaultdict(int)
-    removeElements(corpusRoot, rules, reverse, countsByType)
+class DeleteElementsTransform(DocumentTransform):
+    """
+    Removes the elements matching the rules, a dictionary of element tag to a dictionary
+    of attribute names and their values. An element is removed if it has one of the listed
+    values for all the listed attributes (or the opposite, if reverse is True). The children
+    of removed elements are not processed.
+    """
+    def __init__(self, rules, reverse=False):
+        self.rules = rules
+        self.reverse = reverse
+        self.countsByType = defaultdict(int)
     
-    print >> sys.stderr, "Deleted elements"
-    for k in sorted(countsByType.keys()):
-        print >> sys.stderr, "  " + k + ":", countsByType[k]
+    def process(self, document):
+        if document.tag in self.rules:
+            remove, attrType = matchRules(document, self.rules, self.reverse)
+            if remove:
+                self.countsByType[document.tag + " " + str(attrType)] += 1
+                return None
+        else:
+            removeElements(document, self.rules, self.reverse, self.countsByType)
+        return document
     
-    if output != None:
-        print >> sys.stderr, "Writing output to", output
-        ETUtils.write(corpusRoot, output)
-    return corpusTree
+    def end(self):
+        print >> sys.stderr, "Deleted elements"
+        for k in sorted(self.countsByType.keys()):
+            print >> sys.stderr, "  " + k + ":", self.countsByType[k]
+
+def processCorpus(input, output, rules, reverse=False):
+    print >> sys.stderr, "Deleting elements, rules =", rules
+    return transformCorpus(input, output, DeleteElementsTransform(rules, reverse))
 
 if __name__=="__main__":
     print >> sys.stderr, "##### Delete Elements #####"
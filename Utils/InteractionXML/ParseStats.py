@@ -8,47 +8,68 @@ import CorpusElements
 from optparse import OptionParser
 from collections import defaultdict
 
-def parseStats(input):
-    print >> sys.stderr, "Loading input file", input
-    inputTree = ETUtils.ETFromObj(input)
-    inputRoot = inputTree.getroot()
-    counts = defaultdict(int)
-    for sentence in inputRoot.getiterator("sentence"):
-        counts["sentence"] += 1
+def addSentenceParseStats(sentence, counts, tokenCounts=None):
+    """
+    Count the parses and tokenizations of a sentence. If tokenCounts is given, the number
+    of tokens in each tokenization is added to its distribution (tokenizer name to a
+    dictionary of token count to number of sentences).
+    """
+    counts["sentence"] += 1
+    analysesElement = sentence.find("analyses")
+    if analysesElement != None: # parses and tokenizations directly in the analyses element
+        parseElements = analysesElement.findall("parse")
+        tokenizationElements = analysesElement.findall("tokenization")
+    else: # the older format, with separate parses and tokenizations elements
         analysesElement = sentence.find("sentenceanalyses")
         if analysesElement == None:
             counts["sentence-no-analyses"] += 1
-            continue
-        # Create parses element (if needed)
+            return
+        # An empty parses element is not counted as a sentence without parses, as before
         parsesElement = analysesElement.find("parses")
-        if parsesElement == None:
-            counts["sentence-no-parses"] += 1
-            continue
-        # Loop through parses
-        for parseElement in parsesElement:
-            parserName = parseElement.get("parser")
-            counts["parse:"+parserName] += 1
-            if parseElement.get("pennstring") in ["", None]:
-                counts["parse:"+parserName+"(no penn)"] += 1
-            if len(parseElement.findall("dependency")) == 0:
-                counts["parse:"+parserName+"(no dependencies)"] += 1
-            if len(parseElement.findall("phrase")) == 0:
-                counts["parse:"+parserName+"(no phrases)"] += 1
-        # Tokenizations
+        parseElements = list(parsesElement) if parsesElement != None else None
         tokenizationsElement = analysesElement.find("tokenizations")
-        if tokenizationsElement == None:
-            counts["sentence-no-tokenizations"] += 1
-            continue
-        # Loop through tokenizations
-        for tokenizationElement in tokenizationsElement:
-            tokenizerName = tokenizationElement.get("tokenizer")
-            counts["tokenization:"+tokenizerName] += 1
-            if len(tokenizationElement.findall("token")) == 0:
-                counts["tokenization:"+tokenizerName+"(no tokens)"] += 1
+        tokenizationElements = list(tokenizationsElement) if tokenizationsElement != None else None
+    if parseElements == None or (len(parseElements) == 0 and sentence.find("analyses") != None):
+        counts["sentence-no-parses"] += 1
+        return
+    # Loop through parses
+    for parseElement in parseElements:
+        parserName = parseElement.get("parser")
+        counts["parse:"+parserName] += 1
+        if parseElement.get("pennstring") in ["", None]:
+            counts["parse:"+parserName+"(no penn)"] += 1
+        if parseElement.find("dependency") == None:
+            counts["parse:"+parserName+"(no dependencies)"] += 1
+        if parseElement.find("phrase") == None:
+            counts["parse:"+parserName+"(no phrases)"] += 1
+    # Tokenizations
+    if not tokenizationElements:
+        counts["sentence-no-tokenizations"] += 1
+        return
+    # Loop through tokenizations
+    for tokenizationElement in tokenizationElements:
+        tokenizerName = tokenizationElement.get("tokenizer")
+        counts["tokenization:"+tokenizerName] += 1
+        numTokens = len(tokenizationElement.findall("token"))
+        if numTokens == 0:
+            counts["tokenization:"+tokenizerName+"(no tokens)"] += 1
+        if tokenCounts != None:
+            if tokenizerName not in tokenCounts:
+                tokenCounts[tokenizerName] = defaultdict(int)
+            tokenCounts[tokenizerName][str(numTokens)] += 1
+
+def parseStats(input):
+    print >> sys.stderr, "Loading input file", input
+    counts = defaultdict(int)
+    for event in ETUtils.ETIteratorFromObj(input, ("start", "end")):
+        if event[0] in ("end", "memory") and event[1].tag == "document":
+            for sentence in event[1].getiterator("sentence"):
+                addSentenceParseStats(sentence, counts)
     
     print >> sys.stderr, "Parse statistics for", input
     for key in sorted(counts.keys()):
         print >> sys.stderr, " ", key + ":", counts[key]
+    return counts
         
 if __name__=="__main__":
     print >> sys.stderr, "##### Parse Statistics #####"
@@ -5,9 +5,167 @@ try:
 except ImportError:
     import cElementTree as ET
 import Utils.ElementTreeUtils as ETUtils
+import shutil, anydbm
+from Utils.InteractionXML.StreamTransform import DocumentTransform, transformCorpus, isStreamable
 
-def recalculateIds(input, output=None, onlyWithinSentence=False, docIndexStart=0):
+def recalculateEntityIds(document, corpusName, docIndex, onlyWithinSentence=False, entDictionary=None):
+    """
+    Renumber the document, its sentences and their entities. The old entity ids are mapped
+    to the new ones in entDictionary, which is returned.
+    """
+    if entDictionary == None:
+        entDictionary = {}
+    if not onlyWithinSentence:
+        document.attrib["id"] = corpusName + ".d" + str(docIndex)
+    sentIndex = 0
+    sentences = document.findall("sentence")
+    for sentence in sentences:
+        if not onlyWithinSentence:
+            sentence.attrib["id"] = corpusName + ".d" + str(docIndex) + ".s" + str(sentIndex)
+        entIndex = 0
+        entities = sentence.findall("entity")
+        for entity in entities:
+            if not onlyWithinSentence:
+                entNewId = corpusName + ".d" + str(docIndex) + ".s" + str(sentIndex) + ".e" + str(entIndex)
+            else:
+                entNewId = sentence.attrib["id"] + ".e" + str(entIndex)
+            assert not entDictionary.has_key(entity.attrib["id"]),entity.get("id")
+            entDictionary[entity.attrib["id"]] = entNewId
+            entity.attrib["id"] = entNewId
+            entIndex += 1
+        sentIndex += 1
+    return entDictionary
+
+def recalculateInteractionIds(document, corpusName, docIndex, entDictionary, onlyWithinSentence=False, unresolved=None):
+    """
+    Renumber the interactions and pairs of the document's sentences and remap their arguments
+    with entDictionary. Interaction arguments not in entDictionary are kept as they are. Pair
+    arguments not in entDictionary are an error, unless the unresolved list is given, in which
+    case they are kept and added to it as (element, attribute) tuples.
+    """
+    sentences = document.findall("sentence")
+    sentIndex = 0
+    for sentence in sentences:
+        interactions = sentence.findall("interaction")
+        intIndex = 0
+        for interaction in interactions:
+            if onlyWithinSentence:
+                interaction.attrib["id"] = sentence.attrib["id"] + ".i" + str(intIndex)
+            else:
+                interaction.attrib["id"] = corpusName + ".d" + str(docIndex) + ".s" + str(sentIndex) + ".i" + str(intIndex)
+            for attr in ("e1", "e2"):
+                if interaction.attrib[attr] in entDictionary:
+                    interaction.attrib[attr] = entDictionary[interaction.attrib[attr]]
+                elif unresolved != None:
+                    unresolved.append((interaction, attr))
+            intIndex += 1
+        pairs = sentence.findall("pair")
+        pairIndex = 0
+        for pair in pairs:
+            if onlyWithinSentence:
+                pair.attrib["id"] = sentence.attrib["id"] + ".p" + str(pairIndex)
+            else:
+                pair.attrib["id"] = corpusName + ".d" + str(docIndex) + ".s" + str(sentIndex) + ".p" + str(pairIndex)
+            for attr in ("e1", "e2"):
+                if unresolved != None and pair.attrib[attr] not in entDictionary:
+                    unresolved.append((pair, attr))
+                else:
+                    pair.attrib[attr] = entDictionary[pair.attrib[attr]]
+            pairIndex += 1
+        sentIndex += 1
+
+class RecalculateIdsTransform(DocumentTransform):
+    """
+    Recalculates the ids one document at a time. The old to new entity id map is kept for
+    the whole corpus (in an anydbm file at spillPath if given, for large corpora), so
+    references to entities of earlier documents are remapped immediately. References to
+    entities of later documents are recorded in self.pending and remapped afterwards in
+    the output with resolvePending.
+    """
+    def __init__(self, onlyWithinSentence=False, docIndexStart=0, corpusName=None, spillPath=None):
+        self.onlyWithinSentence = onlyWithinSentence
+        self.docIndexStart = docIndexStart
+        self.docIndex = docIndexStart
+        self.corpusName = corpusName
+        self.spillPath = spillPath
+        self.entDictionary = anydbm.open(spillPath, "n") if spillPath != None else {}
+        self.pending = [] # (document index, element tag, element id, attribute, referenced old id)
+    
+    def begin(self, corpus):
+        if self.corpusName == None:
+            self.corpusName = corpus.attrib["source"]
+    
+    def process(self, document):
+        recalculateEntityIds(document, self.corpusName, self.docIndex, self.onlyWithinSentence, self.entDictionary)
+        unresolved = []
+        recalculateInteractionIds(document, self.corpusName, self.docIndex, self.entDictionary, self.onlyWithinSentence, unresolved)
+        for element, attr in unresolved:
+            self.pending.append((self.docIndex, element.tag, element.get("id"), attr, element.get(attr)))
+        self.docIndex += 1
+        return document
+    
+    def resolvePending(self, output):
+        """
+        Remap the references to entities of later documents in the written output, with a
+        second streaming pass over the documents containing them. Pair arguments referring
+        to non-existing entities are an error (as in recalculateIds) and the output is removed.
+        Interaction arguments referring to non-existing entities are kept as they are.
+        """
+        missing = [x for x in self.pending if x[4] not in self.entDictionary]
+        missingPairs = [x for x in missing if x[1] == "pair"]
+        if len(missingPairs) > 0:
+            self.close()
+            os.remove(output)
+            raise KeyError(missingPairs[0][4])
+        if len(missing) > 0:
+            print >> sys.stderr, "Warning,", len(missing), "interaction arguments refer to non-existing entities"
+        forward = [x for x in self.pending if x[4] in self.entDictionary]
+        if len(forward) > 0:
+            print >> sys.stderr, "Remapping", len(forward), "references to entities of later documents"
+            tempOutput = os.path.join(os.path.dirname(output), "forward-" + os.path.basename(output))
+            fixTransform = ReferenceFixTransform(dict([((x[0], x[2], x[3]), self.entDictionary[x[4]]) for x in forward]), self.docIndexStart)
+            transformCorpus(output, tempOutput, fixTransform)
+            shutil.move(tempOutput, output)
+        self.close()
+    
+    def close(self):
+        if self.spillPath != None:
+            self.entDictionary.close()
+            for extension in ("", ".db", ".dat", ".dir", ".bak", ".pag"): # the files of the dbm implementations
+                if os.path.exists(self.spillPath + extension):
+                    os.remove(self.spillPath + extension)
+        self.entDictionary = {}
+
+class ReferenceFixTransform(DocumentTransform):
+    """
+    Sets the arguments of interactions and pairs, given as a dictionary of (document index,
+    element id, attribute) to the new value.
+    """
+    def __init__(self, newValues, docIndexStart=0):
+        self.newValues = newValues
+        self.docIndices = set([x[0] for x in newValues])
+        self.docIndex = docIndexStart
+    
+    def process(self, document):
+        if self.docIndex in self.docIndices:
+            for element in document.getiterator():
+                if element.tag in ("interaction", "pair"):
+                    for attr in ("e1", "e2"):
+                        key = (self.docIndex, element.get("id"), attr)
+                        if key in self.newValues:
+                            element.set(attr, self.newValues[key])
+        self.docIndex += 1
+        return document
+
+def recalculateIds(input, output=None, onlyWithinSentence=False, docIndexStart=0, spillPath=None):
     print >> sys.stderr, "##### Recalculate hierarchical interaction XML ids #####"
+    if isStreamable(input, output):
+        # Stream the corpus, renumbering each document when it is read
+        transform = RecalculateIdsTransform(onlyWithinSentence, docIndexStart, spillPath=spillPath)
+        transformCorpus(input, output, transform)
+        transform.resolvePending(output)
+        return output
+    
     print >> sys.stderr, "Loading corpus", input
     corpusTree = ETUtils.ETFromObj(input)
     print >> sys.stderr, "Corpus file loaded"
@@ -21,55 +179,12 @@ def recalculateIds(input, output=None, onlyWithinSentence=False, docIndexStart=0
     entDictionary = {}
     docIndex = docIndexStart
     for document in documents:
-        if not onlyWithinSentence:
-            document.attrib["id"] = corpusName + ".d" + str(docIndex)
-        sentIndex = 0
-        sentences = document.findall("sentence")
-        for sentence in sentences:
-            if not onlyWithinSentence:
-                sentence.attrib["id"] = corpusName + ".d" + str(docIndex) + ".s" + str(sentIndex)
-            entIndex = 0
-            entities = sentence.findall("entity")
-            for entity in entities:
-                if not onlyWithinSentence:
-                    entNewId = corpusName + ".d" + str(docIndex) + ".s" + str(sentIndex) + ".e" + str(entIndex)
-                else:
-                    entNewId = sentence.attrib["id"] + ".e" + str(entIndex)
-                assert not entDictionary.has_key(entity.attrib["id"]),entity.get("id")
-                entDictionary[entity.attrib["id"]] = entNewId
-                entity.attrib["id"] = entNewId
-                entIndex += 1
-            sentIndex += 1
+        recalculateEntityIds(document, corpusName, docIndex, onlyWithinSentence, entDictionary)
         docIndex += 1
     # Recalculate ids for pairs and interactions
     docIndex = docIndexStart
     for document in documents:
-        sentences = document.findall("sentence")
-        sentIndex = 0
-        for sentence in sentences:
-            interactions = sentence.findall("interaction")
-            intIndex = 0
-            for interaction in interactions:
-                if onlyWithinSentence:
-                    interaction.attrib["id"] = sentence.attrib["id"] + ".i" + str(intIndex)
-                else:
-                    interaction.attrib["id"] = corpusName + ".d" + str(docIndex) + ".s" + str(sentIndex) + ".i" + str(intIndex)
-                if interaction.attrib["e1"] in entDictionary:
-                    interaction.attrib["e1"] = entDictionary[interaction.attrib["e1"]]
-                if interaction.attrib["e2"] in entDictionary:
-                    interaction.attrib["e2"] = entDictionary[interaction.attrib["e2"]]
-                intIndex += 1
-            pairs = sentence.findall("pair")
-            pairIndex = 0
-            for pair in pairs:
-                if onlyWithinSentence:
-                    pair.attrib["id"] = sentence.attrib["id"] + ".p" + str(pairIndex)
-                else:
-                    pair.attrib["id"] = corpusName + ".d" + str(docIndex) + ".s" + str(sentIndex) + ".p" + str(pairIndex)
-                pair.attrib["e1"] = entDictionary[pair.attrib["e1"]]
-                pair.attrib["e2"] = entDictionary[pair.attrib["e2"]]
-                pairIndex += 1
-            sentIndex += 1
+        recalculateInteractionIds(document, corpusName, docIndex, entDictionary, onlyWithinSentence)
         docIndex += 1
     
     if output != None:
@@ -96,6 +211,7 @@ if __name__=="__main__":
     optparser.add_option("-o", "--output", default=defaultOutputName, dest="output", help="Output file in interaction xml format.")
     optparser.add_option("-s", "--sentence", action="store_true", default=False, dest="sentence", help="Only recalculate within a sentence element.")
     optparser.add_option("-d", "--docIndexStart", type="int", default=0, dest="docIndexStart", help="Start document indexing from.")
+    optparser.add_option("-p", "--spill", default=None, dest="spill", help="Keep the entity id map in this anydbm file when streaming.")
     (options, args) = optparser.parse_args()
     
     if options.input == None:
@@ -107,4 +223,4 @@ if __name__=="__main__":
         optparser.print_help()
         sys.exit(1)
     
-    recalculateIds(options.input, options.output, options.sentence, options.docIndexStart)
+    recalculateIds(options.input, options.output, options.sentence, options.docIndexStart, options.spill)
@@ -2,13 +2,18 @@ import sys, os
 thisPath = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(os.path.abspath(os.path.join(thisPath,"../..")))
 import Utils.ElementTreeUtils as ETUtils
+from Utils.InteractionXML.StreamTransform import DocumentTransform, transformCorpus
 
-def removeUnconnectedEntities(input, output=None):
-    input = ETUtils.ETFromObj(input)
-    root = input.getroot()
-    removed = 0
-    preserved = 0
-    for document in root.findall("document"):
+class RemoveUnconnectedEntitiesTransform(DocumentTransform):
+    """
+    Removes the entities that are not an argument of any interaction in their document.
+    Named entities (given="True") are never removed.
+    """
+    def __init__(self):
+        self.removed = 0
+        self.preserved = 0
+    
+    def process(self, document):
         sentMap = {} # allow for intersentence interactions
         for sentence in document.findall("sentence"):
             sentMap[sentence.get("id")] = sentence
@@ -28,16 +33,16 @@ def removeUnconnectedEntities(input, output=None):
                     sentMap[eId.rsplit(".", 1)[0]].remove(entity)
                 else: # document level entity
                     document.remove(entity)
-                removed += 1
+                self.removed += 1
             else:
-                preserved += 1
-    
-    print >> sys.stderr, "Removed", removed, "entities, preserved", preserved, "entities"
+                self.preserved += 1
+        return document
     
-    if output != None:
-        print >> sys.stderr, "Writing output to", output
-        ETUtils.write(root, output)
-    return input
+    def end(self):
+        print >> sys.stderr, "Removed", self.removed, "entities, preserved", self.preserved, "entities"
+
+def removeUnconnectedEntities(input, output=None):
+    return transformCorpus(input, output, RemoveUnconnectedEntitiesTransform())
 
 if __name__=="__main__":
     import sys
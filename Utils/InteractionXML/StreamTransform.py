@@ -0,0 +1,189 @@
+"""
+Streaming per-document transforms of interaction XML corpora.
+
+A tool is declared as a DocumentTransform, which modifies (or removes) one
+document element at a time. Several transforms can be chained, so that they
+are all applied in a single read/write pass over the corpus. When the input
+is a file and an output file is given, the corpus is streamed with
+ETUtils.ETIteratorFromObj and ETUtils.ETWriter, so only one document is kept
+in memory at a time. Otherwise (e.g. the input is already an ElementTree,
+or no output is written) the documents are transformed in place and the
+tree is returned.
+
+Transforms that need information from the whole corpus can define a
+pre-pass (prepare), which is run for all transforms over the input
+documents before the documents are transformed. When streaming, this means
+reading the input twice. Corpus-level results can be reported after the
+last document in end.
+"""
+import sys, os
+import shutil
+import ast
+thisPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.abspath(os.path.join(thisPath,"../..")))
+import Utils.ElementTreeUtils as ETUtils
+import Utils.Parameters as Parameters
+
+class DocumentTransform:
+    """
+    Base class for per-document transforms. Subclasses override process and,
+    if needed, the corpus-level hooks.
+    """
+    # Set to True in transforms that define a pre-pass over the documents
+    prepass = False
+
+    def begin(self, corpus):
+        """
+        Called with the corpus element before any documents are processed. The
+        attributes of the corpus element can be modified here.
+        """
+        pass
+
+    def prepare(self, document):
+        """
+        The pre-pass, called for each input document if prepass is True.
+        """
+        pass
+
+    def process(self, document):
+        """
+        Transform a document. Returns the document (or a replacement element), or
+        None to remove it from the corpus.
+        """
+        return document
+
+    def end(self):
+        """
+        Called after all documents have been processed.
+        """
+        pass
+
+def applyTransforms(transforms, document):
+    for transform in transforms:
+        document = transform.process(document)
+        if document == None:
+            break
+    return document
+
+def isStreamable(input, output):
+    return output != None and isinstance(input, basestring)
+
+def runPrepass(transforms, input, documentTag):
+    prepassTransforms = [x for x in transforms if x.prepass]
+    if len(prepassTransforms) == 0:
+        return
+    print >> sys.stderr, "Pre-pass for", [x.__class__.__name__ for x in prepassTransforms]
+    for event, element in ETUtils.ETIteratorFromObj(input, ("start", "end")):
+        if event in ("end", "memory") and element.tag == documentTag:
+            for transform in prepassTransforms:
+                transform.prepare(element)
+
+def transformTree(input, output, transforms, documentTag="document"):
+    corpusTree = ETUtils.ETFromObj(input)
+    corpusRoot = corpusTree.getroot() if not ETUtils.ElementTree.iselement(corpusTree) else corpusTree
+    runPrepass(transforms, corpusTree, documentTag)
+    for transform in transforms:
+        transform.begin(corpusRoot)
+    for document in list(corpusRoot):
+        if document.tag != documentTag:
+            continue
+        transformed = applyTransforms(transforms, document)
+        if transformed is not document:
+            index = list(corpusRoot).index(document)
+            corpusRoot.remove(document)
+            if transformed != None:
+                corpusRoot.insert(index, transformed)
+    for transform in transforms:
+        transform.end()
+    if output != None:
+        print >> sys.stderr, "Writing output to", output
+        ETUtils.write(corpusRoot, output)
+    return corpusTree
+
+def transformStream(input, output, transforms, documentTag="document"):
+    runPrepass(transforms, input, documentTag)
+    finalOutput = output
+    if os.path.abspath(input) == os.path.abspath(output): # don't overwrite the input while reading it
+        output = os.path.join(os.path.dirname(output), "stream-" + os.path.basename(output))
+    etWriter = ETUtils.ETWriter(output)
+    depth = 0
+    for event, element in ETUtils.ETIteratorFromObj(input, ("start", "end")):
+        if event == "start":
+            if depth == 0: # the corpus element
+                for transform in transforms:
+                    transform.begin(element)
+                etWriter.begin(element)
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 1: # a child of the corpus element
+                if element.tag == documentTag:
+                    transformed = applyTransforms(transforms, element)
+                    if transformed != None:
+                        etWriter.write(transformed)
+                else:
+                    etWriter.write(element)
+                element.clear()
+            elif depth == 0:
+                etWriter.end(element)
+    etWriter.close()
+    ETUtils.encodeNewlines(output)
+    if output != finalOutput:
+        shutil.move(output, finalOutput)
+    for transform in transforms:
+        transform.end()
+    return finalOutput
+
+def transformCorpus(input, output, transforms, documentTag="document"):
+    """
+    Apply a chain of DocumentTransforms to the documents of a corpus. If the corpus is
+    streamed, returns the output file name, otherwise returns the transformed ElementTree.
+    """
+    if not isinstance(transforms, (list, tuple)):
+        transforms = [transforms]
+    print >> sys.stderr, "Transforming corpus", input if isinstance(input, basestring) else "(in memory)", "with", [x.__class__.__name__ for x in transforms]
+    if isStreamable(input, output):
+        return transformStream(input, output, transforms, documentTag)
+    else:
+        return transformTree(input, output, transforms, documentTag)
+
+def parseTransforms(string, transformClasses):
+    """
+    Make the transforms from a comma-separated list of names, each optionally followed by
+    the constructor arguments as Python literals, e.g. "DeleteAttributes({'entity':['headOffset']})".
+    """
+    transforms = []
+    for item in Parameters.split(string, ","):
+        name, arguments = item.strip(), ()
+        if "(" in name:
+            assert name.endswith(")"), name
+            name, argumentString = name[:-1].split("(", 1)
+            if argumentString.strip() != "":
+                arguments = ast.literal_eval("(" + argumentString + ",)")
+        if name.endswith("Transform"):
+            name = name[:-len("Transform")]
+        if name not in transformClasses:
+            raise Exception("Unknown transform '" + name + "', the transforms are " + str(sorted(transformClasses.keys())))
+        transforms.append(transformClasses[name](*arguments))
+    return transforms
+
+if __name__=="__main__":
+    from optparse import OptionParser
+    from Utils.InteractionXML.DeleteElements import DeleteElementsTransform
+    from Utils.InteractionXML.DeleteAttributes import DeleteAttributesTransform
+    from Utils.InteractionXML.RemoveUnconnectedEntities import RemoveUnconnectedEntitiesTransform
+    transformClasses = {"DeleteElements":DeleteElementsTransform,
+                        "DeleteAttributes":DeleteAttributesTransform,
+                        "RemoveUnconnectedEntities":RemoveUnconnectedEntitiesTransform}
+    optparser = OptionParser(usage="%prog [options]\nApply a chain of document transforms in one pass over a corpus.")
+    optparser.add_option("-i", "--input", default=None, dest="input", help="Corpus in interaction xml format", metavar="FILE")
+    optparser.add_option("-o", "--output", default=None, dest="output", help="Output file in interaction xml format.")
+    optparser.add_option("-t", "--transforms", default=None, dest="transforms", help="Comma-separated transforms (" + ", ".join(sorted(transformClasses.keys())) + "), e.g. \"DeleteAttributes({'entity':['headOffset']}),RemoveUnconnectedEntities\"")
+    (options, args) = optparser.parse_args()
+
+    if options.input == None or options.output == None or options.transforms == None:
+        print >> sys.stderr, "Error, input, output and transforms must be defined."
+        optparser.print_help()
+        sys.exit(1)
+
+    transformCorpus(options.input, options.output, parseTransforms(options.transforms, transformClasses))
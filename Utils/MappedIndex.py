@@ -0,0 +1,173 @@
+"""
+Compiled, memory-mapped lookup tables for resources.
+
+Feature builders that use large external resources (e.g. DrugBank) would
+otherwise parse the resource and build Python dictionaries in every process.
+A MappedIndex file is written once from the parsed resource and then opened
+with mmap. Each table maps byte string keys to byte string values and is
+stored as sorted keys with offset arrays, so a lookup is a binary search
+over the mapped file and only the pages that are used are read. As the file
+is mapped read-only, processes forked after opening it and other processes
+using the same file share its pages.
+
+File layout: an 8 byte magic string, a 4 byte header length and a JSON header
+(the index kind and version, the source file information and the table
+positions), followed by the tables. A table consists of the little-endian
+uint32 key and value offset arrays (count + 1 items each), the concatenated
+keys and the concatenated values.
+"""
+import sys, os
+import mmap
+import json
+import struct
+from array import array
+
+MAGIC = "TEESIDX1"
+
+def getSourceInfo(path):
+    """
+    The path, mtime and size of a source file, for checking whether an index is up to date.
+    """
+    stat = os.stat(path)
+    return {"path":os.path.abspath(path), "mtime":stat.st_mtime, "size":stat.st_size}
+
+def encodeKey(key):
+    if isinstance(key, unicode):
+        return key.encode("utf-8")
+    return key
+
+def _offsets(items):
+    offsets = array("I", [0])
+    total = 0
+    for item in items:
+        total += len(item)
+        offsets.append(total)
+    if sys.byteorder != "little":
+        offsets.byteswap()
+    return offsets
+
+def write(filename, tables, kind, version, source=None):
+    """
+    Write an index. tables is a dictionary of table name to a dictionary of (byte or unicode)
+    string keys to byte string values.
+    """
+    header = {"kind":kind, "version":version, "source":source, "tables":{}}
+    tempName = filename + "-" + str(os.getpid())
+    # Serialize the tables first, so that the header can contain their positions
+    blocks = []
+    position = 0
+    for name in sorted(tables.keys()):
+        table = dict([(encodeKey(k), v) for k, v in tables[name].iteritems()])
+        keys = sorted(table.keys())
+        values = [table[x] for x in keys]
+        header["tables"][name] = {"offset":position, "count":len(keys)}
+        for block in (_offsets(keys).tostring(), _offsets(values).tostring(), "".join(keys), "".join(values)):
+            blocks.append(block)
+            position += len(block)
+    headerString = json.dumps(header)
+    f = open(tempName, "wb")
+    f.write(MAGIC)
+    f.write(struct.pack("<I", len(headerString)))
+    f.write(headerString)
+    for block in blocks:
+        f.write(block)
+    f.close()
+    os.rename(tempName, filename)
+
+def readHeader(filename):
+    """
+    The header of an index file, or None if the file is not an index.
+    """
+    if not os.path.exists(filename):
+        return None
+    f = open(filename, "rb")
+    try:
+        if f.read(len(MAGIC)) != MAGIC:
+            return None
+        length = struct.unpack("<I", f.read(4))[0]
+        return json.loads(f.read(length))
+    finally:
+        f.close()
+
+def isCurrent(filename, kind, version, sourcePath=None):
+    """
+    True if the index exists and has the kind and version, and was compiled from the current version
+    of the source file.
+    """
+    header = readHeader(filename)
+    if header == None or header["kind"] != kind or header["version"] != version:
+        return False
+    if sourcePath != None:
+        source = getSourceInfo(sourcePath)
+        if header["source"] == None or header["source"]["mtime"] != source["mtime"] or header["source"]["size"] != source["size"]:
+            return False
+    return True
+
+class MappedTable:
+    def __init__(self, mm, base, count):
+        self.mm = mm
+        self.count = count
+        self.keyOffsets = base
+        self.valueOffsets = base + 4 * (count + 1)
+        self.keyBase = base + 8 * (count + 1)
+        self.valueBase = self.keyBase + struct.unpack_from("<I", mm, self.keyOffsets + 4 * count)[0]
+
+    def __len__(self):
+        return self.count
+
+    def _key(self, i):
+        begin, end = struct.unpack_from("<II", self.mm, self.keyOffsets + 4 * i)
+        return self.mm[self.keyBase + begin:self.keyBase + end]
+
+    def _value(self, i):
+        begin, end = struct.unpack_from("<II", self.mm, self.valueOffsets + 4 * i)
+        return self.mm[self.valueBase + begin:self.valueBase + end]
+
+    def _find(self, key):
+        key = encodeKey(key)
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count and self._key(low) == key:
+            return low
+        return -1
+
+    def __contains__(self, key):
+        return self._find(key) != -1
+
+    def get(self, key, default=None):
+        i = self._find(key)
+        if i == -1:
+            return default
+        return self._value(i)
+
+    def keys(self):
+        return [self._key(i) for i in range(self.count)]
+
+class MappedIndex:
+    """
+    A read-only index file opened with mmap.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.file = open(filename, "rb")
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        assert self.mm[:len(MAGIC)] == MAGIC, ("Not an index file", filename)
+        length = struct.unpack_from("<I", self.mm, len(MAGIC))[0]
+        self.header = json.loads(self.mm[len(MAGIC) + 4:len(MAGIC) + 4 + length])
+        dataStart = len(MAGIC) + 4 + length
+        self.tables = {}
+        for name, table in self.header["tables"].iteritems():
+            self.tables[name] = MappedTable(self.mm, dataStart + table["offset"], table["count"])
+
+    def __getitem__(self, name):
+        return self.tables[name]
+
+    def close(self):
+        self.tables = {}
+        self.mm.close()
+        self.file.close()
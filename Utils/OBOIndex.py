@@ -0,0 +1,199 @@
+"""
+Compiled ancestor closure index for OBO ontologies.
+
+Feature builders using an OBO ontology need the names of the terms and the
+transitive is_a ancestors of each term. Instead of parsing the OBO file and
+walking the hierarchy for every query, the file is compiled once into a
+MappedIndex with the tables "terms" (term id to the marshalled term name and
+sorted ancestor ids, including the term itself), "names" (normalized term
+name to term ids) and "keywords" (name token to term ids). The index is
+written next to the OBO file (or to a given path) and recompiled when the
+OBO file changes. Looked up terms are memoized, so repeated ancestor queries
+are dictionary lookups.
+"""
+import sys, os
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/..")
+import marshal
+import Utils.MappedIndex as MappedIndex
+
+INDEX_KIND = "obo"
+INDEX_VERSION = 1
+
+def getKind(relationships=None):
+    """
+    The index kind, which includes the followed relationship types.
+    """
+    if not relationships:
+        return INDEX_KIND
+    return INDEX_KIND + ":" + ",".join(sorted(relationships))
+
+def normalizeName(name):
+    return name.lower()
+
+def parseOBO(oboPath, relationships=None):
+    """
+    The [Term] stanzas of an OBO file as a dictionary of term id to (name, parent ids). The parents
+    are the is_a targets and the targets of the relationship types listed in relationships.
+    """
+    terms = {}
+    term = None
+    f = open(oboPath, "rt")
+    for line in f:
+        line = line.strip()
+        if line.startswith("["):
+            if term != None and term["id"] != None:
+                terms[term["id"]] = (term["name"], term["parents"])
+            term = {"id":None, "name":"", "parents":[]} if line == "[Term]" else None
+        elif term != None and ":" in line:
+            tag, content = [x.strip() for x in line.split(":", 1)]
+            if tag == "id":
+                term["id"] = content
+            elif tag == "name":
+                term["name"] = content
+            elif tag == "is_a":
+                term["parents"].append(content.split("!")[0].strip())
+            elif tag == "relationship" and relationships != None:
+                items = content.split("!")[0].split()
+                if len(items) >= 2 and items[0] in relationships:
+                    term["parents"].append(items[1])
+    f.close()
+    if term != None and term["id"] != None:
+        terms[term["id"]] = (term["name"], term["parents"])
+    return terms
+
+def getAncestors(terms, termId, closure, visiting=None):
+    """
+    The sorted ids of the term and all its ancestors. The results are stored in closure.
+    """
+    if termId in closure:
+        return closure[termId]
+    if visiting == None:
+        visiting = set()
+    visiting.add(termId)
+    ancestors = set([termId])
+    for parentId in terms[termId][1]:
+        if parentId in terms and parentId not in visiting: # skip undefined terms and cycles
+            ancestors.update(getAncestors(terms, parentId, closure, visiting))
+    visiting.remove(termId)
+    closure[termId] = tuple(sorted(ancestors))
+    return closure[termId]
+
+def compileTables(oboPath, relationships=None):
+    """
+    The index tables of an OBO file as dictionaries.
+    """
+    terms = parseOBO(oboPath, relationships)
+    closure = {}
+    tables = {"terms":{}, "names":{}, "keywords":{}}
+    byName = {}
+    byKeyword = {}
+    for termId in sorted(terms.keys()):
+        name = normalizeName(terms[termId][0])
+        tables["terms"][termId] = marshal.dumps((terms[termId][0], getAncestors(terms, termId, closure)))
+        byName.setdefault(name, []).append(termId)
+        for keyword in set(name.split()):
+            byKeyword.setdefault(keyword, []).append(termId)
+    for name, termIds in byName.iteritems():
+        tables["names"][name] = "\t".join(termIds)
+    for keyword, termIds in byKeyword.iteritems():
+        tables["keywords"][keyword] = "\t".join(termIds)
+    return tables
+
+def compileIndex(oboPath, indexPath, relationships=None):
+    print >> sys.stderr, "Compiling OBO index", indexPath
+    if os.path.dirname(indexPath) != "" and not os.path.exists(os.path.dirname(indexPath)):
+        os.makedirs(os.path.dirname(indexPath))
+    tables = compileTables(oboPath, relationships)
+    MappedIndex.write(indexPath, tables, getKind(relationships), INDEX_VERSION, MappedIndex.getSourceInfo(oboPath))
+    return tables
+
+class OBOIndex:
+    """
+    Queries on the compiled tables of an OBO ontology. The tables are either the tables of a
+    MappedIndex or dictionaries from compileTables.
+    """
+    def __init__(self, tables):
+        self.tables = tables
+        self.cache = {}
+
+    def getTerm(self, termId):
+        """
+        The (name, ancestor ids) of a term, or None if the term is not in the ontology.
+        """
+        if termId not in self.cache:
+            value = self.tables["terms"].get(termId)
+            self.cache[termId] = marshal.loads(value) if value != None else None
+        return self.cache[termId]
+
+    def getName(self, termId):
+        term = self.getTerm(termId)
+        return term[0] if term != None else None
+
+    def getAncestors(self, termId):
+        """
+        The sorted ids of the term and all its ancestors.
+        """
+        term = self.getTerm(termId)
+        return term[1] if term != None else ()
+
+    def getClosure(self, termIds):
+        """
+        The sorted ids of the terms and all their ancestors.
+        """
+        closure = set()
+        for termId in termIds:
+            closure.update(self.getAncestors(termId))
+        return sorted(closure)
+
+    def _getIds(self, table, key):
+        value = self.tables[table].get(key)
+        return value.split("\t") if value else []
+
+    def getIdsByName(self, name):
+        return self._getIds("names", normalizeName(name))
+
+    def getIdsByKeyword(self, keyword):
+        return self._getIds("keywords", normalizeName(keyword))
+
+_indices = {}
+
+def getIndex(oboPath, indexPath=None, relationships=None):
+    """
+    The OBOIndex of an OBO file, shared by all users in the process. The index is compiled
+    if it doesn't exist or is older than the OBO file. If the index cannot be written, the
+    tables are kept in memory.
+    """
+    key = (os.path.abspath(oboPath), indexPath, tuple(relationships) if relationships else None)
+    if key not in _indices:
+        if indexPath == None:
+            indexPath = oboPath + ".index"
+        if MappedIndex.isCurrent(indexPath, getKind(relationships), INDEX_VERSION, oboPath):
+            _indices[key] = OBOIndex(MappedIndex.MappedIndex(indexPath))
+        else:
+            try:
+                compileIndex(oboPath, indexPath, relationships)
+                _indices[key] = OBOIndex(MappedIndex.MappedIndex(indexPath))
+            except (IOError, OSError), e:
+                print >> sys.stderr, "Cannot write OBO index", indexPath + ":", e
+                _indices[key] = OBOIndex(compileTables(oboPath, relationships))
+    return _indices[key]
+
+if __name__=="__main__":
+    from optparse import OptionParser
+    optparser = OptionParser(usage="%prog [options]\nCompile an OBO ontology into an ancestor closure index.")
+    optparser.add_option("-i", "--input", default=None, dest="input", help="OBO file")
+    optparser.add_option("-o", "--output", default=None, dest="output", help="Index file (default: [input].index)")
+    optparser.add_option("-r", "--relationships", default=None, dest="relationships", help="Comma-separated relationship types to follow in addition to is_a")
+    optparser.add_option("-q", "--query", default=None, dest="query", help="Print the ancestors of the comma-separated term ids or names")
+    (options, args) = optparser.parse_args()
+    assert options.input != None
+    relationships = options.relationships.split(",") if options.relationships != None else None
+    if options.output == None:
+        options.output = options.input + ".index"
+    compileIndex(options.input, options.output, relationships)
+    if options.query != None:
+        index = OBOIndex(MappedIndex.MappedIndex(options.output))
+        for query in options.query.split(","):
+            termIds = [query] if index.getTerm(query) != None else index.getIdsByName(query)
+            for termId in termIds:
+                print termId, index.getName(termId) + ":", ", ".join(index.getAncestors(termId))
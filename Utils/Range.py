@@ -4,6 +4,7 @@ Character offset tools.
 __version__ = "$Revision: 1.11 $"
 
 import types
+import bisect
 
 def merge(range1, range2):
     mergedRange = [0,0]
@@ -111,4 +112,93 @@ def tuplesToCharOffset(tuples, offsetSep="-", rangeSep=","):
             charOffset += rangeSep
         charOffset += str(tup[0]) + offsetSep + str(tup[1])
         isFirst = False
-    return charOffset
\ No newline at end of file
+    return charOffset
+
+class RangeIndex:
+    """
+    A sorted index of character offset ranges for fast overlap queries.
+    
+    Values are stored with their ranges and sorted by range begin. A running
+    maximum of the range ends is kept alongside, so the first range that can
+    overlap a query is found with a binary search. For ranges that do not
+    nest (e.g. the tokens of a sentence) an overlap query costs O(log n + k).
+    """
+    def __init__(self, items=None):
+        """
+        @param items: (range, value) pairs, where range is a tuple of two integers
+        """
+        self.begins = []
+        self.ends = []
+        self.values = []
+        self.maxEnds = []
+        if items != None:
+            self.build(items)
+    
+    def build(self, items):
+        items = sorted([(x[0][0], x[0][1], i, x[1]) for i, x in enumerate(items)])
+        self.begins = [x[0] for x in items]
+        self.ends = [x[1] for x in items]
+        self.values = [x[3] for x in items]
+        self.maxEnds = []
+        maxEnd = None
+        for end in self.ends:
+            if maxEnd == None or end > maxEnd:
+                maxEnd = end
+            self.maxEnds.append(maxEnd)
+    
+    def __len__(self):
+        return len(self.values)
+    
+    def _overlapIndices(self, range):
+        # The last candidate begins before the query ends
+        last = bisect.bisect_left(self.begins, range[1])
+        # The first candidate is the first one where any range so far ends after the query begins
+        first = bisect.bisect_right(self.maxEnds, range[0], 0, last)
+        return [i for i in xrange(first, last) if self.ends[i] > range[0]]
+    
+    def overlapping(self, range):
+        """
+        Return the values whose ranges overlap the query range. The result is equal
+        to testing every range with L{overlap}.
+        """
+        assert range[0] <= range[1], range
+        return [self.values[i] for i in self._overlapIndices(range)]
+    
+    def contained(self, range):
+        """
+        Return the values whose ranges are fully contained in the query range.
+        """
+        first = bisect.bisect_left(self.begins, range[0])
+        last = bisect.bisect_right(self.begins, range[1])
+        return [self.values[i] for i in xrange(first, last) if self.ends[i] <= range[1]]
+    
+    def containing(self, range):
+        """
+        Return the values whose ranges fully contain the query range.
+        """
+        last = bisect.bisect_right(self.begins, range[0])
+        first = bisect.bisect_left(self.maxEnds, range[1], 0, last)
+        return [self.values[i] for i in xrange(first, last) if self.ends[i] >= range[1]]
+    
+    def nearest(self, range):
+        """
+        Return the value whose range is closest to the query range. Overlapping
+        ranges are at distance zero, with ties resolved in favour of the rightmost
+        range. Returns None for an empty index.
+        """
+        if len(self.values) == 0:
+            return None
+        overlapping = self._overlapIndices(range)
+        if len(overlapping) > 0:
+            return self.values[overlapping[-1]]
+        # No overlap, so every range beginning before the query end also ends before the
+        # query begins. The closest of these is the one with the largest end.
+        best = None
+        bestDistance = None
+        last = bisect.bisect_left(self.begins, range[1])
+        if last > 0:
+            best = bisect.bisect_left(self.maxEnds, self.maxEnds[last - 1], 0, last)
+            bestDistance = range[0] - self.maxEnds[last - 1]
+        if last < len(self.values) and (best == None or self.begins[last] - range[1] <= bestDistance):
+            best = last
+        return self.values[best]
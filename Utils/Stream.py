@@ -9,6 +9,139 @@ but still allow them to be printed on the screen.
 import sys, os
 import time
 import codecs
+import atexit
+import threading
+import Queue
+
+STOP = object() # Ends the LogWriter thread
+
+class LogWriter:
+    """
+    Writes complete lines to log files. Instead of flushing the files on every
+    write, they are flushed when flushInterval seconds have passed since the
+    previous flush or when flushSize characters are pending. With threaded=True
+    the file writes are done by a background thread, so that the writing process
+    only needs to queue the text. A flushInterval of 0 flushes on every write.
+    
+    Without the thread, the flush interval is checked only when text is written,
+    so the last lines before a quiet period are flushed by the next write,
+    flushLogs or close. The shared LogWriter is closed at exit (see getLogWriter).
+    The background thread also flushes when nothing has been written for
+    flushInterval seconds.
+    """
+    def __init__(self, flushInterval=1.0, flushSize=65536, threaded=False):
+        self.flushInterval = flushInterval
+        self.flushSize = flushSize
+        self.pending = {}
+        self.pendingSize = 0
+        self.lastFlush = time.time()
+        self.queue = None
+        self.thread = None
+        if threaded:
+            self.queue = Queue.Queue()
+            self.thread = threading.Thread(target=self._run, name="LogWriter")
+            self.thread.daemon = True
+            self.thread.start()
+    
+    def write(self, logfiles, text):
+        if self.queue != None:
+            self.queue.put((logfiles, text))
+        else:
+            self._write(logfiles, text)
+    
+    def flush(self, logfiles=None):
+        """
+        Flush the given log files, or all files with pending text. In threaded mode,
+        returns only after all queued text has been written.
+        """
+        if self.queue != None:
+            self.queue.put((logfiles, None))
+            self.queue.join()
+        else:
+            self._flush(logfiles)
+    
+    def close(self):
+        """
+        Write out everything pending and stop the background thread.
+        """
+        if self.queue != None:
+            self.queue.put((None, STOP))
+            self.thread.join()
+            self.queue = None
+            self.thread = None
+        self._flush()
+    
+    def _write(self, logfiles, text):
+        for logfile in logfiles:
+            logfile.write(text)
+            self.pending[id(logfile)] = logfile
+        self.pendingSize += len(text)
+        if self.pendingSize >= self.flushSize or time.time() - self.lastFlush >= self.flushInterval:
+            self._flush()
+    
+    def _flush(self, logfiles=None):
+        if logfiles == None:
+            logfiles = self.pending.values()
+        for logfile in logfiles:
+            if id(logfile) in self.pending:
+                del self.pending[id(logfile)]
+            if not logfile.closed:
+                logfile.flush()
+        if len(self.pending) == 0:
+            self.pendingSize = 0
+        self.lastFlush = time.time()
+    
+    def _run(self):
+        while True:
+            try:
+                logfiles, text = self.queue.get(timeout=self.flushInterval if self.flushInterval > 0 else None)
+            except Queue.Empty: # Nothing written for a while, so write out what is pending
+                if len(self.pending) > 0:
+                    self._flush()
+                continue
+            if text is STOP:
+                self.queue.task_done()
+                break
+            try:
+                if text == None:
+                    self._flush(logfiles)
+                else:
+                    self._write(logfiles, text)
+            finally:
+                self.queue.task_done()
+
+_logWriter = None
+
+def getLogWriter():
+    """
+    The LogWriter shared by the stdout and stderr StreamModifiers, so that their
+    lines are written to a common log file in the order they were written.
+    """
+    global _logWriter
+    if _logWriter == None:
+        _logWriter = LogWriter()
+        atexit.register(closeLogWriter)
+    return _logWriter
+
+def setLogWriter(flushInterval=1.0, flushSize=65536, threaded=False):
+    """
+    Replace the shared LogWriter, e.g. for writing the logs in a background thread.
+    """
+    global _logWriter
+    getLogWriter().close()
+    _logWriter = LogWriter(flushInterval, flushSize, threaded)
+    for stream in (sys.stdout, sys.stderr):
+        if isinstance(stream, StreamModifier):
+            stream.logWriter = _logWriter
+    return _logWriter
+
+def flushLogs():
+    if _logWriter != None:
+        _logWriter.flush()
+
+def closeLogWriter():
+    if _logWriter != None:
+        _logWriter.close()
 
 class StreamModifier:
     """
@@ -16,8 +149,9 @@ class StreamModifier:
     such as sys.stderr or sys.stdout. The write method first writes the text
     to a log file, then passes it on to the original stream.
     """
-    def __init__(self, stream):
+    def __init__(self, stream, logWriter=None):
         self.stream = stream
+        self.logWriter = logWriter if logWriter != None else getLogWriter()
         self.logfiles = []
         self.logfilenames = []
         self.indent = None
@@ -26,6 +160,7 @@ class StreamModifier:
         self.prevTime = None
         self.newLine = True
         self.buffer = ""
+        self.timeCache = (None, None)
     
     def setLog(self, logfile=None):
         if logfile != None:
@@ -51,6 +186,8 @@ class StreamModifier:
             else:
                 removed = self.logfiles[i]
                 removedName = self.logfilenames[i]
+        if removed != None:
+            self.logWriter.flush([removed])
         self.logfiles = logfilesToKeep
         self.logfilenames = logfilenamesToKeep
         
@@ -77,10 +214,18 @@ class StreamModifier:
         """
         Write directly to the log file without sending the input to the stream
         """
-        for logfile in self.logfiles:
-            if filename == None or logfile.name == filename:
-                logfile.write(text)
-                logfile.flush()
+        logfiles = [x for x in self.logfiles if filename == None or x.name == filename]
+        self.logWriter.write(logfiles, text)
+        self.logWriter.flush(logfiles)
+    
+    def getTimeString(self):
+        """
+        The formatted time stamp, cached for the current second.
+        """
+        second = int(time.time())
+        if self.timeCache[0] != second:
+            self.timeCache = (second, time.strftime(self.timeStamp, time.localtime(second)))
+        return self.timeCache[1]
     
     def write(self, text):
         if text == None or text == "":
@@ -102,24 +247,33 @@ class StreamModifier:
         self.stream.write(text)
         self.stream.flush()
         if len(self.logfiles) > 0:
-            for char in text:
-                if char == "\r":
-                    self.buffer = ""
-                elif char == "\n":
-                    timeString = time.strftime(self.timeStamp)
+            # Only complete lines are logged. A carriage return (e.g. a ProgressCounter update)
+            # discards the preceding part of the line.
+            if "\n" not in text: # e.g. the separate items of a print statement
+                if "\r" in text:
+                    self.buffer = text[text.rfind("\r")+1:]
+                else:
+                    self.buffer += text
+                return
+            lines = (self.buffer + text).split("\n")
+            self.buffer = lines.pop()
+            if "\r" in self.buffer:
+                self.buffer = self.buffer[self.buffer.rfind("\r")+1:]
+            if len(lines) == 0:
+                return
+            output = []
+            for line in lines:
+                if "\r" in line:
+                    line = line[line.rfind("\r")+1:]
+                if self.timeStamp != None:
+                    timeString = self.getTimeString()
                     if timeString == self.prevTime and not self.timeStampDuplicates:
                         timeString = len(timeString) * " "
                     else:
                         self.prevTime = timeString
-                    if self.timeStamp != None:
-                        self.buffer = timeString + "\t" + self.buffer
-                    for logfile in self.logfiles:
-                        logfile.write(self.buffer + "\n")
-                    self.buffer = ""
-                else:
-                    self.buffer += char
-            for logfile in self.logfiles:
-                logfile.flush()
+                    line = timeString + "\t" + line
+                output.append(line + "\n")
+            self.logWriter.write(tuple(self.logfiles), "".join(output))
     
     def flush(self):
         self.stream.flush()
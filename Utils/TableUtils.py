@@ -69,7 +69,7 @@ def removeKeys(rows, keys):
         newRows.append(newRow)
     return newRows
 
-def writeCSV(dict, filename, fieldnames=None, writeTitles=True):
+def writeCSV(dict, filename, fieldnames=None, writeTitles=True, delimiter=","):
     if not isinstance(dict, list):
         dict = [dict]
     if fieldnames == None:
@@ -80,16 +80,16 @@ def writeCSV(dict, filename, fieldnames=None, writeTitles=True):
         for key in fieldnames:
             keyDict[key] = key
     csvFile = open(filename, "wb")
-    writer = csv.DictWriter(csvFile, fieldnames=keys)
+    writer = csv.DictWriter(csvFile, fieldnames=keys, delimiter=delimiter)
     if writeTitles:
         writer.writerow(keyDict)
     for row in dict:
         writer.writerow(row)
     csvFile.close()
 
-def readCSV(filename, fieldnames=None):
+def readCSV(filename, fieldnames=None, delimiter=","):
     csvFile = open(filename, "rb")
-    reader = csv.DictReader(csvFile, fieldnames=fieldnames)
+    reader = csv.DictReader(csvFile, fieldnames=fieldnames, delimiter=delimiter)
     rows = []
     while True:
         try:
@@ -8,6 +8,7 @@ import sys, os
 import time
 import re
 from Utils.Connection.Connection import getConnection
+from Utils.BatchScheduler import BatchScheduler, Manifest
 
 def getMaxJobsFromFile(controlFilename):
     f = open(controlFilename, "rt")
@@ -23,7 +24,7 @@ def getMaxJobsFromFile(controlFilename):
 def getMaxJobs(maxJobs, controlFilename=None):
     if maxJobs == None:
         if controlFilename != None:
-            return getMaxJobsSetting(controlFilename)
+            return getMaxJobsFromFile(controlFilename)
         else:
             return None
     else:
@@ -43,20 +44,22 @@ def prepareCommand(template, input=None, jobTag=None, output=None):
         template = template.replace("%o", output)
     return template
 
-def submitJob(command, input, connection, jobTag=None, output=None, regex=None, dummy=False, rerun=None, hideFinished=False):
+def isJobInput(input, connection, regex=None):
     if input != None and input.endswith(".job"):
         if connection.debug:
             print >> sys.stderr, "Skipped job control file", input
-        return
+        return False
     if connection.debug:
         print >> sys.stderr, "Preparing to submit a job for input", input
     if regex != None and regex.match(input) == None:
         if connection.debug:
             print >> sys.stderr, "Regular expression did not match input, no job submitted"
-        return
+        return False
     elif connection.debug and input != None:
         print >> sys.stderr, "Regular expression matched the input"
-    
+    return True
+
+def getJobLocation(input, jobTag=None, output=None):
     if input != None:
         # Determine job name and directory from the input file
         jobDir = os.path.abspath(os.path.dirname(input))
@@ -73,6 +76,12 @@ def submitJob(command, input, connection, jobTag=None, output=None, regex=None,
         assert jobTag != None
         jobName = jobTag
         jobDir = output
+    return jobDir, jobName
+
+def submitJob(command, input, connection, jobTag=None, output=None, regex=None, dummy=False, rerun=None, hideFinished=False):
+    if not isJobInput(input, connection, regex):
+        return
+    jobDir, jobName = getJobLocation(input, jobTag, output)
     
     print >> sys.stderr, "Processing job", jobName, "for input", input
     jobStatus = connection.getJobStatusByName(jobDir, jobName)
@@ -118,8 +127,39 @@ def getOutputDir(currentDir, currentItem, input, output=None):
         relativeCurrentDir = relativeCurrentDir.lstrip("/")
         return os.path.join(output, relativeCurrentDir)
 
+def walkInputs(input, output=None, regexDir=None):
+    """
+    Yield (item, outputDir) for all files and directories in the input directory tree
+    """
+    for triple in os.walk(input):
+        if regexDir != None and regexDir.match(os.path.join(triple[0])) == None:
+            print >> sys.stderr, "Skipping directory", triple[0]
+            continue
+        else:
+            print >> sys.stderr, "Processing directory", triple[0]
+        for item in sorted(triple[1]) + sorted(triple[2]): # process both directories and files
+            yield os.path.join(triple[0], item), getOutputDir(triple[0], item, input, output)
+
+def scheduleBatch(command, input, connection, manifest, jobTag=None, output=None, regex=None, regexDir=None, dummy=False, rerun=None,
+                  controlFilename=None, sleepTime=15, limit=None, retries=0):
+    """
+    Process the input directory with a BatchScheduler, recording the jobs in a manifest. Inputs
+    are submitted largest first and a restarted batch continues from the manifest.
+    """
+    scheduler = BatchScheduler(manifest, connection, maxJobs=limit, retries=retries, sleepTime=sleepTime, 
+                               getMaxJobs=lambda: getMaxJobs(limit, controlFilename))
+    if os.path.isfile(input):
+        inputs = [(input, output)]
+    else:
+        inputs = walkInputs(input, output, regexDir)
+    for item, outputDir in inputs:
+        if isJobInput(item, connection, regex):
+            jobDir, jobName = getJobLocation(item, jobTag, outputDir)
+            scheduler.add(item, prepareCommand(command, item, jobTag, outputDir), jobDir, jobName)
+    return scheduler.run(dummy=dummy, rerun=rerun)
+
 def batch(command, input=None, connection=None, jobTag=None, output=None, regex=None, regexDir=None, dummy=False, rerun=None, 
-          hideFinished=False, controlFilename=None, sleepTime=None, debug=False, limit=None, loop=False):
+          hideFinished=False, controlFilename=None, sleepTime=None, debug=False, limit=None, loop=False, manifest=None, retries=0):
     """
     Process a large number of input files
     
@@ -137,11 +177,17 @@ def batch(command, input=None, connection=None, jobTag=None, output=None, regex=
     @param debug: Job submission scripts are printed on screen.
     @param limit: Maximum number of jobs. Overrides controlFilename
     @param loop: Loop over the input directory. Otherwise process it once.
+    @param manifest: A JSON-lines manifest file. If defined, jobs are submitted largest first through a BatchScheduler, which can resume an interrupted batch.
+    @param retries: The number of times a failed job is resubmitted when using a manifest
     """
     if sleepTime == None:
         sleepTime = 15
     connection = getConnection(connection)
     connection.debug = debug
+    if manifest != None and input != None:
+        assert not loop, "Looping is not supported with a manifest"
+        return scheduleBatch(command, input, connection, manifest, jobTag, output, regex, regexDir, dummy, rerun, 
+                             controlFilename, sleepTime, limit, retries)
     if input == None: # an inputless batch job:
         waitForJobs(limit, 0, connection, controlFilename, sleepTime)
         submitJob(command, input, connection, jobTag, output, regex, dummy, rerun, hideFinished)
@@ -153,18 +199,11 @@ def batch(command, input=None, connection=None, jobTag=None, output=None, regex=
         submitCount = 0
         while firstLoop or loop:
             waitForJobs(limit, submitCount, connection, controlFilename, sleepTime)
-            for triple in os.walk(input):
-                if regexDir != None and regexDir.match(os.path.join(triple[0])) == None:
-                    print >> sys.stderr, "Skipping directory", triple[0]
-                    continue
-                else:
-                    print >> sys.stderr, "Processing directory", triple[0]
-                for item in sorted(triple[1]) + sorted(triple[2]): # process both directories and files
-                    #print item, triple, os.path.join(triple[0], item)
-                    if submitJob(command, os.path.join(triple[0], item), connection, jobTag, getOutputDir(triple[0], item, input, output), regex, dummy, rerun, hideFinished):
-                        submitCount += 1
-                        # number of submitted jobs has increased, so check if we need to wait
-                        waitForJobs(limit, submitCount, connection, controlFilename, sleepTime)
+            for item, outputDir in walkInputs(input, output, regexDir):
+                if submitJob(command, item, connection, jobTag, outputDir, regex, dummy, rerun, hideFinished):
+                    submitCount += 1
+                    # number of submitted jobs has increased, so check if we need to wait
+                    waitForJobs(limit, submitCount, connection, controlFilename, sleepTime)
             firstLoop = False
 
 if __name__=="__main__":
@@ -194,8 +233,15 @@ if __name__=="__main__":
     optparser.add_option("--maxJobs", default=None, type="int", dest="maxJobs", help="Maximum number of jobs in queue/running")
     optparser.add_option("--hideFinished", default=False, action="store_true", dest="hideFinished", help="")
     optparser.add_option("--loop", default=False, action="store_true", dest="loop", help="Continuously loop through the input directory")
+    optparser.add_option("--manifest", default=None, dest="manifest", help="Record jobs in this manifest file, submitting the largest inputs first and resuming an interrupted batch")
+    optparser.add_option("--retries", default=0, type="int", dest="retries", help="Number of times to resubmit a failed job when using a manifest")
+    optparser.add_option("--stats", default=False, action="store_true", dest="stats", help="Print the job statistics of the manifest and exit")
     (options, args) = optparser.parse_args()
     
+    if options.stats:
+        assert options.manifest != None
+        Manifest(options.manifest).printStatistics(sys.stdout)
+        sys.exit()
     assert options.command != None
     if options.limit != None: options.limit = int(options.limit)
     if options.rerun != None: options.rerun = options.rerun.split(",")
@@ -206,4 +252,4 @@ if __name__=="__main__":
           output=options.output, 
           regex=options.regex, regexDir=options.regexDir, dummy=options.dummy, rerun=options.rerun, 
           hideFinished=options.hideFinished, controlFilename=options.controlFile, sleepTime=options.sleepTime, 
-          debug=options.debug, limit=options.limit, loop=options.loop)
+          debug=options.debug, limit=options.limit, loop=options.loop, manifest=options.manifest, retries=options.retries)
@@ -9,13 +9,14 @@ import tempfile
 import codecs
 import Utils.Settings as Settings
 import Utils.Stream as Stream
+import Utils.Instrumentation as Instrumentation
 import Utils.Download
 from Utils.Connection.Connection import getConnection
-from Detectors.Preprocessor import Preprocessor
 
 def classify(input, model, output, workDir=None, step=None, omitSteps=None, 
              goldInput=None, detector=None, debug=False, clear=False, 
-             preprocessorTag="-preprocessed.xml.gz", preprocessorParams=None, bioNLPSTParams=None):
+             preprocessorTag="-preprocessed.xml.gz", preprocessorParams=None, bioNLPSTParams=None,
+             instrument=False, profile=False):
     """
     Detect events or relations from text.
     
@@ -32,6 +33,8 @@ def classify(input, model, output, workDir=None, step=None, omitSteps=None,
     @param preprocessorTag: preprocessor output file will be output + preprocessorTag
     @param preprocessorParams: Optional parameters controlling preprocessing. If None, will be read from model.
     @param bioNLPSTParams: Optional parameters controlling BioNLP ST format output. If None, will be read from model.
+    @param instrument: Record the time and memory use of each step to output-instrumentation.json
+    @param profile: Also save a cProfile profile of each top-level step. Implies instrument.
     """
     input = os.path.abspath(input)
     if goldInput != None: goldInput = os.path.abspath(goldInput)
@@ -40,6 +43,8 @@ def classify(input, model, output, workDir=None, step=None, omitSteps=None,
     if workDir != None: # use a permanent work directory
         workdir(workDir, clear)
     Stream.openLog(output + "-log.txt") # log in the output directory
+    if instrument or profile:
+        Instrumentation.enable(output + "-instrumentation.json", profile)
     # Get input files
     input, preprocess = getInput(input)
     model = getModel(model)
@@ -52,6 +57,7 @@ def classify(input, model, output, workDir=None, step=None, omitSteps=None,
     if selector.check("PREPROCESS"):
         if preprocessorParams == None:
             preprocessorParams = ["LOAD", "GENIA_SPLITTER", "BANNER", "BLLIP_BIO", "STANFORD_CONVERT", "SPLIT_NAMES", "FIND_HEADS", "SAVE"]
+        from Detectors.Preprocessor import Preprocessor # imported only when needed, as it loads all the preprocessing tools
         preprocessor = Preprocessor(preprocessorParams)
         if debug: 
             preprocessor.setArgForAllSteps("debug", True)
@@ -155,9 +161,12 @@ if __name__=="__main__":
     optparser.add_option("--omitSteps", default=None, dest="omitSteps", help="")
     optparser.add_option("--clearAll", default=False, action="store_true", dest="clearAll", help="Delete all files")
     optparser.add_option("--debug", default=False, action="store_true", dest="debug", help="More verbose output")
+    optparser.add_option("--instrument", default=False, action="store_true", dest="instrument", help="Save per-step time and memory use to output-instrumentation.json")
+    optparser.add_option("--profile", default=False, action="store_true", dest="profile", help="Also save a cProfile profile for each top-level step")
     (options, args) = optparser.parse_args()
     
     assert options.output != None
     classify(options.input, options.model, options.output, options.workdir, options.step, options.omitSteps, 
              options.gold, options.detector, options.debug, options.clearAll,
-             preprocessorParams=options.preprocessorParams, bioNLPSTParams=options.bioNLPSTParams)
+             preprocessorParams=options.preprocessorParams, bioNLPSTParams=options.bioNLPSTParams,
+             instrument=options.instrument, profile=options.profile)
@@ -4,32 +4,33 @@
 Train a new model for event or relation detection.
 """
 import sys, os
-from Utils.InteractionXML.DeleteElements import getEmptyCorpus
-import Utils.InteractionXML.Catenate as Catenate
 import Utils.Stream as Stream
+import Utils.Instrumentation as Instrumentation
 import Utils.Settings as Settings
 import Utils.Parameters as Parameters
+import Utils.ClassRegistry as ClassRegistry
 from Utils.Connection.Connection import getConnection
-import Utils.STFormat.Compare
-import Utils.InteractionXML.Subset
 import shutil
 import atexit
 import types
 import tempfile
 from Core.Model import Model
 from Detectors.StepSelector import StepSelector
-from Detectors.Preprocessor import Preprocessor
-from Detectors.StructureAnalyzer import StructureAnalyzer
-from Detectors.EventDetector import EventDetector
-from Evaluators import EvaluateInteractionXML
 import copy
+# The detector stack and the corpus tools are imported only when used, so that
+# importing this module (e.g. from classify.py) does not load all of them
+DeleteElements = ClassRegistry.lazyModule("Utils.InteractionXML.DeleteElements")
+Catenate = ClassRegistry.lazyModule("Utils.InteractionXML.Catenate")
+Subset = ClassRegistry.lazyModule("Utils.InteractionXML.Subset")
+Compare = ClassRegistry.lazyModule("Utils.STFormat.Compare")
+EvaluateInteractionXML = ClassRegistry.lazyModule("Evaluators.EvaluateInteractionXML")
 
 def train(output, task=None, detector=None, inputFiles=None, models=None, parse=None,
           processUnmerging=None, processModifiers=None, 
           bioNLPSTParams=None, preprocessorParams=None, exampleStyles=None, 
           classifierParams=None,  doFullGrid=False, deleteOutput=False, copyFrom=None, 
           log="log.txt", step=None, omitSteps=None, debug=False, connection=None, subset=None, 
-          folds=None, corpusDir=None, corpusPreprocessing=None, evaluator=None):
+          folds=None, corpusDir=None, corpusPreprocessing=None, evaluator=None, instrument=False, profile=False):
     """
     Train a new model for event or relation detection.
     
@@ -54,6 +55,8 @@ def train(output, task=None, detector=None, inputFiles=None, models=None, parse=
     @param debug: In debug mode, more output is shown, and some temporary intermediate files are saved
     @param connection: A parameter set defining a local or remote connection for training the classifier
     @param subset: A parameter set for making subsets of input files
+    @param instrument: Record the time and memory use of each step to instrumentation.json in the output directory
+    @param profile: Also save a cProfile profile of each top-level step. Implies instrument.
     """
     # Insert default arguments where needed
     inputFiles = setDictDefaults(inputFiles, {"train":None, "devel":None, "test":None})
@@ -66,6 +69,8 @@ def train(output, task=None, detector=None, inputFiles=None, models=None, parse=
     processModifiers = getDefinedBool(processModifiers)
     # Initialize working directory
     workdir(output, deleteOutput, copyFrom, log)
+    if instrument or profile:
+        Instrumentation.enable("instrumentation.json", profile)
     # Get task specific parameters
     useKerasDetector = False
     if detector != None and "keras" in detector.lower():
@@ -88,6 +93,7 @@ def train(output, task=None, detector=None, inputFiles=None, models=None, parse=
             processModifiers = False
     # Preprocess the corpus if required
     if corpusPreprocessing != None:
+        from Detectors.Preprocessor import Preprocessor
         preprocessor = Preprocessor(steps=corpusPreprocessing)
         assert preprocessor.steps[0].name == "MERGE_SETS"
         assert preprocessor.steps[-1].name == "DIVIDE_SETS"
@@ -123,7 +129,7 @@ def train(output, task=None, detector=None, inputFiles=None, models=None, parse=
         print >> sys.stderr, "----------------------------------------------------"
         print >> sys.stderr, "------------------ Train Detector ------------------"
         print >> sys.stderr, "----------------------------------------------------"
-        if not isinstance(detector, EventDetector):
+        if not isinstance(detector, ClassRegistry.getClass("EventDetector", "detector")):
             detector.train(inputFiles["train"], inputFiles["devel"], models["devel"], models["test"],
                            exampleStyles["examples"], classifierParams["examples"], parse, None, task,
                            fromStep=detectorSteps["TRAIN"], workDir="training", testData=inputFiles["test"])
@@ -142,6 +148,7 @@ def train(output, task=None, detector=None, inputFiles=None, models=None, parse=
                 if evaluatorName != None:
                     model.addStr("detector", evaluatorName)
                 if preprocessorParams != None:
+                    from Detectors.Preprocessor import Preprocessor
                     preprocessor = Preprocessor()
                     model.addStr("preprocessorParams", Parameters.toString(preprocessor.getParameters(preprocessorParams)))
                 model.save()
@@ -164,7 +171,7 @@ def train(output, task=None, detector=None, inputFiles=None, models=None, parse=
             removalScope = "all"
         elif "Edge" in detector.__class__.__name__:
             removalScope = "interactions"
-        detector.classify(getEmptyCorpus(inputFiles["devel"], scope=removalScope), models["devel"], "classification-empty/devel-empty", fromStep=detectorSteps["EMPTY"], workDir="classification-empty")
+        detector.classify(DeleteElements.getEmptyCorpus(inputFiles["devel"], scope=removalScope), models["devel"], "classification-empty/devel-empty", fromStep=detectorSteps["EMPTY"], workDir="classification-empty")
         print >> sys.stderr, "*** Evaluate empty devel classification ***"
         if os.path.exists("classification-empty/devel-empty-pred.xml.gz"):
             EvaluateInteractionXML.run(detector.evaluator, "classification-empty/devel-empty-pred.xml.gz", inputFiles["devel"], parse)
@@ -181,7 +188,7 @@ def train(output, task=None, detector=None, inputFiles=None, models=None, parse=
             detector.classify(inputFiles["test"], models["test"] if models["test"] != None else models["devel"], "classification-test/test", fromStep=detectorSteps["TEST"], workDir="classification-test")
             if detector.bioNLPSTParams["convert"]:
                 extension = ".zip" if (detector.bioNLPSTParams["convert"] == "zip") else ".tar.gz" 
-                Utils.STFormat.Compare.compare("classification-test/test-events" + extension, "classification-devel/devel-events" + extension, "a2")
+                Compare.compare("classification-test/test-events" + extension, "classification-devel/devel-events" + extension, "a2")
     # Stop logging
     if log != None:
         Stream.closeLog(log)
@@ -235,12 +242,7 @@ def importClass(cls, category=""):
     elif type(cls) in types.StringTypes:
         className = cls
         print >> sys.stderr, "Importing", category, cls
-        if cls.startswith("from"):
-            exec cls
-            cls = eval(cls.split(".")[-1])
-        else:
-            exec "from " + cls + " import " + cls.split(".")[-1]
-            cls = eval(cls.split(".")[-1])
+        cls = ClassRegistry.getClass(cls, category)
     else: # assume it is a class
         className = cls.__name__
         print >> sys.stderr, "Using", category, className
@@ -265,7 +267,7 @@ def getSubsets(inputFiles, subset, outdir="training"):
                 outdir = tempfile.mkdtemp()
             outFileName = os.path.join(outdir, "subset_" + str(fraction) + "_" + str(subset["seed"]) + "_" + os.path.basename(inputFiles[dataset]))
             if not os.path.exists(outFileName):
-                Utils.InteractionXML.Subset.getSubset(inputFiles[dataset], outFileName, float(fraction), subset["seed"])
+                Subset.getSubset(inputFiles[dataset], outFileName, float(fraction), subset["seed"])
             inputFiles[dataset] = outFileName
 
 def getFolds(inputFiles, folds, outdir="training"):
@@ -289,7 +291,7 @@ def getFolds(inputFiles, folds, outdir="training"):
             outdir = tempfile.mkdtemp()
         outFileName = os.path.join(outdir, dataset + "-" + idString + ".xml")
         if not os.path.exists(outFileName):
-            Utils.InteractionXML.Subset.getSubset(origTrainFile, outFileName, attributes={"set":currentFold})
+            Subset.getSubset(origTrainFile, outFileName, attributes={"set":currentFold})
         inputFiles[dataset] = outFileName
 
 def workdir(path, deleteIfExists=True, copyFrom=None, log="log.txt"):
@@ -323,6 +325,7 @@ def workdir(path, deleteIfExists=True, copyFrom=None, log="log.txt"):
 def learnSettings(inputFiles, detector, classifierParameters, task, exampleStyles, useKerasDetector=False):
     if detector == None:
         print >> sys.stderr, "*** Analyzing input files to determine training settings ***"
+        from Detectors.StructureAnalyzer import StructureAnalyzer
         structureAnalyzer = StructureAnalyzer()
         if not os.path.exists("training/structure.txt"): 
             datasets = sorted(filter(None, [inputFiles["train"], inputFiles["devel"]]))
@@ -672,6 +675,8 @@ if __name__=="__main__":
     debug.add_option("--noLog", default=False, action="store_true", dest="noLog", help="Do not keep a log file")
     debug.add_option("--clearAll", default=False, action="store_true", dest="clearAll", help="Delete all files")
     debug.add_option("--debug", default=False, action="store_true", dest="debug", help="More verbose output")
+    debug.add_option("--instrument", default=False, action="store_true", dest="instrument", help="Save per-step time and memory use to instrumentation.json")
+    debug.add_option("--profile", default=False, action="store_true", dest="profile", help="Also save a cProfile profile for each top-level step")
     event.add_option("--subset", default=None, dest="subset", help="")
     event.add_option("--folds", default=None, dest="folds", help="")
     optparser.add_option_group(debug)
@@ -692,4 +697,4 @@ if __name__=="__main__":
           doFullGrid=options.fullGrid, deleteOutput=options.clearAll, copyFrom=options.copyFrom, 
           log=options.log, step=options.step, omitSteps=options.omitSteps, debug=options.debug, 
           connection=options.connection, subset=options.subset, folds=options.folds, corpusDir=options.corpusDir, corpusPreprocessing=options.corpusPreprocess,
-          evaluator=options.evaluator)
+          evaluator=options.evaluator, instrument=options.instrument, profile=options.profile)